@@ -0,0 +1,249 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmark do caminho leitura -> tela: busca no banco, parse + roteamento e
+# atualizar_display. Roda sem display (plataforma Qt 'offscreen') com o banco real
+# e com bancos sintéticos maiores; compara com um baseline salvo.
+#
+# benchmark_baseline.json (versionado) é um run com os parâmetros padrão; os tempos são
+# da máquina onde foi gerado, então regrave-o no hardware de referência (o Raspberry da
+# linha) e faça commit junto com a mudança que altera o desempenho de propósito.
+#
+#   python3 benchmark_scan.py --salvar-baseline benchmark_baseline.json
+#   python3 benchmark_scan.py --baseline benchmark_baseline.json
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from qrcode_db import QRCodeDB
+from qrcode_parser import parse_qrcode
+from roteamento import carregar_rotas, rotear
+from snapshot_qrcode import SnapshotQR
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+silencio = open(os.devnull, 'w')
+
+
+def percentil(valores_ordenados, q):
+    indice = min(len(valores_ordenados) - 1, max(0, math.ceil(q * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def medir(func, itens):
+    tempos = []
+    for item in itens:
+        inicio = time.perf_counter()
+        func(item)
+        tempos.append((time.perf_counter() - inicio) * 1000.0)
+    tempos.sort()
+    return {
+        'n': len(tempos),
+        'p50_ms': percentil(tempos, 0.5),
+        'p99_ms': percentil(tempos, 0.99),
+        'media_ms': sum(tempos) / len(tempos),
+    }
+
+
+def memoria_pico_kb(func, itens):
+    tracemalloc.start()
+    try:
+        for item in itens:
+            func(item)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pico / 1024.0
+
+
+def etapa(resultados, nome, func, itens, amostra_memoria=200):
+    if not itens:
+        return
+    r = medir(func, itens)
+    r['pico_kb'] = memoria_pico_kb(func, itens[:amostra_memoria])
+    r['maxrss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    resultados[nome] = r
+    print(f"{nome:<36} n={r['n']:<7} p50={r['p50_ms']:8.3f} ms  p99={r['p99_ms']:8.3f} ms  "
+          f"pico={r['pico_kb']:9.1f} KB", flush=True)
+
+
+def gerar_banco_sintetico(origem, destino, linhas, linhas_texto_grande, tamanho_texto):
+    # Mesmo schema/índices do banco real, linhas replicadas + Textos longos concatenados
+    src = sqlite3.connect(origem)
+    schema = [sql for (sql,) in src.execute(
+        "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'")]
+    base = src.execute('SELECT Job_Key, Versao, Carro, Maco, Data, Texto, Terminais, Qtd_Terminais FROM qrcode').fetchall()
+    src.close()
+
+    dst = sqlite3.connect(destino)
+    dst.execute('PRAGMA journal_mode = OFF')
+    dst.execute('PRAGMA synchronous = OFF')
+    for sql in schema:
+        dst.execute(sql)
+
+    rnd = random.Random(42)
+
+    def replicadas():
+        for i in range(linhas):
+            yield base[i % len(base)]
+
+    def grandes():
+        for _ in range(linhas_texto_grande):
+            partes = []
+            while sum(len(p) + 1 for p in partes) < tamanho_texto:
+                partes.append(rnd.choice(base)[5])
+            modelo = rnd.choice(base)
+            yield modelo[:5] + ('#'.join(partes),) + modelo[6:]
+
+    sql = ('INSERT INTO qrcode (Job_Key, Versao, Carro, Maco, Data, Texto, Terminais, Qtd_Terminais) '
+           'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+    with dst:
+        dst.executemany(sql, replicadas())
+        dst.executemany(sql, grandes())
+    total = dst.execute('SELECT MAX(ID) FROM qrcode').fetchone()[0]
+    dst.close()
+    return total
+
+
+def rodar_banco(nome, caminho_banco, rotas, viewer, app, args, ids_grandes=()):
+    resultados = {}
+    db = QRCodeDB(caminho_banco)
+    # IDs que existem: o programa que grava o banco pode ter apagado linhas (buracos no AUTOINCREMENT)
+    existentes = [qr_id for (qr_id,) in db.conexao().execute('SELECT ID FROM qrcode ORDER BY ID').fetchall()]
+    rnd = random.Random(7)
+    ids = existentes if len(existentes) <= args.amostra_busca else rnd.sample(existentes, args.amostra_busca)
+
+    etapa(resultados, f"{nome}/buscar_qrcode", db.buscar, ids)
+    textos = [db.buscar(i)['Texto'] or '' for i in ids]
+
+    # Sem o LRU do parser: custo real de uma leitura nova
+    etapa(resultados, f"{nome}/parse", parse_qrcode.__wrapped__, textos)
+    etapa(resultados, f"{nome}/parse+rotear",
+          lambda texto: rotear(parse_qrcode.__wrapped__(texto).aplicacoes, rotas), textos)
+
+    # Modo --snapshot do viewer: consulta em memória + roteamento das aplicações já parseadas
+    snapshot = SnapshotQR(limite_bytes=1 << 31)
+    snapshot.adicionar(db.iterar())
+    etapa(resultados, f"{nome}/snapshot buscar+rotear", lambda i: rotear(snapshot.buscar(i)[3], rotas), ids)
+
+    if ids_grandes:
+        grandes = [db.buscar(i)['Texto'] for i in ids_grandes]
+        etapa(resultados, f"{nome}/parse+rotear texto grande",
+              lambda texto: rotear(parse_qrcode.__wrapped__(texto).aplicacoes, rotas), grandes)
+
+    if viewer is not None:
+        def exibir(texto):
+            # Os prints de log do viewer não entram na medição
+            with contextlib.redirect_stdout(silencio):
+                viewer.processar_qrcode_texto(texto)
+                app.processEvents()
+        amostra = textos[:args.amostra_display]
+        etapa(resultados, f"{nome}/atualizar_display", exibir, amostra)
+        if ids_grandes:
+            grandes = [db.buscar(i)['Texto'] for i in ids_grandes][:args.amostra_display]
+            etapa(resultados, f"{nome}/atualizar_display texto grande", exibir, grandes)
+
+    db.fechar()
+    return resultados
+
+
+def criar_viewer(diretorio_temp, args):
+    from PyQt5 import QtWidgets
+    import raspberry_qrcode_viewer
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    viewer = raspberry_qrcode_viewer.QRCodeViewer()
+    viewer.config_paths['prensas'] = os.path.abspath(args.prensas)
+    viewer.config_paths['cabos'] = os.path.abspath(args.cabos)
+    # Nada de arquivos de progresso/métricas no diretório do projeto
+    viewer.progresso_path = os.path.join(diretorio_temp, 'progresso_bench.db')
+    viewer.metricas_dir = diretorio_temp
+    viewer.resize(600, 900)
+    viewer.show()
+    viewer.carregar_subsistemas()
+    app.processEvents()
+    return viewer, app
+
+
+def comparar(resultados, baseline, tolerancia, folga_ms):
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = baseline.get(nome)
+        if not anterior:
+            continue
+        for chave in ('p50_ms', 'p99_ms'):
+            # Folga absoluta: etapas de microssegundos oscilam muito em termos relativos
+            limite = max(anterior[chave] * (1.0 + tolerancia), anterior[chave] + folga_ms)
+            if atual[chave] > limite:
+                regressoes.append(f"{nome} {chave}: {atual[chave]:.3f} > {anterior[chave]:.3f} (+{tolerancia:.0%})")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do caminho leitura -> tela")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    parser.add_argument('--prensas', default=os.path.join(SCRIPT_DIR, 'prensas_config.json'))
+    parser.add_argument('--cabos', default=os.path.join(SCRIPT_DIR, 'cabos_config.json'))
+    parser.add_argument('--linhas-sinteticas', type=int, default=100000)
+    parser.add_argument('--linhas-texto-grande', type=int, default=500)
+    parser.add_argument('--tamanho-texto', type=int, default=5000)
+    parser.add_argument('--amostra-busca', type=int, default=5000)
+    parser.add_argument('--amostra-display', type=int, default=300)
+    parser.add_argument('--sem-display', action='store_true', help="não mede atualizar_display (sem PyQt5)")
+    parser.add_argument('--sem-sintetico', action='store_true')
+    parser.add_argument('--baseline', help="JSON de um run anterior para comparar")
+    parser.add_argument('--salvar-baseline', help="grava os resultados deste run")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="regressão relativa aceita (padrão: 25%%)")
+    parser.add_argument('--folga-ms', type=float, default=0.1, help="regressão absoluta aceita em ms")
+    args = parser.parse_args(argv)
+
+    _, rotas, _ = carregar_rotas(args.prensas)
+
+    with tempfile.TemporaryDirectory(prefix='bench_qrcode_') as tmp:
+        viewer, app = (None, None) if args.sem_display else criar_viewer(tmp, args)
+
+        resultados = rodar_banco('real', args.banco, rotas, viewer, app, args)
+
+        if not args.sem_sintetico:
+            sintetico = os.path.join(tmp, 'sintetico.db')
+            inicio = time.perf_counter()
+            total = gerar_banco_sintetico(args.banco, sintetico, args.linhas_sinteticas,
+                                          args.linhas_texto_grande, args.tamanho_texto)
+            print(f"banco sintético: {total} linhas em {time.perf_counter() - inicio:.1f} s", flush=True)
+            ids_grandes = list(range(total - args.linhas_texto_grande + 1, total + 1))
+            resultados.update(rodar_banco('sintetico', sintetico, rotas, viewer, app, args, ids_grandes))
+
+        if viewer is not None:
+            viewer.close()
+            if viewer.progresso is not None:
+                viewer.progresso.fechar()
+
+    if args.salvar_baseline:
+        with open(args.salvar_baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+        print(f"baseline salvo em {args.salvar_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressoes = comparar(resultados, baseline, args.tolerancia, args.folga_ms)
+        if regressoes:
+            print("REGRESSÕES:")
+            for r in regressoes:
+                print(f"  {r}")
+            return 1
+        print("sem regressões em relação ao baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import os
+import re
+from collections import namedtuple
+
+from config_cache import carregar_compilado
+
+# Tabela de cabos enriquecida (cor, bitola) montada uma vez a partir do cabos_config.json.
+# Fica num cache ao lado do JSON (config_cache) e só é refeita quando o JSON muda.
+
+CaboInfo = namedtuple('CaboInfo', ['descricao', 'cor', 'bitola_mm'])
+
+COR_PADRAO = "#5599FF"
+
+# A ordem importa: a primeira cor encontrada na descrição vence
+CORES = (
+    (("vermelho",), "#FF3333"),
+    (("amarelo",), "#FFDD33"),
+    (("verde",), "#33FF66"),
+    (("azul",), "#3399FF"),
+    (("laranja",), "#FF9933"),
+    (("roxo", "lilas", "violeta"), "#CC66FF"),
+    (("marrom",), "#996633"),
+    (("preto",), "#333333"),
+    (("branco",), "#EEEEEE"),
+    (("cinza",), "#999999"),
+    (("rosa",), "#FF99CC"),
+)
+
+_BITOLA = re.compile(r'(\d+(?:[.,]\d+)?)\s*mm', re.IGNORECASE)
+
+CACHE_VERSAO = 1
+
+
+def cor_da_descricao(descricao):
+    if descricao:
+        descricao_lower = descricao.lower()
+        for palavras, cor in CORES:
+            for palavra in palavras:
+                if palavra in descricao_lower:
+                    return cor
+    return COR_PADRAO
+
+
+def bitola_da_descricao(descricao):
+    # "0.5mm a 1.0mm - Azul" -> 0.5 (menor bitola da faixa); sem "mm" -> None
+    m = _BITOLA.search(descricao or '')
+    if not m:
+        return None
+    return float(m.group(1).replace(',', '.'))
+
+
+def montar_tabela(cabos_dict):
+    return {
+        codigo: CaboInfo(descricao, cor_da_descricao(descricao), bitola_da_descricao(descricao))
+        for codigo, descricao in cabos_dict.items()
+    }
+
+
+def _compilar(config):
+    return montar_tabela(config.get('cabos', {}))
+
+
+def carregar_tabela_cabos(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    return carregar_compilado(caminho, _compilar, CACHE_VERSAO)
+
+
+def info_do_cabo(tabela, cabo):
+    # Mesmo fallback da tela: código sem cadastro aparece cru, cabo ausente como desconhecido
+    if not cabo:
+        return CaboInfo("Cabo desconhecido", COR_PADRAO, None)
+    info = tabela.get(cabo)
+    if info is None:
+        return CaboInfo(cabo, COR_PADRAO, None)
+    return info
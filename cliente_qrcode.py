@@ -0,0 +1,137 @@
+import http.client
+import json
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from qrcode_prefetch import QRCodeCache
+
+# Backend de consulta do viewer quando há um servidor_qrcode.py na rede: mesma interface
+# de leitura do QRCodeDB (buscar, buscar_varios, buscar_rotas), linhas como dicts com as
+# mesmas chaves das sqlite3.Row. Uma conexão HTTP keep-alive por thread.
+#
+# Linhas recebidas ficam num LRU local: com o servidor fora do ar, IDs já vistos ainda
+# abrem; os outros levantam ServidorIndisponivel e o viewer tenta o banco local.
+#
+# A geração do banco do servidor (cabeçalho X-Versao) só muda quando o arquivo dele é
+# trocado: aí os callbacks de ao_trocar_geracao avisam quem guarda linhas dele em cache.
+
+
+class ServidorIndisponivel(Exception):
+    pass
+
+
+class _ConexaoUnix(http.client.HTTPConnection):
+    def __init__(self, caminho, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.caminho = caminho
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.caminho)
+
+
+class ClienteQR:
+    def __init__(self, url, timeout=2.0, tamanho_cache=2048):
+        # 'http://host:porta' ou 'unix:/caminho/do/socket'
+        self.url = url
+        partes = urlsplit(url)
+        self.unix = partes.path if partes.scheme == 'unix' else None
+        self.host = partes.hostname
+        self.porta = partes.port or 8765
+        self.timeout = timeout
+        self.cache = QRCodeCache(tamanho_cache)
+        # Do último cabeçalho recebido: config do servidor, geração e último ID do banco dele
+        self.config_hash_servidor = None
+        self.geracao = None
+        self.ultimo_id = None
+        # Chamados sem argumentos, na thread do pedido que viu a geração nova
+        self.ao_trocar_geracao = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {'requisicoes': 0, 'falhas': 0, 'fallback': 0}
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.unix is not None:
+                conn = _ConexaoUnix(self.unix, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def fechar(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _get(self, caminho):
+        # Keep-alive fechado pelo servidor aparece só no próximo pedido: uma nova tentativa com conexão nova
+        for tentativa in range(2):
+            conn = self._conexao()
+            try:
+                conn.request('GET', caminho)
+                resp = conn.getresponse()
+                corpo = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.fechar()
+                erro = e
+                continue
+            geracao, _, ultimo_id = (resp.getheader('X-Versao') or '').partition('.')
+            with self._lock:
+                self.stats['requisicoes'] += 1
+                self.config_hash_servidor = resp.getheader('X-Config-Hash') or None
+                trocou = self.geracao is not None and geracao != self.geracao
+                self.geracao, self.ultimo_id = geracao, ultimo_id
+            if trocou:
+                self.cache.limpar()
+                for callback in self.ao_trocar_geracao:
+                    callback()
+            if resp.status >= 500:
+                raise ServidorIndisponivel(f"{self.url}: HTTP {resp.status}")
+            return resp.status, corpo
+        with self._lock:
+            self.stats['falhas'] += 1
+        raise ServidorIndisponivel(f"{self.url}: {erro}")
+
+    def buscar(self, qr_id):
+        qr_id = int(qr_id)
+        try:
+            status, corpo = self._get(f'/qrcode/{qr_id}')
+        except ServidorIndisponivel:
+            linha = self.cache.obter(qr_id, None)
+            if linha is None:
+                raise
+            with self._lock:
+                self.stats['fallback'] += 1
+            return linha
+        if status == 404:
+            return None
+        linha = json.loads(corpo)
+        self.cache.guardar(qr_id, None, linha)
+        return linha
+
+    def buscar_varios(self, ids):
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        status, corpo = self._get('/qrcode?ids=' + ','.join(map(str, ids)))
+        linhas = {linha['ID']: linha for linha in json.loads(corpo)}
+        for qr_id, linha in linhas.items():
+            self.cache.guardar(qr_id, None, linha)
+        return linhas
+
+    def buscar_rotas(self, qr_id, config_hash):
+        # Roteamento calculado pelo servidor; None (roteia localmente) se a config dele é outra ou ele caiu
+        try:
+            status, corpo = self._get(f'/rotas/{int(qr_id)}?config={config_hash}')
+        except ServidorIndisponivel:
+            return None
+        return corpo.decode('utf-8') if status == 200 else None
+
+    def config(self):
+        status, corpo = self._get('/config')
+        return json.loads(corpo)
@@ -0,0 +1,50 @@
+import json
+import os
+import pickle
+
+# Cache "pré-compilado" de configs JSON: guarda o resultado já processado num pickle
+# ao lado do JSON, válido enquanto mtime/tamanho do JSON não mudarem.
+
+CACHE_VERSAO = 1
+
+
+def caminho_cache(caminho):
+    return os.path.splitext(caminho)[0] + '.cache'
+
+
+def _ler_cache(caminho_cache_, assinatura):
+    try:
+        with open(caminho_cache_, 'rb') as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('assinatura') != assinatura:
+        return None
+    return cache.get('dados')
+
+
+def _gravar_cache(caminho_cache_, assinatura, dados):
+    temporario = caminho_cache_ + '.tmp'
+    try:
+        with open(temporario, 'wb') as f:
+            pickle.dump({'assinatura': assinatura, 'dados': dados}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho_cache_)
+    except OSError:
+        # Cache é opcional (ex.: cartão montado somente-leitura)
+        pass
+
+
+def carregar_compilado(caminho, compilar, versao=1):
+    # compilar(dados_json) -> estrutura pronta; 'versao' invalida caches de formatos antigos
+    st = os.stat(caminho)
+    assinatura = (CACHE_VERSAO, versao, st.st_mtime_ns, st.st_size)
+    cache = caminho_cache(caminho)
+
+    dados = _ler_cache(cache, assinatura)
+    if dados is not None:
+        return dados
+
+    with open(caminho, 'r', encoding='utf-8') as f:
+        dados = compilar(json.load(f))
+    _gravar_cache(cache, assinatura, dados)
+    return dados
@@ -1,10 +1,16 @@
 import sys
+import os
 import json
-from PyQt5 import QtWidgets
+import argparse
+from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtCore import Qt
+from gamepad_evdev import GamepadEvdev, faixas_do_caminho, fonte_pressionada
 
 class GamepadConfig(QtWidgets.QWidget):
-    def __init__(self):
+    # Eventos crus do gamepad evdev, vindos da thread de leitura
+    evento_evdev = QtCore.pyqtSignal(object)
+    
+    def __init__(self, evdev=None):
         super().__init__()
         self.setWindowTitle("Configurar Gamepad")
         self.setMinimumSize(500, 400)
@@ -16,6 +22,17 @@ class GamepadConfig(QtWidgets.QWidget):
         self.actions = ['up', 'down', 'left', 'right', 'enter', 'focus_input']
         self.action_index = 0
         
+        # Modo evdev (--evdev): aprende botões/eixos do /dev/input em vez de teclas do Qt
+        self.evdev = evdev
+        self.evdev_config = {}
+        self.evdev_faixas = {}
+        self.evdev_aguardando = None
+        self.gamepad = None
+        if evdev:
+            self.evdev_faixas = faixas_do_caminho(evdev)
+            self.evento_evdev.connect(self.evento_gamepad)
+            self.gamepad = GamepadEvdev(evdev, {}, ao_evento=self.evento_evdev.emit)
+        
         self.init_ui()
         self.next_action()
     
@@ -61,16 +78,35 @@ class GamepadConfig(QtWidgets.QWidget):
             'enter': 'ENTER (processar QR Code)',
             'focus_input': 'VOLTAR (focar no input)'
         }
-        self.instruction.setText(f"Pressione a tecla para:\n{action_names[self.current_action]}")
+        controle = "o botão (ou direção)" if self.evdev else "a tecla"
+        self.instruction.setText(f"Pressione {controle} para:\n{action_names[self.current_action]}")
         self.status.setText(f"Configurando {self.action_index + 1} de {len(self.actions)}")
     
     def skip_action(self):
         self.action_index += 1
         self.next_action()
     
+    def evento_gamepad(self, evento):
+        if not self.current_action:
+            return
+        fonte = fonte_pressionada(evento, self.evdev_faixas.get(evento.codigo))
+        # Eixo ainda inclinado / botão do passo anterior: espera voltar ao neutro
+        if self.evdev_aguardando is not None:
+            tipo, codigo = self.evdev_aguardando
+            if (evento.tipo, evento.codigo) == (tipo, codigo) and fonte is None:
+                self.evdev_aguardando = None
+            return
+        if fonte is None:
+            return
+        print(f"Evento capturado: {fonte} para ação: {self.current_action}")
+        self.evdev_config.setdefault(self.current_action, []).append(fonte)
+        self.evdev_aguardando = (evento.tipo, evento.codigo)
+        self.action_index += 1
+        self.next_action()
+    
     def keyPressEvent(self, event):
         event.accept()
-        if self.current_action:
+        if self.current_action and not self.evdev:
             key = event.key()
             print(f"Tecla capturada: {key} para ação: {self.current_action}")
             self.config[self.current_action].append(key)
@@ -78,8 +114,33 @@ class GamepadConfig(QtWidgets.QWidget):
             self.next_action()
     
     def save_config(self):
+        # Teclas e seção 'evdev' convivem no mesmo arquivo: cada modo só troca a sua parte
+        existente = {}
+        if os.path.exists('gamepad_keys.json'):
+            try:
+                with open('gamepad_keys.json', 'r', encoding='utf-8') as f:
+                    existente = json.load(f)
+            except (OSError, ValueError):
+                existente = {}
+        if self.evdev:
+            if self.gamepad is not None:
+                self.gamepad.parar()
+            config = dict(existente)
+            evdev = {k: v for k, v in existente.get('evdev', {}).items() if k not in self.actions}
+            evdev.update(self.evdev_config)
+            evdev['dispositivo'] = self.evdev
+            # Faixa dos eixos aprendidos: reproduzir gravações sem o dispositivo
+            codigos = {fonte.split(':')[1] for fontes in self.evdev_config.values() for fonte in fontes
+                       if fonte.startswith('abs:')}
+            evdev['eixos'] = {codigo: list(self.evdev_faixas[int(codigo)]) for codigo in sorted(codigos)
+                              if int(codigo) in self.evdev_faixas}
+            config['evdev'] = evdev
+        else:
+            config = dict(self.config)
+            if 'evdev' in existente:
+                config['evdev'] = existente['evdev']
         with open('gamepad_keys.json', 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, indent=2)
+            json.dump(config, f, indent=2)
         
         msg = QtWidgets.QMessageBox(self)
         msg.setWindowTitle("Sucesso")
@@ -89,7 +150,10 @@ class GamepadConfig(QtWidgets.QWidget):
         self.close()
 
 if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
-    window = GamepadConfig()
+    parser = argparse.ArgumentParser(description="Configura as teclas (ou o gamepad evdev) do visualizador")
+    parser.add_argument('--evdev', metavar='DISPOSITIVO', help="aprende o gamepad direto do /dev/input/eventN")
+    args, argv_qt = parser.parse_known_args()
+    app = QtWidgets.QApplication(sys.argv[:1] + argv_qt)
+    window = GamepadConfig(args.evdev)
     window.show()
     sys.exit(app.exec_())
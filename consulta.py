@@ -0,0 +1,102 @@
+from collections import namedtuple
+
+from PyQt5 import QtCore
+
+from qrcode_parser import parse_qrcode
+from roteamento import rotear
+from rotas_cache import desserializar
+
+# Pipeline de consulta fora da thread da GUI: busca no banco, parse e roteamento
+# rodam num QThreadPool e o resultado volta por sinal. Cada pedido tem um número;
+# quando um ID mais novo é pedido, os anteriores são abandonados entre as etapas.
+# Se o banco tem o roteamento pré-calculado (rotas_cache.py) para a config atual,
+# o parse e o roteamento são pulados. Com o snapshot em memória (snapshot_qrcode.py)
+# o banco nem é consultado: só o roteamento das aplicações já parseadas.
+
+ResultadoConsulta = namedtuple('ResultadoConsulta', [
+    'qr_id', 'carro', 'job_key', 'maco', 'erros', 'aplicacoes_por_prensa', 'terminais_sem_prensa',
+])
+
+
+class ConsultaSinais(QtCore.QObject):
+    # Criado na thread da GUI: emissões vindas do pool chegam enfileiradas
+    concluida = QtCore.pyqtSignal(int, object)
+    falhou = QtCore.pyqtSignal(int, str)
+    # Busca por Job_Key / Carro / Maço: (pedido, [(ID, Job_Key, Carro, Maco)], última página)
+    pagina_busca = QtCore.pyqtSignal(int, object, bool)
+    busca_falhou = QtCore.pyqtSignal(int, str)
+
+
+class ConsultaQR(QtCore.QRunnable):
+    def __init__(self, pedido, qr_id, buscar, rotas, sinais, pedido_atual, buscar_rotas=None, buscar_snapshot=None):
+        super().__init__()
+        self.pedido = pedido
+        self.qr_id = qr_id
+        self.buscar = buscar
+        self.rotas = rotas
+        self.sinais = sinais
+        self.pedido_atual = pedido_atual
+        self.buscar_rotas = buscar_rotas
+        self.buscar_snapshot = buscar_snapshot
+
+    def cancelado(self):
+        return self.pedido_atual() != self.pedido
+
+    def run(self):
+        try:
+            if self.cancelado():
+                return
+            linha = self.buscar_snapshot(self.qr_id) if self.buscar_snapshot is not None else None
+            if linha is not None:
+                carro, job_key, maco, aplicacoes, erros = linha
+                aplicacoes_por_prensa, sem_prensa = rotear(aplicacoes, self.rotas)
+            else:
+                texto, carro, job_key, maco = self.buscar(self.qr_id)
+                if self.cancelado():
+                    return
+                pre_calculado = self.buscar_rotas(self.qr_id) if self.buscar_rotas is not None else None
+                if pre_calculado is not None:
+                    aplicacoes_por_prensa, sem_prensa, erros = desserializar(pre_calculado)
+                else:
+                    payload = parse_qrcode(texto or '')
+                    aplicacoes_por_prensa, sem_prensa = rotear(payload.aplicacoes, self.rotas)
+                    erros = payload.erros
+            if self.cancelado():
+                return
+            self.sinais.concluida.emit(self.pedido, ResultadoConsulta(
+                self.qr_id, carro, job_key, maco, erros, aplicacoes_por_prensa, sem_prensa))
+        except Exception as e:
+            self.sinais.falhou.emit(self.pedido, str(e))
+
+
+class BuscaQR(QtCore.QRunnable):
+    # Uma página da busca; a seguinte é pedida quando o operador chega perto do fim da lista
+    def __init__(self, pedido, texto, antes_de, limite, pesquisar, sinais, pedido_atual):
+        super().__init__()
+        self.pedido = pedido
+        self.texto = texto
+        self.antes_de = antes_de
+        self.limite = limite
+        self.pesquisar = pesquisar
+        self.sinais = sinais
+        self.pedido_atual = pedido_atual
+
+    def run(self):
+        try:
+            if self.pedido_atual() != self.pedido:
+                return
+            linhas = [tuple(row) for row in self.pesquisar(self.texto, self.antes_de, self.limite)]
+            if self.pedido_atual() != self.pedido:
+                return
+            self.sinais.pagina_busca.emit(self.pedido, linhas, len(linhas) < self.limite)
+        except Exception as e:
+            self.sinais.busca_falhou.emit(self.pedido, str(e))
+
+
+def criar_pool_consulta(parent):
+    # Uma thread fixa: consultas em fila são descartadas rápido quando ficam velhas,
+    # e a conexão SQLite (por thread) não é reaberta quando o pool recicla threads
+    pool = QtCore.QThreadPool(parent)
+    pool.setMaxThreadCount(1)
+    pool.setExpiryTimeout(-1)
+    return pool
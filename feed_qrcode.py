@@ -0,0 +1,124 @@
+import threading
+import time
+
+# Feed de linhas novas do banco_qrcode.db (gravado por outro processo). Uma thread
+# consulta PRAGMA data_version, que só muda quando outra conexão faz commit; aí lê
+# sqlite_sequence e entrega apenas as linhas com ID > último visto, em lotes
+# limitados, aos assinantes (caches, fila da prensa). A tabela nunca é relida.
+#
+# As linhas são tratadas como só-inserção: caches continuam válidos entre commits.
+# Arquivo substituído (novo inode) ou sequência que volta para trás contam como
+# reinício: a geração muda e os assinantes de reinício são chamados.
+#
+# 'desde' faz o feed começar de um ID anterior (ex.: o último de um snapshot salvo)
+# e entregar o que falta em lotes, em vez de só o que chegar daqui em diante.
+
+
+class FeedQRCode:
+    SQL_LINHAS = ('SELECT ID, Texto, Carro, Job_Key, Maco, Terminais FROM qrcode '
+                  'WHERE ID > ? ORDER BY ID LIMIT ?')
+
+    def __init__(self, db, intervalo=0.5, tamanho_lote=500, desde=None):
+        self.db = db
+        self.desde = desde
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        # Chamados na thread do feed: ao_receber(linhas, cauda) por lote, ao_reiniciar() sem argumentos.
+        # 'cauda' indica o último lote do ciclo (as linhas mais recentes).
+        self.assinantes = []
+        self.ao_reiniciar = []
+        self.ultimo_id = 0
+        self.geracao = 0
+        self.identidade = None
+        self.stats = {'ciclos': 0, 'commits': 0, 'lotes': 0, 'linhas': 0, 'reinicios': 0}
+        self._data_version = None
+        self._ultimo_erro = None
+        self._parar = threading.Event()
+        self._iniciado = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='qrcode-feed', daemon=True)
+        self._thread.start()
+
+    @property
+    def versao(self):
+        # Chave de validade dos caches: muda só quando o arquivo é trocado ou reiniciado
+        return (self.identidade, self.geracao)
+
+    def assinar(self, ao_receber):
+        self.assinantes.append(ao_receber)
+
+    def esperar_inicio(self, timeout=None):
+        return self._iniciado.wait(timeout)
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join(timeout=1.0)
+
+    def _sequencia(self, conn):
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'qrcode'").fetchone()
+        return row[0] if row else 0
+
+    def reler_desde(self, qr_id):
+        # Próximo ciclo entrega tudo a partir de qr_id (chamar na thread do feed, ex.: em ao_reiniciar)
+        self.ultimo_id = qr_id
+        self._data_version = None
+
+    def _reiniciar(self, conn, desde=None):
+        self.identidade = self.db.identidade_arquivo()
+        self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        self.ultimo_id = self._sequencia(conn)
+        if desde is not None and desde < self.ultimo_id:
+            self.reler_desde(desde)
+        self.geracao += 1
+        self.stats['reinicios'] += 1
+        for callback in self.ao_reiniciar:
+            callback()
+
+    def verificar(self):
+        # Um ciclo: retorna quantas linhas novas foram entregues
+        conn = self.db.conexao()
+        self.stats['ciclos'] += 1
+        if self.identidade != self.db.identidade_arquivo():
+            self._reiniciar(conn)
+            return 0
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return 0
+        self._data_version = data_version
+        self.stats['commits'] += 1
+        sequencia = self._sequencia(conn)
+        if sequencia < self.ultimo_id:
+            self._reiniciar(conn)
+            return 0
+        entregues = 0
+        while self.ultimo_id < sequencia and not self._parar.is_set():
+            linhas = conn.execute(self.SQL_LINHAS, (self.ultimo_id, self.tamanho_lote)).fetchall()
+            if not linhas:
+                break
+            self.ultimo_id = linhas[-1]['ID']
+            cauda = len(linhas) < self.tamanho_lote or self.ultimo_id >= sequencia
+            for callback in self.assinantes:
+                try:
+                    callback(linhas, cauda)
+                except Exception as e:
+                    print(f"Feed: assinante falhou: {e}")
+            entregues += len(linhas)
+            self.stats['lotes'] += 1
+            self.stats['linhas'] += len(linhas)
+        return entregues
+
+    def _executar(self):
+        try:
+            self._reiniciar(self.db.conexao(), self.desde)
+        except Exception as e:
+            print(f"Feed indisponível: {e}")
+        self._iniciado.set()
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.verificar()
+                self._ultimo_erro = None
+            except Exception as e:
+                # Banco ausente/trocado no meio da cópia: avisa uma vez e continua tentando
+                if str(e) != self._ultimo_erro:
+                    print(f"Feed: falha ao verificar banco: {e}")
+                    self._ultimo_erro = str(e)
+                time.sleep(self.intervalo)
@@ -0,0 +1,222 @@
+import bisect
+import threading
+from array import array
+from collections import Counter, namedtuple
+
+from qrcode_parser import parse_qrcode
+
+# Fila "o que vem para a minha prensa": maços pendentes que usam algum terminal da
+# prensa fixada. Os terminais de cada maço saem do Texto já parseado (T e S); a coluna
+# Terminais só tem os T e deixaria de fora os maços que chegam à prensa por um S.
+# A carga percorre a tabela pela chave primária em lotes de 'tamanho_lote' e cada
+# combinação distinta de terminais da prensa vira um perfil. Linhas novas entram de
+# forma incremental (ID > último visto), em lotes limitados: por polling próprio a
+# cada 'intervalo' ou, com intervalo=None, empurradas pelo feed via receber().
+#
+# Se a carga inicial falha (banco travado na partida), ela é repetida com espera
+# crescente até ESPERA_MAX_S e o erro fica em 'erro' para a tela. O que o feed entregar
+# antes da carga não é guardado: a carga termina lendo do banco até o MAX(ID) atual.
+
+FilaItem = namedtuple('FilaItem', ['qr_id', 'carro', 'job_key', 'maco', 'terminais'])
+
+ORDENS = ('id', 'setup')
+ESPERA_MAX_S = 60.0
+
+
+def _contem(ids, n, qr_id):
+    # ids em ordem crescente (só cresce por append de IDs maiores)
+    i = bisect.bisect_left(ids, qr_id, 0, n)
+    return i < n and ids[i] == qr_id
+
+
+class FilaPrensa:
+    def __init__(self, db, prensa_id, terminais, concluidos=(), ordem='id', exibidos=200,
+                 intervalo=5.0, tamanho_lote=500, ao_atualizar=None):
+        if ordem not in ORDENS:
+            raise ValueError(f"Ordem inválida: {ordem} (use {', '.join(ORDENS)})")
+        self.db = db
+        self.prensa_id = prensa_id
+        self.terminais = frozenset(terminais)
+        self.ordem = ordem
+        self.exibidos = exibidos
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.ao_atualizar = ao_atualizar
+        # IDs pendentes em ordem crescente e o perfil (setup) de cada um, em arrays compactos
+        self._ids = array('q')
+        self._perfil_do_id = array('l')
+        self._perfis = []
+        self._indice_perfil = {}
+        self.concluidos = set(concluidos)
+        self.ultimo_id = 0
+        self.proximos = []
+        self.pendentes = 0
+        self.carregada = False
+        self.erro = None
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._parar = False
+        self._thread = threading.Thread(target=self._executar, name=f'fila-{prensa_id}', daemon=True)
+        self._thread.start()
+
+    def _perfil(self, texto):
+        # Texto do QR -> índice do perfil (Counter só dos terminais da prensa) ou -1
+        qtd = Counter(terminal for terminal, _ in parse_qrcode(texto or '').aplicacoes
+                      if terminal in self.terminais)
+        if not qtd:
+            return -1
+        chave = tuple(sorted(qtd.items()))
+        indice = self._indice_perfil.get(chave)
+        if indice is None:
+            indice = len(self._perfis)
+            self._perfis.append(qtd)
+            self._indice_perfil[chave] = indice
+        return indice
+
+    def _adicionar(self, linhas, ids=None, perfis=None):
+        ids = self._ids if ids is None else ids
+        perfis = self._perfil_do_id if perfis is None else perfis
+        for qr_id, texto in linhas:
+            indice = self._perfil(texto)
+            if indice >= 0:
+                ids.append(qr_id)
+                perfis.append(indice)
+
+    def _linhas(self, conn, inicio, limite):
+        # Lotes (ID, Texto) em ordem de ID, sem cursor aberto entre um lote e outro
+        while inicio < limite:
+            linhas = conn.execute('SELECT ID, Texto FROM qrcode WHERE ID > ? AND ID <= ? ORDER BY ID LIMIT ?',
+                                  (inicio, limite, self.tamanho_lote)).fetchall()
+            if not linhas:
+                return
+            inicio = linhas[-1][0]
+            yield linhas
+
+    def carregar_inicial(self):
+        conn = self.db.conexao()
+        limite = conn.execute('SELECT MAX(ID) FROM qrcode').fetchone()[0] or 0
+        ids = array('q')
+        perfis = array('l')
+        for linhas in self._linhas(conn, 0, limite):
+            self._adicionar(linhas, ids, perfis)
+        with self._lock:
+            self._ids, self._perfil_do_id = ids, perfis
+            self.ultimo_id = limite
+            self.carregada = True
+        # O que chegou ao banco durante a carga (o feed só é ouvido a partir daqui)
+        self.atualizar()
+
+    def atualizar(self):
+        conn = self.db.conexao()
+        limite = conn.execute('SELECT MAX(ID) FROM qrcode').fetchone()[0] or 0
+        novos = 0
+        for linhas in self._linhas(conn, self.ultimo_id, limite):
+            with self._lock:
+                # O feed pode ter entregado parte do lote enquanto ele era lido
+                linhas = [linha for linha in linhas if linha[0] > self.ultimo_id]
+                if not linhas:
+                    continue
+                antes = len(self._ids)
+                self._adicionar(linhas)
+                novos += len(self._ids) - antes
+                self.ultimo_id = linhas[-1][0]
+        return novos
+
+    def receber(self, linhas, cauda=True):
+        # Assinante do FeedQRCode: linhas (ID, Texto, ...) em ordem crescente de ID
+        with self._lock:
+            if not self.carregada:
+                return
+            novas = [(row['ID'], row['Texto']) for row in linhas if row['ID'] > self.ultimo_id]
+            if not novas:
+                return
+            antes = len(self._ids)
+            self._adicionar(novas)
+            self.ultimo_id = novas[-1][0]
+            alterada = len(self._ids) > antes
+        if alterada and cauda:
+            self._evento.set()
+
+    def _ordenar(self):
+        # Só os primeiros 'exibidos' pendentes e a contagem; a fila inteira não vira lista
+        with self._lock:
+            ids, perfis = self._ids, self._perfil_do_id
+            n = len(ids)
+        concluidos = set(self.concluidos)
+        if self.ordem == 'id':
+            topo = []
+            for qr_id, perfil in zip(ids[:n], perfis[:n]):
+                if qr_id not in concluidos:
+                    topo.append((qr_id, perfil))
+                    if len(topo) == self.exibidos:
+                        break
+        else:
+            # Mesmo conjunto de terminais em sequência (sem troca de ferramenta);
+            # grupos na ordem do maço mais antigo de cada um
+            grupos = {}
+            chaves = [tuple(sorted(qtd)) for qtd in self._perfis]
+            for qr_id, perfil in zip(ids[:n], perfis[:n]):
+                if qr_id in concluidos:
+                    continue
+                grupo = grupos.setdefault(chaves[perfil], [])
+                if len(grupo) < self.exibidos:
+                    grupo.append((qr_id, perfil))
+            topo = [item for grupo in grupos.values() for item in grupo][:self.exibidos]
+        feitos = sum(1 for qr_id in concluidos if _contem(ids, n, qr_id))
+        return topo, n - feitos
+
+    def _montar_proximos(self):
+        topo, pendentes = self._ordenar()
+        linhas = self.db.buscar_varios([qr_id for qr_id, _ in topo])
+        proximos = []
+        for qr_id, perfil in topo:
+            row = linhas.get(qr_id)
+            if row is not None:
+                proximos.append(FilaItem(qr_id, row['Carro'], row['Job_Key'], row['Maco'], self._perfis[perfil]))
+        self.proximos = proximos
+        self.pendentes = pendentes
+
+    def itens(self):
+        # Instantâneo para a GUI, já sem o que foi concluído desde a última montagem
+        return [item for item in self.proximos if item.qr_id not in self.concluidos]
+
+    def concluir(self, qr_id):
+        self.concluidos.add(int(qr_id))
+        self._evento.set()
+
+    def reabrir(self, qr_id):
+        self.concluidos.discard(int(qr_id))
+        self._evento.set()
+
+    def parar(self):
+        self._parar = True
+        self._evento.set()
+
+    def _executar(self):
+        espera = 1.0
+        while not self._parar and not self.carregada:
+            try:
+                self.carregar_inicial()
+                self.erro = None
+            except Exception as e:
+                if str(e) != self.erro:
+                    print(f"Fila {self.prensa_id}: falha ao carregar ({e}), tentando de novo")
+                self.erro = str(e)
+                if self.ao_atualizar is not None and not self._parar:
+                    self.ao_atualizar()
+                self._evento.wait(espera)
+                self._evento.clear()
+                espera = min(espera * 2, ESPERA_MAX_S)
+        alterada = True
+        while not self._parar:
+            try:
+                # Remonta só com linhas novas ou depois de concluir/reabrir/receber
+                novas = self.atualizar() if self.intervalo is not None else 0
+                if novas or alterada:
+                    self._montar_proximos()
+                    if self.ao_atualizar is not None and not self._parar:
+                        self.ao_atualizar()
+            except Exception as e:
+                print(f"Fila {self.prensa_id}: falha ao atualizar: {e}")
+            alterada = self._evento.wait(self.intervalo)
+            self._evento.clear()
@@ -0,0 +1,383 @@
+import argparse
+import fcntl
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# Backend de entrada direto do gamepad (/dev/input/eventN, interface evdev do kernel),
+# sem passar por um mapeador para teclas do X. Uma thread lê os eventos e entrega
+# ações semânticas (up/down/enter/...) com o passo do incremento:
+#   - botões (EV_KEY) e eixos (EV_ABS: d-pad como hat ou analógico) viram "fontes"
+#     'key:304', 'abs:17:-', 'abs:1:+', mapeadas para ações no gamepad_keys.json;
+#   - eixos analógicos têm histerese (ativa em 60% do curso, solta abaixo de 40%);
+#   - debounce: soltar e apertar de novo dentro de debounce_ms é o mesmo toque;
+#   - segurando up/down, repetições a cada intervalo_ms com o passo da curva de
+#     aceleração [[segundos segurando, passo], ...].
+#
+# O processamento usa só o tempo de cada evento, então uma gravação reproduz as mesmas
+# ações do dispositivo. Gravações: binárias (cat /dev/input/eventN > gravacao.bin) ou
+# texto, uma linha "tempo tipo codigo valor" por evento (sintéticas, editáveis à mão).
+#
+#   python3 gamepad_evdev.py /dev/input/event3                  (mostra as ações)
+#   python3 gamepad_evdev.py /dev/input/event3 --gravar a.txt   (grava em texto)
+#   python3 gamepad_evdev.py a.txt                              (reproduz a gravação)
+
+Evento = namedtuple('Evento', ['tempo', 'tipo', 'codigo', 'valor'])
+
+EV_SYN = 0
+EV_KEY = 1
+EV_ABS = 3
+SYN_DROPPED = 3
+# ABS_HAT0X..ABS_HAT3Y: d-pad reportado como eixo de -1 a 1
+HATS = range(0x10, 0x18)
+
+# struct input_event: timeval (long, long), type, code, value
+FORMATO_EVENTO = 'llHHi'
+TAMANHO_EVENTO = struct.calcsize(FORMATO_EVENTO)
+# EVIOCGABS(codigo): struct input_absinfo (value, minimum, maximum, fuzz, flat, resolution)
+EVIOCGABS = 0x80184540
+
+ACOES = ('up', 'down', 'left', 'right', 'enter', 'focus_input')
+CONFIG_PADRAO = {
+    'curva': [[0, 1], [3, 10], [5, 100]],
+    'intervalo_ms': 100,
+    'debounce_ms': 30,
+    'repetir': ['up', 'down'],
+}
+
+LIMIAR_ATIVA = 0.6
+LIMIAR_SOLTA = 0.4
+
+
+def faixa_padrao(codigo):
+    return (-1, 1) if codigo in HATS else (-32768, 32767)
+
+
+def normalizar(valor, faixa):
+    minimo, maximo = faixa
+    meia = (maximo - minimo) / 2.0
+    return (valor - minimo - meia) / meia if meia else 0.0
+
+
+def fonte_pressionada(evento, faixa=None):
+    # Fonte de um evento de "apertar" (usado pelo configure_gamepad para aprender o mapa); senão None
+    if evento.tipo == EV_KEY and evento.valor == 1:
+        return f'key:{evento.codigo}'
+    if evento.tipo == EV_ABS:
+        n = normalizar(evento.valor, faixa or faixa_padrao(evento.codigo))
+        if abs(n) >= LIMIAR_ATIVA:
+            return f"abs:{evento.codigo}:{'+' if n > 0 else '-'}"
+    return None
+
+
+class ProcessadorGamepad:
+    # Máquina de estados pura: eventos (com tempo em segundos) -> [(acao, passo, repeticao)]
+    def __init__(self, mapa, config=None, eixos=None):
+        config = dict(CONFIG_PADRAO, **(config or {}))
+        self.mapa = {acao: list(mapa.get(acao, [])) for acao in ACOES}
+        self._acao_da_fonte = {fonte: acao for acao, fontes in self.mapa.items() for fonte in fontes}
+        self.curva = sorted((float(segundos), int(passo)) for segundos, passo in config['curva'])
+        self.intervalo = config['intervalo_ms'] / 1000.0
+        self.debounce = config['debounce_ms'] / 1000.0
+        self.repetir = frozenset(config['repetir'])
+        # Faixa (mínimo, máximo) de cada eixo: do dispositivo, da config ou o padrão
+        self.eixos = {int(codigo): tuple(faixa) for codigo, faixa in (eixos or {}).items()}
+        self._fontes = set()
+        self._pressionadas = {}
+        self._soltas = {}
+        self._proxima = {}
+
+    def codigos_abs(self):
+        return sorted({int(fonte.split(':')[1]) for fonte in self._acao_da_fonte if fonte.startswith('abs:')})
+
+    def passo(self, segurando):
+        passo = self.curva[0][1]
+        for segundos, p in self.curva:
+            if segurando >= segundos:
+                passo = p
+        return passo
+
+    def _mudancas(self, evento):
+        if evento.tipo == EV_KEY:
+            return [(f'key:{evento.codigo}', evento.valor != 0)]
+        if evento.tipo == EV_ABS:
+            n = normalizar(evento.valor, self.eixos.get(evento.codigo) or faixa_padrao(evento.codigo))
+            mudancas = []
+            for sinal, lado in (('+', n), ('-', -n)):
+                fonte = f'abs:{evento.codigo}:{sinal}'
+                limiar = LIMIAR_SOLTA if fonte in self._fontes else LIMIAR_ATIVA
+                mudancas.append((fonte, lado >= limiar))
+            return mudancas
+        return []
+
+    def _instante(self, acao):
+        # Repetição n de uma ação segurada desde t: t + n * intervalo (sem acumular erro de soma)
+        return round(self._pressionadas[acao] + self._proxima[acao] * self.intervalo, 6)
+
+    def proxima_repeticao(self):
+        return min((self._instante(acao) for acao in self._proxima), default=None)
+
+    def tick(self, tempo, inclusivo=False):
+        # Repetições vencidas até 'tempo' (inclusivo: também as agendadas exatamente nele), em ordem
+        saidas = []
+        while True:
+            proxima = self.proxima_repeticao()
+            if proxima is None or proxima > tempo or (proxima == tempo and not inclusivo):
+                return saidas
+            acao = min(self._proxima, key=self._instante)
+            saidas.append((acao, self.passo(round(self._proxima[acao] * self.intervalo, 6)), True))
+            self._proxima[acao] += 1
+
+    def processar(self, evento):
+        saidas = self.tick(evento.tempo)
+        if evento.tipo == EV_SYN and evento.codigo == SYN_DROPPED:
+            # Buffer do kernel transbordou: estado desconhecido, solta tudo
+            self._fontes.clear()
+            self._pressionadas.clear()
+            self._proxima.clear()
+            return saidas
+        for fonte, ativa in self._mudancas(evento):
+            acao = self._acao_da_fonte.get(fonte)
+            if acao is None:
+                continue
+            if ativa:
+                self._fontes.add(fonte)
+            else:
+                self._fontes.discard(fonte)
+            pressionada = any(f in self._fontes for f in self.mapa[acao])
+            if pressionada and acao not in self._pressionadas:
+                solta = self._soltas.pop(acao, None)
+                if solta is not None and evento.tempo - solta[0] < self.debounce:
+                    # Repique do contato: continua o toque anterior, sem nova ação
+                    self._pressionadas[acao] = inicio = solta[1]
+                    if acao in self.repetir:
+                        self._proxima[acao] = int((evento.tempo - inicio) / self.intervalo) + 1
+                    continue
+                self._pressionadas[acao] = evento.tempo
+                if acao in self.repetir:
+                    self._proxima[acao] = 1
+                saidas.append((acao, self.passo(0.0), False))
+            elif not pressionada and acao in self._pressionadas:
+                self._soltas[acao] = (evento.tempo, self._pressionadas.pop(acao))
+                self._proxima.pop(acao, None)
+        return saidas
+
+
+def ler_gravacao(caminho):
+    # Gravação binária (input_event crus) ou texto "tempo tipo codigo valor" (# comenta)
+    if caminho.endswith('.txt'):
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                campos = linha.split('#', 1)[0].split()
+                if campos:
+                    yield Evento(float(campos[0]), int(campos[1], 0), int(campos[2], 0), int(campos[3], 0))
+        return
+    with open(caminho, 'rb') as f:
+        while True:
+            dados = f.read(TAMANHO_EVENTO)
+            if len(dados) < TAMANHO_EVENTO:
+                return
+            segundos, micros, tipo, codigo, valor = struct.unpack(FORMATO_EVENTO, dados)
+            yield Evento(segundos + micros / 1e6, tipo, codigo, valor)
+
+
+def repeticoes_antes(processador, tempo):
+    # Próximo instante de repetição antes de 'tempo' e as repetições dele; (None, []) se não há
+    proxima = processador.proxima_repeticao()
+    if proxima is None or proxima >= tempo:
+        return None, []
+    return proxima, processador.tick(proxima, inclusivo=True)
+
+
+def reproduzir(caminho, mapa, config=None, eixos=None):
+    # Ações de uma gravação, sem thread nem dispositivo: [(tempo, acao, passo, repeticao)],
+    # as repetições no instante em que foram agendadas (entre um evento e o seguinte)
+    processador = ProcessadorGamepad(mapa, config, eixos)
+    acoes = []
+    for evento in ler_gravacao(caminho):
+        while True:
+            instante, repeticoes = repeticoes_antes(processador, evento.tempo)
+            if instante is None:
+                break
+            acoes.extend((instante,) + acao for acao in repeticoes)
+        acoes.extend((evento.tempo,) + acao for acao in processador.processar(evento))
+    return acoes
+
+
+def faixas_do_dispositivo(fd, codigos):
+    faixas = {}
+    for codigo in codigos:
+        try:
+            info = fcntl.ioctl(fd, EVIOCGABS + codigo, bytes(24))
+        except OSError:
+            continue
+        _, minimo, maximo, _, _, _ = struct.unpack('6i', info)
+        if maximo > minimo:
+            faixas[codigo] = (minimo, maximo)
+    return faixas
+
+
+def faixas_do_caminho(caminho, codigos=range(0x40)):
+    # Faixas de todos os eixos de um dispositivo; {} para gravações ou sem permissão
+    if os.path.isfile(caminho):
+        return {}
+    try:
+        fd = os.open(caminho, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return {}
+    try:
+        return faixas_do_dispositivo(fd, codigos)
+    finally:
+        os.close(fd)
+
+
+class GamepadEvdev:
+    # Thread de leitura: dispositivo (/dev/input/...) ou gravação (reproduzida em tempo real).
+    # ao_acao(acao, passo, repeticao) é chamado na thread; use um sinal Qt para voltar à GUI.
+    def __init__(self, caminho, mapa, config=None, ao_acao=None, ao_evento=None):
+        self.caminho = caminho
+        self.config = config or {}
+        self.ao_acao = ao_acao
+        # ao_evento(Evento) recebe os eventos crus (aprendizado do mapa, gravação)
+        self.ao_evento = ao_evento
+        self.processador = ProcessadorGamepad(mapa, self.config, self.config.get('eixos'))
+        self.faixas = {}
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='gamepad-evdev', daemon=True)
+        self._thread.start()
+
+    def atualizar_mapa(self, mapa, config=None):
+        # Troca o processador inteiro (atribuição atômica); ações seguradas são soltas
+        self.config = config or self.config
+        eixos = dict(self.config.get('eixos') or {}, **self.faixas)
+        self.processador = ProcessadorGamepad(mapa, self.config, eixos)
+
+    def ativo(self):
+        return self._thread.is_alive()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join(timeout=1.0)
+
+    def _entregar(self, acoes):
+        if self.ao_acao is not None:
+            for acao in acoes:
+                self.ao_acao(*acao)
+
+    def _executar(self):
+        if os.path.isfile(self.caminho):
+            self._reproduzir()
+            return
+        ultimo_erro = None
+        while not self._parar.is_set():
+            try:
+                self._ler_dispositivo()
+            except OSError as e:
+                # Gamepad desconectado (ou ainda não conectado): tenta de novo a cada segundo
+                if str(e) != ultimo_erro:
+                    print(f"Gamepad evdev indisponível: {e}")
+                    ultimo_erro = str(e)
+            self._parar.wait(1.0)
+
+    def _reproduzir(self):
+        inicio = None
+        for evento in ler_gravacao(self.caminho):
+            if inicio is None:
+                inicio = (time.monotonic(), evento.tempo)
+            # Dorme até o próximo evento ou a próxima repetição agendada, o que vier antes
+            while True:
+                processador = self.processador
+                proxima = processador.proxima_repeticao()
+                alvo = evento.tempo if proxima is None else min(proxima, evento.tempo)
+                espera = inicio[0] + alvo - inicio[1] - time.monotonic()
+                if self._parar.wait(max(0.0, espera)):
+                    return
+                instante, repeticoes = repeticoes_antes(processador, evento.tempo)
+                if instante is None:
+                    break
+                self._entregar(repeticoes)
+            if self.ao_evento is not None:
+                self.ao_evento(evento)
+            self._entregar(self.processador.processar(evento))
+
+    def _ler_dispositivo(self):
+        fd = os.open(self.caminho, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            processador = self.processador
+            self.faixas = faixas_do_dispositivo(fd, processador.codigos_abs())
+            processador.eixos.update(self.faixas)
+            print(f"Gamepad evdev: {self.caminho}")
+            pendente = b''
+            while not self._parar.is_set():
+                processador = self.processador
+                proxima = processador.proxima_repeticao()
+                espera = 0.5 if proxima is None else min(0.5, max(0.0, proxima - time.monotonic()))
+                prontos, _, _ = select.select([fd], [], [], espera)
+                # Relógio de leitura (monotônico) em vez do timestamp do kernel: o mesmo das repetições
+                agora = time.monotonic()
+                if not prontos:
+                    self._entregar(processador.tick(agora))
+                    continue
+                dados = os.read(fd, TAMANHO_EVENTO * 64)
+                if not dados:
+                    raise OSError("dispositivo fechado")
+                pendente += dados
+                completos = len(pendente) - len(pendente) % TAMANHO_EVENTO
+                for i in range(0, completos, TAMANHO_EVENTO):
+                    _, _, tipo, codigo, valor = struct.unpack_from(FORMATO_EVENTO, pendente, i)
+                    evento = Evento(agora, tipo, codigo, valor)
+                    if self.ao_evento is not None:
+                        self.ao_evento(evento)
+                    self._entregar(processador.processar(evento))
+                pendente = pendente[completos:]
+        finally:
+            os.close(fd)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lê o gamepad por evdev (ou reproduz uma gravação) e mostra as ações")
+    parser.add_argument('origem', help="/dev/input/eventN ou gravação (.txt texto, senão binária)")
+    parser.add_argument('--config', default='gamepad_keys.json', help="mapa de ações (seção 'evdev')")
+    parser.add_argument('--gravar', metavar='ARQUIVO', help="grava os eventos recebidos em texto")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f).get('evdev', {})
+    except FileNotFoundError:
+        config = {}
+
+    if os.path.isfile(args.origem) and not args.gravar:
+        for tempo, acao, passo, repeticao in reproduzir(args.origem, config, config, config.get('eixos')):
+            print(f"{tempo:10.3f}  {acao:<12} {passo:+d}{'  (repetição)' if repeticao else ''}")
+        return 0
+
+    gravacao = open(args.gravar, 'w', encoding='utf-8') if args.gravar else None
+
+    def ao_evento(evento):
+        if gravacao is not None and not (evento.tipo == EV_SYN and evento.codigo == 0):
+            gravacao.write(f"{evento.tempo:.6f} {evento.tipo} {evento.codigo} {evento.valor}\n")
+            gravacao.flush()
+
+    def ao_acao(acao, passo, repeticao):
+        print(f"{acao:<12} {passo:+d}{'  (repetição)' if repeticao else ''}")
+
+    gamepad = GamepadEvdev(args.origem, config, config, ao_acao, ao_evento)
+    try:
+        while gamepad.ativo():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        gamepad.parar()
+    finally:
+        if gravacao is not None:
+            gravacao.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
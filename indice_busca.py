@@ -0,0 +1,69 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Índice de busca por Job_Key / Carro / Maço: tabela FTS5 de conteúdo externo
+# (os textos ficam só em qrcode) mantida em sincronia por triggers. O viewer abre o
+# banco somente-leitura, então o índice é criado aqui, uma vez; depois disso cada
+# INSERT/UPDATE/DELETE em qrcode atualiza o índice na mesma transação.
+#
+#   python3 indice_busca.py                 (cria se não existir)
+#   python3 indice_busca.py --reconstruir   (refaz a partir de qrcode)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# prefix 1..7: cada prefixo digitado ("4", "451", "45175") lê uma lista pronta em vez de juntar
+# as listas de todos os termos que começam com ele. Carro tem 6 dígitos e Job_Key 8.
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS qrcode_fts USING fts5(
+    Job_Key, Carro, Maco,
+    content='qrcode', content_rowid='ID',
+    tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6 7'
+);
+CREATE TRIGGER IF NOT EXISTS qrcode_fts_ai AFTER INSERT ON qrcode BEGIN
+    INSERT INTO qrcode_fts (rowid, Job_Key, Carro, Maco) VALUES (new.ID, new.Job_Key, new.Carro, new.Maco);
+END;
+CREATE TRIGGER IF NOT EXISTS qrcode_fts_ad AFTER DELETE ON qrcode BEGIN
+    INSERT INTO qrcode_fts (qrcode_fts, rowid, Job_Key, Carro, Maco) VALUES ('delete', old.ID, old.Job_Key, old.Carro, old.Maco);
+END;
+CREATE TRIGGER IF NOT EXISTS qrcode_fts_au AFTER UPDATE OF Job_Key, Carro, Maco ON qrcode BEGIN
+    INSERT INTO qrcode_fts (qrcode_fts, rowid, Job_Key, Carro, Maco) VALUES ('delete', old.ID, old.Job_Key, old.Carro, old.Maco);
+    INSERT INTO qrcode_fts (rowid, Job_Key, Carro, Maco) VALUES (new.ID, new.Job_Key, new.Carro, new.Maco);
+END;
+"""
+
+
+def criar_indice(caminho_banco, reconstruir=False):
+    conn = sqlite3.connect(caminho_banco, timeout=30.0)
+    existia = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'qrcode_fts'").fetchone() is not None
+    with conn:
+        conn.executescript(SCHEMA)
+        if reconstruir or not existia:
+            conn.execute("INSERT INTO qrcode_fts (qrcode_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO qrcode_fts (qrcode_fts) VALUES ('optimize')")
+    total = conn.execute('SELECT COUNT(*) FROM qrcode').fetchone()[0]
+    conn.close()
+    return total, reconstruir or not existia
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cria o índice FTS5 de busca por Job_Key / Carro / Maço")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    parser.add_argument('--reconstruir', action='store_true', help="refaz o índice a partir da tabela qrcode")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    try:
+        total, indexado = criar_indice(args.banco, args.reconstruir)
+    except sqlite3.OperationalError as e:
+        print(f"Falha ao criar índice (SQLite sem FTS5?): {e}")
+        return 1
+    acao = "indexadas" if indexado else "já indexadas"
+    print(f"{total} linhas {acao} em {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,369 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from feed_qrcode import FeedQRCode
+from qrcode_db import QRCodeDB
+from rotas_cache import atualizar as atualizar_rotas
+
+# Manutenção do banco_qrcode.db:
+#
+#   python3 manutencao_banco.py relatorio                 tamanho e uso de cada índice pelas consultas do sistema
+#   python3 manutencao_banco.py reconstruir [--aplicar]   deixa só os índices que as consultas usam + VACUUM
+#   python3 manutencao_banco.py importar linhas.csv       importação em lotes grandes (CSV, JSON ou JSON lines)
+#   python3 manutencao_banco.py manter                    ANALYZE / VACUUM quando vencidos (para o cron)
+#
+# O viewer só consulta por ID (chave primária, também na carga da fila da prensa), por
+# Carro / Job_Key (lote) e por prefixo de Carro / Job_Key / Maço (busca sem FTS, uma faixa
+# de índice por coluna). idx_terminais sobrou da fila antiga (a coluna
+# Terminais só tem os T); idx_busca cobre o Texto inteiro e custa quase o mesmo que a
+# tabela; idx_id_desc duplica a chave primária (que já é percorrida de trás para frente).
+#
+# Agendamento sugerido (crontab): 0 3 * * * cd /home/pi/viewer && python3 manutencao_banco.py manter
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+INDICES = {
+    'idx_carro': 'CREATE INDEX IF NOT EXISTS idx_carro ON qrcode(Carro)',
+    'idx_jobkey': 'CREATE INDEX IF NOT EXISTS idx_jobkey ON qrcode(Job_Key)',
+    'idx_maco': 'CREATE INDEX IF NOT EXISTS idx_maco ON qrcode(Maco)',
+}
+
+# (descrição, SQL, parâmetros) de cada caminho de consulta do sistema
+CONSULTAS = (
+    ('viewer: linha por ID', QRCodeDB.SQL_BUSCA, (1,)),
+    ('prefetch: vários IDs', 'SELECT ID, Texto, Carro, Job_Key, Maco FROM qrcode WHERE ID IN (?, ?, ?)', (1, 2, 3)),
+    ('feed: linhas novas', FeedQRCode.SQL_LINHAS, (0, 500)),
+    ('fila: último ID', 'SELECT MAX(ID) FROM qrcode', ()),
+    ('fila: linhas em ordem de ID', 'SELECT ID, Texto FROM qrcode WHERE ID > ? AND ID <= ? ORDER BY ID LIMIT ?',
+     (0, 0, 500)),
+    ('lote: por Job_Key', 'SELECT ID, Texto, Carro, Job_Key, Maco FROM qrcode WHERE Job_Key = ? ORDER BY ID', ('',)),
+    ('lote: por Carro', 'SELECT ID, Texto, Carro, Job_Key, Maco FROM qrcode WHERE Carro = ? ORDER BY ID', ('',)),
+    ('busca sem FTS: prefixo', f'SELECT ID, Job_Key, Carro, Maco FROM qrcode WHERE ID IN ({QRCodeDB.SQL_PREFIXO}) '
+     'AND ID < ? ORDER BY ID DESC LIMIT ?', ('4', '4\uffff') * 3 + (2 ** 63 - 1, 50)),
+)
+
+COLUNAS = ('Job_Key', 'Versao', 'Carro', 'Maco', 'Data', 'Texto', 'Terminais', 'Qtd_Terminais')
+SQL_INSERIR = f"INSERT INTO qrcode ({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})"
+
+SCHEMA_MANUTENCAO = """
+CREATE TABLE IF NOT EXISTS qrcode_manutencao (
+    tarefa TEXT PRIMARY KEY,
+    quando REAL NOT NULL
+);
+"""
+
+
+def conectar(caminho):
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Banco de dados não encontrado em: {caminho}")
+    return sqlite3.connect(caminho, timeout=30.0)
+
+
+def indices_da_tabela(conn, tabela='qrcode'):
+    # {nome: sql} dos índices criados com CREATE INDEX (os automáticos não têm sql)
+    return dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                             'AND sql IS NOT NULL ORDER BY name', (tabela,)))
+
+
+def tamanhos(conn):
+    # Bytes por tabela/índice (dbstat); vazio se o SQLite foi compilado sem ele
+    try:
+        return dict(conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def plano(conn, sql, params):
+    # Índices (ou a chave primária) que o planejador escolhe para a consulta
+    usados = []
+    for *_, detalhe in conn.execute('EXPLAIN QUERY PLAN ' + sql, params):
+        for marcador in ('USING COVERING INDEX ', 'USING INDEX '):
+            if marcador in detalhe:
+                usados.append(detalhe.split(marcador, 1)[1].split(' ', 1)[0])
+                break
+        else:
+            # 'SEARCH qrcode' sem índice: MAX(ID) lido direto da ponta da chave primária
+            if 'INTEGER PRIMARY KEY' in detalhe or 'rowid' in detalhe or detalhe.startswith('SEARCH'):
+                usados.append('(chave primária)')
+            elif detalhe.startswith('SCAN'):
+                usados.append('(varredura)')
+    return usados
+
+
+def conexao_reconstruida(conn):
+    # Banco vazio em memória com a tabela qrcode e só os INDICES: os planos de depois do reconstruir
+    simulada = sqlite3.connect(':memory:')
+    simulada.execute(conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'qrcode'").fetchone()[0])
+    for sql in INDICES.values():
+        simulada.execute(sql)
+    return simulada
+
+
+def relatorio(caminho, saida=sys.stdout):
+    conn = conectar(caminho)
+    conn.execute('PRAGMA query_only = ON')
+    indices = indices_da_tabela(conn)
+    bytes_por_nome = tamanhos(conn)
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    paginas = conn.execute('PRAGMA page_count').fetchone()[0]
+    livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    linhas = conn.execute('SELECT COUNT(*) FROM qrcode').fetchone()[0]
+    total = page_size * paginas
+
+    saida.write(f"{caminho}: {total / 1048576:.1f} MB, {linhas} linhas, "
+                f"{livres * page_size / 1048576:.1f} MB livres ({livres * 100.0 / max(paginas, 1):.0f}%)\n\n")
+    if bytes_por_nome:
+        saida.write(f"{'objeto':<24} {'MB':>8} {'%':>5}\n")
+        for nome, tamanho in sorted(bytes_por_nome.items(), key=lambda x: -x[1]):
+            saida.write(f"{nome:<24} {tamanho / 1048576:8.2f} {tamanho * 100.0 / total:5.1f}\n")
+        saida.write('\n')
+
+    usos = {}
+    simulada = conexao_reconstruida(conn)
+    saida.write("Consultas do sistema (índices de hoje -> depois do reconstruir):\n")
+    for descricao, sql, params in CONSULTAS:
+        usados = plano(conn, sql, params)
+        for nome in usados:
+            usos.setdefault(nome, []).append(descricao)
+        depois = plano(simulada, sql, params)
+        saida.write(f"  {descricao:<34} {', '.join(dict.fromkeys(usados)):<24} -> {', '.join(dict.fromkeys(depois))}\n")
+    simulada.close()
+    saida.write('\n')
+
+    for nome in indices:
+        if nome in INDICES:
+            continue
+        tamanho = bytes_por_nome.get(nome)
+        extra = f" ({tamanho / 1048576:.2f} MB)" if tamanho else ''
+        if nome in usos:
+            # O planejador o prefere hoje, mas a coluna "depois" mostra quem atende sem ele
+            saida.write(f"Dispensável: {nome}{extra}, usado por {', '.join(usos[nome])}\n")
+        else:
+            saida.write(f"Sem uso: {nome}{extra}\n")
+    for nome in INDICES:
+        if nome not in indices:
+            saida.write(f"Faltando: {nome}\n")
+    conn.close()
+    return usos
+
+
+def registrar(conn, tarefa):
+    conn.executescript(SCHEMA_MANUTENCAO)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO qrcode_manutencao (tarefa, quando) VALUES (?, ?)', (tarefa, time.time()))
+
+
+def analisar(conn):
+    # analysis_limit: estatísticas por amostragem, sem ler a tabela inteira a cada vez
+    conn.execute('PRAGMA analysis_limit = 1000')
+    conn.execute('ANALYZE')
+    registrar(conn, 'analyze')
+
+
+def vacuum(conn):
+    conn.execute('VACUUM')
+    registrar(conn, 'vacuum')
+
+
+def reconstruir(caminho, manter=(), aplicar=False):
+    # No próprio arquivo (mesmo inode): o processo que grava e os viewers continuam com ele aberto
+    conn = conectar(caminho)
+    existentes = indices_da_tabela(conn)
+    remover = [nome for nome in existentes if nome not in INDICES and nome not in manter]
+    criar = [nome for nome in INDICES if nome not in existentes]
+    antes = os.path.getsize(caminho)
+    if aplicar:
+        with conn:
+            for nome in remover:
+                conn.execute(f'DROP INDEX "{nome}"')
+            for nome in criar:
+                conn.execute(INDICES[nome])
+        analisar(conn)
+        vacuum(conn)
+    conn.close()
+    return {'removidos': remover, 'criados': criar, 'antes': antes, 'depois': os.path.getsize(caminho)}
+
+
+def terminais_do_texto(texto):
+    # Mesma regra da coluna Terminais gravada pelo importador original: só os tokens T*, em ordem
+    terminais = []
+    for conjunto in (texto or '').split('#'):
+        for token in conjunto.split('-'):
+            tipo, separador, valor = token.partition(':')
+            if separador and tipo.startswith('T') and valor:
+                terminais.append(valor)
+    return terminais
+
+
+def ler_entrada(caminho, formato=None, delimitador=','):
+    # Dicts com as colunas de COLUNAS; formato pela extensão se não informado
+    formato = formato or os.path.splitext(caminho)[1].lstrip('.').lower()
+    if formato == 'csv':
+        with open(caminho, 'r', encoding='utf-8-sig', newline='') as f:
+            yield from csv.DictReader(f, delimiter=delimitador)
+    elif formato == 'jsonl':
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                if linha.strip():
+                    yield json.loads(linha)
+    elif formato == 'json':
+        with open(caminho, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        yield from (dados.get('linhas', []) if isinstance(dados, dict) else dados)
+    else:
+        raise ValueError(f"Formato desconhecido: {formato} (use csv, json ou jsonl)")
+
+
+def linha_para_tupla(registro, data_padrao):
+    texto = registro.get('Texto')
+    if not texto:
+        return None
+    terminais = registro.get('Terminais')
+    qtd = registro.get('Qtd_Terminais')
+    if not terminais:
+        lista = terminais_do_texto(texto)
+        terminais, qtd = ','.join(lista), len(lista)
+    elif qtd in (None, ''):
+        qtd = len(terminais.split(','))
+    return (registro.get('Job_Key'), registro.get('Versao'), registro.get('Carro'), registro.get('Maco'),
+            registro.get('Data') or data_padrao, texto, terminais, int(qtd))
+
+
+def importar(caminho_banco, caminho, formato=None, tamanho_lote=50000, adiar_indices=None, delimitador=','):
+    # adiar_indices=None decide pelo tamanho: entrada grande perto do banco -> índices refeitos no fim
+    conn = conectar(caminho_banco)
+    conn.execute('PRAGMA cache_size = -32768')
+    if adiar_indices is None:
+        adiar_indices = os.path.getsize(caminho) * 4 > os.path.getsize(caminho_banco)
+    primeiro_id = (conn.execute('SELECT MAX(ID) FROM qrcode').fetchone()[0] or 0) + 1
+    data_padrao = time.strftime('%Y-%m-%d %H:%M:%S')
+    # Só os índices b-tree saem; os triggers (FTS da busca, os do programa que grava) ficam:
+    # o que outro processo gravar durante a carga também precisa chegar ao qrcode_fts
+    indices = indices_da_tabela(conn) if adiar_indices else {}
+
+    importadas = 0
+    rejeitadas = 0
+    inicio = time.perf_counter()
+    try:
+        if adiar_indices:
+            with conn:
+                for nome in indices:
+                    conn.execute(f'DROP INDEX "{nome}"')
+        lote = []
+        for registro in ler_entrada(caminho, formato, delimitador):
+            tupla = linha_para_tupla(registro, data_padrao)
+            if tupla is None:
+                rejeitadas += 1
+                continue
+            lote.append(tupla)
+            if len(lote) >= tamanho_lote:
+                with conn:
+                    conn.executemany(SQL_INSERIR, lote)
+                importadas += len(lote)
+                lote = []
+                print(f"  {importadas} linhas ({importadas / (time.perf_counter() - inicio):.0f}/s)")
+        if lote:
+            with conn:
+                conn.executemany(SQL_INSERIR, lote)
+            importadas += len(lote)
+    finally:
+        if adiar_indices:
+            # Índices em uma passada ordenada
+            with conn:
+                for sql in indices.values():
+                    conn.execute(sql)
+    if importadas:
+        analisar(conn)
+    conn.close()
+    return {'importadas': importadas, 'rejeitadas': rejeitadas, 'primeiro_id': primeiro_id,
+            'indices_adiados': adiar_indices, 'segundos': time.perf_counter() - inicio}
+
+
+def ultima_execucao(conn, tarefa):
+    try:
+        row = conn.execute('SELECT quando FROM qrcode_manutencao WHERE tarefa = ?', (tarefa,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def manter(caminho, analyze_horas=24.0, vacuum_dias=7.0, livre_max=0.2, forcar=False):
+    # Roda só o que venceu: ANALYZE por tempo; VACUUM por tempo ou por espaço livre acumulado
+    conn = conectar(caminho)
+    agora = time.time()
+    feitas = []
+    ultimo = ultima_execucao(conn, 'analyze')
+    if forcar or ultimo is None or agora - ultimo >= analyze_horas * 3600:
+        analisar(conn)
+        feitas.append('analyze')
+    paginas = conn.execute('PRAGMA page_count').fetchone()[0]
+    livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    ultimo = ultima_execucao(conn, 'vacuum')
+    if forcar or ultimo is None or agora - ultimo >= vacuum_dias * 86400 or livres > paginas * livre_max:
+        vacuum(conn)
+        feitas.append('vacuum')
+    conn.close()
+    return feitas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do banco_qrcode.db: índices, importação e VACUUM/ANALYZE")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    sub.add_parser('relatorio', help="tamanho e uso dos índices")
+
+    p = sub.add_parser('reconstruir', help="troca os índices pelos que as consultas usam e compacta")
+    p.add_argument('--aplicar', action='store_true', help="sem isso só mostra o que seria feito")
+    p.add_argument('--manter', action='append', default=[], metavar='INDICE',
+                   help="índice a preservar (ex.: usado pelo programa que grava o banco)")
+
+    p = sub.add_parser('importar', help="importa linhas de CSV / JSON / JSON lines")
+    p.add_argument('arquivo')
+    p.add_argument('--formato', choices=('csv', 'json', 'jsonl'), help="padrão: pela extensão")
+    p.add_argument('--delimitador', default=',', help="separador do CSV")
+    p.add_argument('--lote', type=int, default=50000, help="linhas por transação")
+    p.add_argument('--adiar-indices', choices=('auto', 'sim', 'nao'), default='auto',
+                   help="remove os índices durante a carga e refaz no fim (os triggers do FTS continuam)")
+    p.add_argument('--rotas', metavar='PRENSAS_JSON', help="atualiza o roteamento pré-calculado (rotas_cache) depois")
+
+    p = sub.add_parser('manter', help="ANALYZE / VACUUM quando vencidos")
+    p.add_argument('--analyze-horas', type=float, default=24.0)
+    p.add_argument('--vacuum-dias', type=float, default=7.0)
+    p.add_argument('--livre-max', type=float, default=0.2, help="fração de páginas livres que força o VACUUM")
+    p.add_argument('--forcar', action='store_true')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.comando == 'relatorio':
+            relatorio(args.banco)
+        elif args.comando == 'reconstruir':
+            r = reconstruir(args.banco, args.manter, args.aplicar)
+            verbo = "" if args.aplicar else " (simulação, use --aplicar)"
+            print(f"Remover: {', '.join(r['removidos']) or '-'} | Criar: {', '.join(r['criados']) or '-'}{verbo}")
+            if args.aplicar:
+                print(f"{r['antes'] / 1048576:.1f} MB -> {r['depois'] / 1048576:.1f} MB")
+        elif args.comando == 'importar':
+            adiar = {'auto': None, 'sim': True, 'nao': False}[args.adiar_indices]
+            r = importar(args.banco, args.arquivo, args.formato, args.lote, adiar, args.delimitador)
+            print(f"{r['importadas']} linhas importadas a partir do ID {r['primeiro_id']}, {r['rejeitadas']} sem Texto, "
+                  f"em {r['segundos']:.1f} s{' (índices adiados)' if r['indices_adiados'] else ''}")
+            if args.rotas and r['importadas']:
+                rotas = atualizar_rotas(args.banco, args.rotas)
+                print(f"rotas {rotas['config_hash']}: {rotas['calculadas']} calculadas")
+        elif args.comando == 'manter':
+            feitas = manter(args.banco, args.analyze_horas, args.vacuum_dias, args.livre_max, args.forcar)
+            print(f"Manutenção: {', '.join(feitas) or 'nada vencido'}")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Falha: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+
+# Planta do chão de fábrica (modo mapa do viewer): cada prensa do prensas_config.json
+# é um item numa única QGraphicsScene, na posição e tamanho do 'layout' (650x800 por
+# padrão). As prensas do maço aparecem com a ordem do card e a quantidade; as outras
+# ficam apagadas. Uma linha liga as prensas na ordem dos cards (o caminho pela fábrica).
+#
+# Cada item guarda o próprio estado e só pede repintura quando ele muda; com o cache
+# por item (DeviceCoordinateCache) a troca de seleção repinta dois retângulos, não a planta.
+
+LAYOUT_PADRAO = {'width': 650, 'height': 800}
+
+COR_FUNDO = QtGui.QColor(25, 25, 40)
+COR_INATIVA = QtGui.QColor(40, 40, 50)
+COR_TEXTO_INATIVA = QtGui.QColor(110, 110, 120)
+COR_PENDENTE = QtGui.QColor(50, 50, 60)
+COR_COMPLETA = QtGui.QColor(40, 100, 40)
+COR_TITULO = QtGui.QColor(69, 207, 81)
+COR_SELECAO = QtGui.QColor(255, 200, 0)
+COR_BORDA = QtGui.QColor(80, 80, 95)
+COR_ROTA = QtGui.QColor(60, 110, 200)
+
+
+class PrensaItem(QtWidgets.QGraphicsItem):
+    def __init__(self, prensa_id, nome, retangulo):
+        super().__init__()
+        self.prensa_id = prensa_id
+        self.nome = nome
+        self.retangulo = QtCore.QRectF(0, 0, retangulo.width(), retangulo.height())
+        self.setPos(retangulo.topLeft())
+        self.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
+        # (ordem no plano ou None, quantidade, selecionada, completa)
+        self.estado = (None, 0, False, False)
+
+    def boundingRect(self):
+        # Borda da seleção desenhada por fora do retângulo
+        return self.retangulo.adjusted(-3, -3, 3, 3)
+
+    def centro(self):
+        return self.mapToScene(self.retangulo.center())
+
+    def definir(self, ordem, quantidade, selecionada, completa):
+        # Retorna True se o estado mudou (e o item foi marcado para repintar)
+        estado = (ordem, quantidade, selecionada, completa)
+        if estado == self.estado:
+            return False
+        self.estado = estado
+        self.update()
+        return True
+
+    def paint(self, painter, option, widget=None):
+        ordem, quantidade, selecionada, completa = self.estado
+        r = self.retangulo
+        if ordem is None:
+            fundo, texto = COR_INATIVA, COR_TEXTO_INATIVA
+        else:
+            fundo, texto = (COR_COMPLETA if completa else COR_PENDENTE), QtGui.QColor(Qt.white)
+        if selecionada:
+            borda = QtGui.QPen(COR_TITULO if completa else COR_SELECAO, 3)
+        else:
+            borda = QtGui.QPen(COR_BORDA, 1)
+        painter.setPen(borda)
+        painter.setBrush(fundo)
+        painter.drawRoundedRect(r, 4, 4)
+
+        area = r.adjusted(5, 3, -5, -3)
+        fonte = painter.font()
+        fonte.setBold(True)
+        fonte.setPixelSize(max(10, int(r.height() * 0.22)))
+        painter.setFont(fonte)
+        painter.setPen(COR_TITULO if ordem is not None and not completa else texto)
+        painter.drawText(area, Qt.AlignTop | Qt.AlignLeft, self.prensa_id)
+        if ordem is None:
+            return
+        painter.setPen(texto)
+        painter.drawText(area, Qt.AlignTop | Qt.AlignRight, f"#{ordem}")
+        fonte.setPixelSize(max(12, int(r.height() * 0.34)))
+        painter.setFont(fonte)
+        painter.drawText(area, Qt.AlignCenter, "✓" if completa else f"{quantidade}x")
+        fonte.setBold(False)
+        fonte.setPixelSize(max(9, int(r.height() * 0.16)))
+        painter.setFont(fonte)
+        painter.drawText(area, Qt.AlignBottom | Qt.AlignHCenter, self.nome)
+
+
+class MapaPrensas(QtWidgets.QGraphicsView):
+    prensa_clicada = QtCore.pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.cena = QtWidgets.QGraphicsScene(self)
+        self.setScene(self.cena)
+        self.setRenderHint(QtGui.QPainter.Antialiasing)
+        self.setViewportUpdateMode(QtWidgets.QGraphicsView.MinimalViewportUpdate)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.setBackgroundBrush(COR_FUNDO)
+        self.itens = {}
+        self.plano = {}
+        self.rota = None
+        self.stats = {'repintados_ultimo': 0, 'repintados_total': 0}
+
+    def carregar(self, prensas, layout=None):
+        # Recria os itens (config nova); prensas sem posição vão para uma grade abaixo da planta
+        self.cena.clear()
+        self.itens = {}
+        self.plano = {}
+        layout = layout or LAYOUT_PADRAO
+        largura = float(layout.get('width', LAYOUT_PADRAO['width']))
+        altura = float(layout.get('height', LAYOUT_PADRAO['height']))
+        sem_posicao = 0
+        for p in prensas:
+            prensa_id = p.get('id', '')
+            if prensa_id in self.itens:
+                continue
+            w, h = float(p.get('width', 120)), float(p.get('height', 70))
+            if p.get('pos_x') is None or p.get('pos_y') is None:
+                colunas = max(1, int(largura // 130))
+                x, y = (sem_posicao % colunas) * 130, altura + 10 + (sem_posicao // colunas) * 80
+                sem_posicao += 1
+            else:
+                x, y = float(p['pos_x']), float(p['pos_y'])
+            item = PrensaItem(prensa_id, p.get('nome', ''), QtCore.QRectF(x, y, w, h))
+            self.cena.addItem(item)
+            self.itens[prensa_id] = item
+        self.rota = self.cena.addPath(QtGui.QPainterPath(), QtGui.QPen(COR_ROTA, 3, Qt.DashLine))
+        self.rota.setZValue(-1)
+        self.cena.setSceneRect(QtCore.QRectF(0, 0, largura, altura).united(self.cena.itemsBoundingRect()))
+        self.ajustar()
+
+    def mostrar(self, plano):
+        # plano: [(prensa_id, quantidade)] na ordem dos cards; as outras prensas ficam apagadas
+        self.plano = {prensa_id: (i + 1, quantidade) for i, (prensa_id, quantidade) in enumerate(plano)}
+        repintados = 0
+        for prensa_id, item in self.itens.items():
+            ordem, quantidade = self.plano.get(prensa_id, (None, 0))
+            repintados += item.definir(ordem, quantidade, False, False)
+        caminho = QtGui.QPainterPath()
+        pontos = [self.itens[prensa_id].centro() for prensa_id, _ in plano if prensa_id in self.itens]
+        if pontos:
+            caminho.moveTo(pontos[0])
+            for ponto in pontos[1:]:
+                caminho.lineTo(ponto)
+        if self.rota is not None:
+            self.rota.setPath(caminho)
+        self._contar(repintados)
+
+    def definir_estados(self, estados):
+        # estados: [(prensa_id, selecionada, completa)] só das prensas que podem ter mudado
+        repintados = 0
+        for prensa_id, selecionada, completa in estados:
+            item = self.itens.get(prensa_id)
+            if item is None:
+                continue
+            ordem, quantidade = self.plano.get(prensa_id, (None, 0))
+            repintados += item.definir(ordem, quantidade, selecionada, completa)
+        self._contar(repintados)
+        return repintados
+
+    def _contar(self, repintados):
+        self.stats['repintados_ultimo'] = repintados
+        self.stats['repintados_total'] += repintados
+
+    def ajustar(self):
+        self.fitInView(self.cena.sceneRect(), Qt.KeepAspectRatio)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.ajustar()
+
+    def mousePressEvent(self, event):
+        item = self.itemAt(event.pos())
+        if isinstance(item, PrensaItem) and item.prensa_id in self.plano:
+            self.prensa_clicada.emit(item.prensa_id)
+            return
+        super().mousePressEvent(event)
@@ -0,0 +1,228 @@
+import json
+import math
+import os
+import time
+from collections import Counter, deque
+
+# Métricas de produção: eventos com timestamp monotônico em buffers circulares,
+# agregados sob demanda em vazão (aplicações/hora) e percentis de tempo de ciclo
+# por prensa e por terminal. Exporta texto Prometheus e JSON para um coletor local.
+#
+# Latências (consulta, navegação) e produção (completo, desmarcado, finalizado) têm
+# buffers separados: a navegação gera um evento por tecla e não pode empurrar a última
+# hora de produção para fora. Os totais por prensa/terminal ficam fora dos buffers e só
+# crescem (concluídas e desmarcadas separadas), como um counter do Prometheus espera.
+#
+# A exportação regrava os arquivos a cada poucos segundos: o padrão é um diretório em
+# tmpfs (diretorio_metricas), não o cartão SD ao lado do banco.
+
+QUANTIS = (0.5, 0.9, 0.99)
+JANELA_VAZAO_S = 3600.0
+PRODUCAO = ('completo', 'desmarcado', 'finalizado')
+# Maços/cards abertos e nunca finalizados (outro ID lido por cima) saem depois disso
+LIMITE_ABERTO_S = 24 * 3600.0
+# Diretórios em tmpfs tentados para a exportação, nesta ordem (o /run/qrcode_viewer
+# existe com RuntimeDirectory=qrcode_viewer no serviço do systemd)
+DIRETORIOS_TMPFS = ('/run/qrcode_viewer', f'/run/user/{os.getuid()}', '/dev/shm/qrcode_viewer')
+
+
+def percentil(valores_ordenados, q):
+    if not valores_ordenados:
+        return None
+    # Nearest-rank
+    indice = min(len(valores_ordenados) - 1, max(0, math.ceil(q * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def _quantis(valores):
+    valores = sorted(valores)
+    return {str(q): percentil(valores, q) for q in QUANTIS}, len(valores), sum(valores)
+
+
+def diretorio_metricas():
+    # Primeiro diretório em tmpfs em que dá para escrever; None se nenhum
+    for diretorio in DIRETORIOS_TMPFS:
+        try:
+            os.makedirs(diretorio, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(diretorio, os.W_OK):
+            return diretorio
+    return None
+
+
+class MetricasProducao:
+    def __init__(self, tamanho=10000):
+        self.eventos = deque(maxlen=tamanho)
+        self.producao = deque(maxlen=tamanho)
+        # (prensa ou terminal) -> aplicações concluídas / desmarcadas desde o início
+        self.concluidas_prensa = Counter()
+        self.desmarcadas_prensa = Counter()
+        self.concluidas_terminal = Counter()
+        self.desmarcadas_terminal = Counter()
+        self._inicio_prensa = {}
+        self._inicio_maco = {}
+        self.inicio = time.monotonic()
+
+    def _registrar(self, tipo, **dados):
+        buffer = self.producao if tipo in PRODUCAO else self.eventos
+        buffer.append((time.monotonic(), tipo, dados))
+
+    def _somar(self, prensas, terminais, prensa_id, contagem):
+        prensas[prensa_id] += sum(contagem.values())
+        terminais.update(contagem)
+
+    def _podar(self, agora):
+        corte = agora - LIMITE_ABERTO_S
+        for inicios in (self._inicio_maco, self._inicio_prensa):
+            for chave in [c for c, inicio in inicios.items() if inicio < corte]:
+                del inicios[chave]
+
+    def consulta(self, qr_id, duracao_ms):
+        agora = time.monotonic()
+        self._podar(agora)
+        self._inicio_maco.setdefault(qr_id, agora)
+        self._registrar('consulta', qr_id=qr_id, ms=duracao_ms)
+
+    def navegacao(self, duracao_ms):
+        self._registrar('navegacao', ms=duracao_ms)
+
+    def selecionar(self, qr_id, prensa_id):
+        # O ciclo da prensa começa na primeira vez que o card é selecionado
+        self._inicio_prensa.setdefault((qr_id, prensa_id), time.monotonic())
+
+    def completar(self, qr_id, prensa_id, terminais):
+        inicio = self._inicio_prensa.pop((qr_id, prensa_id), None)
+        ciclo = time.monotonic() - inicio if inicio is not None else None
+        self._somar(self.concluidas_prensa, self.concluidas_terminal, prensa_id, terminais)
+        self._registrar('completo', qr_id=qr_id, prensa=prensa_id, terminais=dict(terminais), ciclo_s=ciclo)
+
+    def desmarcar(self, qr_id, prensa_id, terminais):
+        self._inicio_prensa.setdefault((qr_id, prensa_id), time.monotonic())
+        self._somar(self.desmarcadas_prensa, self.desmarcadas_terminal, prensa_id, terminais)
+        self._registrar('desmarcado', qr_id=qr_id, prensa=prensa_id, terminais=dict(terminais))
+
+    def finalizar(self, qr_id, dialogo_ms):
+        inicio = self._inicio_maco.pop(qr_id, None)
+        maco_s = time.monotonic() - inicio if inicio is not None else None
+        for chave in [c for c in self._inicio_prensa if c[0] == qr_id]:
+            del self._inicio_prensa[chave]
+        self._registrar('finalizado', qr_id=qr_id, dialogo_ms=dialogo_ms, maco_s=maco_s)
+
+    def agregar(self, agora=None):
+        agora = time.monotonic() if agora is None else agora
+        corte = agora - JANELA_VAZAO_S
+        janela_h = max(min(agora - self.inicio, JANELA_VAZAO_S), 1.0) / 3600.0
+
+        consultas, navegacao = [], []
+        for _, tipo, dados in self.eventos:
+            (consultas if tipo == 'consulta' else navegacao).append(dados['ms'])
+
+        prensa_janela = Counter()
+        terminal_janela = Counter()
+        ciclos = {}
+        macos = []
+        for momento, tipo, dados in self.producao:
+            if tipo == 'finalizado':
+                if dados['maco_s'] is not None:
+                    macos.append(dados['maco_s'])
+                continue
+            if tipo == 'completo' and dados['ciclo_s'] is not None:
+                ciclos.setdefault(dados['prensa'], []).append(dados['ciclo_s'])
+            if momento < corte:
+                continue
+            sinal = 1 if tipo == 'completo' else -1
+            prensa_janela[dados['prensa']] += sum(dados['terminais'].values()) * sinal
+            for terminal, n in dados['terminais'].items():
+                terminal_janela[terminal] += n * sinal
+
+        prensas = {}
+        for prensa_id in sorted(set(self.concluidas_prensa) | set(self.desmarcadas_prensa)):
+            quantis, n, soma = _quantis(ciclos.get(prensa_id, ()))
+            concluidas, desmarcadas = self.concluidas_prensa[prensa_id], self.desmarcadas_prensa[prensa_id]
+            prensas[prensa_id] = {
+                'aplicacoes': concluidas - desmarcadas,
+                'concluidas': concluidas,
+                'desmarcadas': desmarcadas,
+                'aplicacoes_por_hora': prensa_janela[prensa_id] / janela_h,
+                'ciclo_s': quantis,
+                'ciclos': n,
+                'ciclos_soma_s': soma,
+            }
+        terminais = {}
+        for terminal in sorted(set(self.concluidas_terminal) | set(self.desmarcadas_terminal)):
+            concluidas, desmarcadas = self.concluidas_terminal[terminal], self.desmarcadas_terminal[terminal]
+            terminais[terminal] = {
+                'aplicacoes': concluidas - desmarcadas,
+                'concluidas': concluidas,
+                'desmarcadas': desmarcadas,
+                'aplicacoes_por_hora': terminal_janela[terminal] / janela_h,
+            }
+        consulta_q, consulta_n, consulta_soma = _quantis(consultas)
+        navegacao_q, navegacao_n, navegacao_soma = _quantis(navegacao)
+        maco_q, maco_n, maco_soma = _quantis(macos)
+        return {
+            'eventos': len(self.eventos) + len(self.producao),
+            'prensas': prensas,
+            'terminais': terminais,
+            'consulta_ms': dict(consulta_q, count=consulta_n, sum=consulta_soma),
+            'navegacao_ms': dict(navegacao_q, count=navegacao_n, sum=navegacao_soma),
+            'maco_s': dict(maco_q, count=maco_n, sum=maco_soma),
+        }
+
+    def prometheus(self, agregado=None):
+        a = agregado or self.agregar()
+        linhas = []
+
+        def amostra(nome, rotulos, valor):
+            if valor is None:
+                return
+            texto_rotulos = ','.join(f'{k}="{v}"' for k, v in rotulos.items())
+            linhas.append(f"{nome}{{{texto_rotulos}}} {valor:g}" if texto_rotulos else f"{nome} {valor:g}")
+
+        def metrica(nome, tipo, ajuda, amostras):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in amostras:
+                amostra(nome, rotulos, valor)
+
+        def resumo(nome, ajuda, series):
+            # series: (rótulos, quantis, count, sum); _sum e _count logo após os quantis
+            metrica(nome, 'summary', ajuda,
+                    [(dict(rotulos, quantile=q), v) for rotulos, quantis, _, _ in series for q, v in quantis.items()])
+            for rotulos, _, n, soma in series:
+                amostra(f"{nome}_sum", rotulos, soma)
+                amostra(f"{nome}_count", rotulos, n)
+
+        metrica('prensa_aplicacoes_total', 'counter', 'Aplicações marcadas como concluídas por prensa',
+                [({'prensa': p}, d['concluidas']) for p, d in a['prensas'].items()])
+        metrica('prensa_aplicacoes_desmarcadas_total', 'counter', 'Aplicações desmarcadas por prensa',
+                [({'prensa': p}, d['desmarcadas']) for p, d in a['prensas'].items()])
+        metrica('prensa_aplicacoes_por_hora', 'gauge', 'Vazão da última hora por prensa',
+                [({'prensa': p}, d['aplicacoes_por_hora']) for p, d in a['prensas'].items()])
+        resumo('prensa_ciclo_segundos', 'Tempo da seleção do card até marcar completo',
+               [({'prensa': p}, d['ciclo_s'], d['ciclos'], d['ciclos_soma_s']) for p, d in a['prensas'].items()])
+        metrica('terminal_aplicacoes_total', 'counter', 'Aplicações marcadas como concluídas por terminal',
+                [({'terminal': t}, d['concluidas']) for t, d in a['terminais'].items()])
+        metrica('terminal_aplicacoes_desmarcadas_total', 'counter', 'Aplicações desmarcadas por terminal',
+                [({'terminal': t}, d['desmarcadas']) for t, d in a['terminais'].items()])
+        metrica('terminal_aplicacoes_por_hora', 'gauge', 'Vazão da última hora por terminal',
+                [({'terminal': t}, d['aplicacoes_por_hora']) for t, d in a['terminais'].items()])
+        for nome, chave, ajuda in (('viewer_consulta_ms', 'consulta_ms', 'Latência da consulta até a tela'),
+                                   ('viewer_navegacao_ms', 'navegacao_ms', 'Tempo de atualizar_selecao'),
+                                   ('viewer_maco_segundos', 'maco_s', 'Duração do maço até finalizar')):
+            dados = a[chave]
+            resumo(nome, ajuda, [({}, {q: v for q, v in dados.items() if q not in ('count', 'sum')},
+                                  dados['count'], dados['sum'])])
+        return '\n'.join(linhas) + '\n'
+
+    def exportar(self, diretorio, nome='metricas_prensas'):
+        agregado = self.agregar()
+        for extensao, conteudo in (('.prom', self.prometheus(agregado)),
+                                   ('.json', json.dumps(agregado, indent=2, ensure_ascii=False))):
+            caminho = os.path.join(diretorio, nome + extensao)
+            temporario = caminho + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                f.write(conteudo)
+            os.replace(temporario, caminho)
+        return agregado
@@ -0,0 +1,197 @@
+import math
+from collections import Counter, OrderedDict, namedtuple
+
+from roteamento import terminais_da_prensa
+
+# Plano consolidado de vários maços (modo lote do viewer): as aplicações (terminal, cabo)
+# de cada maço lido são somadas por prensa de forma incremental, e o plano sai ordenado
+# para reduzir as trocas na linha de crimpagem:
+#   - dentro da prensa, terminais que compartilham cabos ficam em sequência (a troca de
+#     aplicador é a mais cara; a de cabo vem depois);
+#   - dentro do terminal, o cabo que veio do grupo anterior abre a lista e o que segue
+#     para o próximo grupo a fecha; o resto por bitola, como no modo de um maço;
+#   - entre prensas, a próxima é a que pede menos cabos novos, depois a mais próxima no
+#     layout (pos_x / pos_y do prensas_config.json), depois a ordem da config.
+#
+# O progresso continua por maço de origem: marcar uma prensa marca todos os maços que
+# têm aplicações nela, e cada maço sabe quantas das suas prensas já terminou.
+
+MacoLote = namedtuple('MacoLote', ['qr_id', 'carro', 'job_key', 'maco', 'por_prensa'])
+
+# grupos: [(terminal, [(cabo, qtd), ...]), ...] na ordem de produção; macos: IDs com aplicações na prensa
+CardLote = namedtuple('CardLote', ['prensa_id', 'grupos', 'macos'])
+
+
+def _chave_padrao(cabo):
+    return (cabo is None, cabo or '')
+
+
+def ordenar_grupos(contagem, ordem_terminais=(), chave_cabo=_chave_padrao):
+    # contagem: Counter((terminal, cabo) -> qtd) de uma prensa
+    por_terminal = {}
+    for (terminal, cabo), qtd in contagem.items():
+        por_terminal.setdefault(terminal, Counter())[cabo] += qtd
+    if not por_terminal:
+        return []
+    posicao = {terminal: i for i, terminal in enumerate(ordem_terminais)}
+
+    def desempate(terminal):
+        # Mais aplicações primeiro, depois a ordem dos terminais na prensa
+        return (-sum(por_terminal[terminal].values()), posicao.get(terminal, len(posicao)), terminal)
+
+    restantes = sorted(por_terminal, key=desempate)
+    ordem = [restantes.pop(0)]
+    while restantes:
+        cabos_atual = set(por_terminal[ordem[-1]])
+        proximo = min(restantes, key=lambda t: (-len(cabos_atual & set(por_terminal[t])), desempate(t)))
+        restantes.remove(proximo)
+        ordem.append(proximo)
+
+    grupos = []
+    for i, terminal in enumerate(ordem):
+        anterior = grupos[-1][1][-1][0] if grupos else None
+        seguinte = set(por_terminal[ordem[i + 1]]) if i + 1 < len(ordem) else set()
+
+        def chave(item):
+            cabo = item[0]
+            return (0 if cabo == anterior else 2 if cabo in seguinte else 1,
+                    chave_cabo(cabo), _chave_padrao(cabo))
+
+        grupos.append((terminal, sorted(por_terminal[terminal].items(), key=chave)))
+    return grupos
+
+
+def ordenar_prensas(totais, prensas_config=()):
+    # totais: {prensa_id: Counter((terminal, cabo) -> qtd)}
+    config = {}
+    for i, p in enumerate(prensas_config):
+        config.setdefault(p.get('id', ''), (i, p))
+
+    def indice(prensa_id):
+        return config[prensa_id][0] if prensa_id in config else len(config)
+
+    def posicao(prensa_id):
+        p = config.get(prensa_id, (None, {}))[1]
+        if p.get('pos_x') is None or p.get('pos_y') is None:
+            return None
+        return p['pos_x'], p['pos_y']
+
+    def cabos(prensa_id):
+        return {cabo for _, cabo in totais[prensa_id]}
+
+    restantes = sorted(totais, key=lambda p: (indice(p), p))
+    if not restantes:
+        return []
+    ordem = [restantes.pop(0)]
+    while restantes:
+        atual = ordem[-1]
+        cabos_atual = cabos(atual)
+        origem = posicao(atual)
+
+        def custo(prensa_id):
+            destino = posicao(prensa_id)
+            distancia = math.hypot(destino[0] - origem[0], destino[1] - origem[1]) if origem and destino else 0.0
+            return (len(cabos(prensa_id) - cabos_atual), distancia, indice(prensa_id), prensa_id)
+
+        proxima = min(restantes, key=custo)
+        restantes.remove(proxima)
+        ordem.append(proxima)
+    return ordem
+
+
+def trocas(cards):
+    # (trocas de terminal, trocas de cabo) percorrendo os grupos de cada prensa em ordem
+    trocas_terminal = trocas_cabo = 0
+    for card in cards:
+        terminal_anterior = cabo_anterior = None
+        for terminal, cabos in card.grupos:
+            if terminal_anterior is not None and terminal != terminal_anterior:
+                trocas_terminal += 1
+            terminal_anterior = terminal
+            for cabo, _ in cabos:
+                if cabo_anterior is not None and cabo != cabo_anterior:
+                    trocas_cabo += 1
+                cabo_anterior = cabo
+    return trocas_terminal, trocas_cabo
+
+
+class PlanoLote:
+    def __init__(self):
+        self.macos = OrderedDict()
+        self.totais = {}
+        self.sem_prensa = Counter()
+        # qr_id -> prensas já marcadas para aquele maço
+        self.completos = {}
+
+    def __len__(self):
+        return len(self.macos)
+
+    def __contains__(self, qr_id):
+        return qr_id in self.macos
+
+    def adicionar(self, qr_id, carro, job_key, maco, aplicacoes_por_prensa, sem_prensa=(), completos=()):
+        # aplicacoes_por_prensa no formato de rotear(); completos: prensas já feitas (journal)
+        if qr_id in self.macos:
+            return False
+        por_prensa = {prensa_id: Counter(aplicacoes)
+                      for prensa_id, aplicacoes in aplicacoes_por_prensa.items() if aplicacoes}
+        self.macos[qr_id] = MacoLote(qr_id, carro, job_key, maco, por_prensa)
+        for prensa_id, contagem in por_prensa.items():
+            self.totais.setdefault(prensa_id, Counter()).update(contagem)
+        self.sem_prensa.update(sem_prensa)
+        self.completos[qr_id] = set(completos) & set(por_prensa)
+        return True
+
+    def aplicacoes_por_prensa(self):
+        return {prensa_id: list(contagem.elements()) for prensa_id, contagem in self.totais.items()}
+
+    def macos_da_prensa(self, prensa_id):
+        return [qr_id for qr_id, m in self.macos.items() if prensa_id in m.por_prensa]
+
+    def terminais_por_maco(self, prensa_id, completo=None):
+        # [(qr_id, Counter(terminal -> qtd))] dos maços com aplicações na prensa
+        # (completo=True/False: só os que já marcaram / ainda não marcaram a prensa)
+        resultado = []
+        for qr_id in self.macos_da_prensa(prensa_id):
+            if completo is not None and (prensa_id in self.completos[qr_id]) != completo:
+                continue
+            terminais = Counter()
+            for (terminal, _), qtd in self.macos[qr_id].por_prensa[prensa_id].items():
+                terminais[terminal] += qtd
+            resultado.append((qr_id, terminais))
+        return resultado
+
+    def marcar(self, prensa_id):
+        for qr_id in self.macos_da_prensa(prensa_id):
+            self.completos[qr_id].add(prensa_id)
+
+    def desmarcar(self, prensa_id):
+        for qr_id in self.macos_da_prensa(prensa_id):
+            self.completos[qr_id].discard(prensa_id)
+
+    def completo(self, prensa_id):
+        return all(prensa_id in self.completos[qr_id] for qr_id in self.macos_da_prensa(prensa_id))
+
+    def progresso(self, qr_id):
+        # (prensas feitas, prensas do maço)
+        return len(self.completos[qr_id]), len(self.macos[qr_id].por_prensa)
+
+    def cards(self, prensas_config=(), chave_cabo=_chave_padrao):
+        terminais_config = {p.get('id', ''): terminais_da_prensa(p) for p in prensas_config}
+        return [CardLote(prensa_id,
+                         ordenar_grupos(self.totais[prensa_id], terminais_config.get(prensa_id, ()), chave_cabo),
+                         tuple(self.macos_da_prensa(prensa_id)))
+                for prensa_id in ordenar_prensas(self.totais, prensas_config)]
+
+    def cards_sem_agrupar(self):
+        # Referência: cada maço produzido inteiro antes do próximo, terminais na ordem do QR
+        por_prensa = {}
+        for m in self.macos.values():
+            for prensa_id, contagem in sorted(m.por_prensa.items()):
+                grupos = por_prensa.setdefault(prensa_id, [])
+                por_terminal = {}
+                for (terminal, cabo), qtd in contagem.items():
+                    por_terminal.setdefault(terminal, []).append((cabo, qtd))
+                grupos.extend(por_terminal.items())
+        return [CardLote(prensa_id, grupos, tuple(self.macos_da_prensa(prensa_id)))
+                for prensa_id, grupos in sorted(por_prensa.items())]
@@ -0,0 +1,150 @@
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+# Diário de produção: cada marcar/desmarcar/finalizar vira uma linha num SQLite
+# separado (progresso_prensas.db). A gravação é feita por uma thread que junta os
+# eventos em lote numa única transação WAL, então a tecla nunca espera o fsync.
+# Um lote que falha (banco travado, disco cheio) continua pendente e é regravado,
+# na mesma ordem e antes dos eventos seguintes, a cada 'espera_erro' segundos.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progresso (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    qr_id INTEGER NOT NULL,
+    prensa_id TEXT NOT NULL,
+    evento TEXT NOT NULL,
+    momento TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_progresso_qr ON progresso(qr_id, seq);
+"""
+
+MARCAR = 'marcar'
+DESMARCAR = 'desmarcar'
+FINALIZAR = 'finalizar'
+
+
+def aplicar_eventos(completos, eventos):
+    # Último evento por prensa vence; 'finalizar' encerra o maço e recomeça do zero
+    for prensa_id, evento in eventos:
+        if evento == FINALIZAR:
+            completos.clear()
+        elif evento == MARCAR:
+            completos.add(prensa_id)
+        elif evento == DESMARCAR:
+            completos.discard(prensa_id)
+    return completos
+
+
+class ProgressoJournal:
+    def __init__(self, path, lote_max=256, espera_lote=0.05, espera_erro=1.0):
+        self.path = os.path.abspath(path)
+        self.lote_max = lote_max
+        self.espera_lote = espera_lote
+        self.espera_erro = espera_erro
+        self._fila = queue.Queue()
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'eventos': 0, 'lotes': 0, 'erros': 0}
+
+        conn = self._conexao()
+        conn.executescript(SCHEMA)
+
+        self._thread = threading.Thread(target=self._gravar, name='progresso-journal', daemon=True)
+        self._thread.start()
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = FULL')
+            self._local.conn = conn
+        return conn
+
+    def registrar(self, qr_id, prensa_id, evento):
+        item = (int(qr_id), prensa_id, evento, datetime.now().isoformat(timespec='milliseconds'))
+        with self._lock:
+            self._pendentes.append(item)
+        self._fila.put(item)
+
+    def _gravar(self):
+        conn = self._conexao()
+        lote = []
+        fim = False
+        while not fim:
+            # Com eventos de um lote que falhou, a espera vira o intervalo até a nova tentativa
+            try:
+                item = self._fila.get(timeout=self.espera_erro if lote else None)
+                fim = item is None
+                if not fim:
+                    lote.append(item)
+                # Junta o que chegar logo em seguida (ex.: várias marcações rápidas) num commit só
+                while not fim and len(lote) < self.lote_max:
+                    item = self._fila.get(timeout=self.espera_lote)
+                    fim = item is None
+                    if not fim:
+                        lote.append(item)
+            except queue.Empty:
+                pass
+            if lote and self._commit(conn, lote):
+                lote = []
+        if lote:
+            print(f"Progresso: {len(lote)} eventos não gravados ao fechar")
+
+    def _commit(self, conn, lote):
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(
+                    'INSERT INTO progresso (qr_id, prensa_id, evento, momento) VALUES (?, ?, ?, ?)', lote)
+        except sqlite3.Error as e:
+            self.stats['erros'] += 1
+            print(f"Falha ao gravar progresso ({len(lote)} eventos, nova tentativa em {self.espera_erro:g} s): {e}")
+            return False
+        # Sai da lista exatamente o que foi gravado (cada item é uma tupla própria)
+        gravados = {id(item) for item in lote}
+        with self._lock:
+            self._pendentes = [item for item in self._pendentes if id(item) not in gravados]
+        self.stats['eventos'] += len(lote)
+        self.stats['lotes'] += 1
+        return True
+
+    def estado(self, qr_id):
+        # Prensas completas do maço em andamento: banco + eventos ainda na fila
+        qr_id = int(qr_id)
+        # Leitura e pendentes sob o mesmo lock: os pendentes são sempre os eventos mais novos,
+        # e o único que pode aparecer nos dois é o lote recém-gravado (reaplicá-lo não muda nada)
+        with self._lock:
+            rows = self._conexao().execute(
+                'SELECT prensa_id, evento FROM progresso WHERE qr_id = ? AND seq > '
+                "COALESCE((SELECT MAX(seq) FROM progresso WHERE qr_id = ? AND evento = 'finalizar'), 0) "
+                'ORDER BY seq', (qr_id, qr_id)).fetchall()
+            pendentes = [(p, e) for q, p, e, _ in self._pendentes if q == qr_id]
+        return aplicar_eventos(aplicar_eventos(set(), rows), pendentes)
+
+    def concluidos(self, prensa_id):
+        # Maços resolvidos para uma prensa: finalizados ou com a prensa marcada por último
+        with self._lock:
+            rows = self._conexao().execute(
+                "SELECT qr_id, prensa_id, evento FROM progresso WHERE prensa_id = ? OR evento = 'finalizar' ORDER BY seq",
+                (prensa_id,)).fetchall()
+            pendentes = [(q, p, e) for q, p, e, _ in self._pendentes if p == prensa_id or e == FINALIZAR]
+        finalizados = set()
+        marcados = set()
+        for qr_id, _, evento in rows + pendentes:
+            if evento == FINALIZAR:
+                finalizados.add(qr_id)
+            elif evento == MARCAR:
+                marcados.add(qr_id)
+            elif evento == DESMARCAR:
+                marcados.discard(qr_id)
+        return finalizados | marcados
+
+    def fechar(self):
+        # Grava o que ainda está na fila; depois disso registrar() não tem mais quem grave
+        self._fila.put(None)
+        self._thread.join(timeout=5.0)
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+
+def termo_fts(texto):
+    # Cada palavra vira um prefixo entre aspas (sem sintaxe FTS do operador): "4517"* "1F"*
+    return ' '.join('"' + palavra.replace('"', '""') + '"*' for palavra in texto.split())
+
+
+class QRCodeDB:
+    # Leitor somente-leitura do banco_qrcode.db, com conexão persistente por thread
+    SQL_BUSCA = 'SELECT Texto, Carro, Job_Key, Maco FROM qrcode WHERE ID = ?'
+    SQL_ROTAS = 'SELECT rotas FROM qrcode_rotas WHERE ID = ? AND config_hash = ?'
+    SQL_PESQUISA_FTS = ('SELECT rowid AS ID, Job_Key, Carro, Maco FROM qrcode_fts '
+                        'WHERE qrcode_fts MATCH ? AND rowid < ? ORDER BY rowid DESC LIMIT ?')
+    SQL_PREFIXO = ('SELECT ID FROM qrcode WHERE Carro >= ? AND Carro < ? '
+                   'UNION SELECT ID FROM qrcode WHERE Job_Key >= ? AND Job_Key < ? '
+                   'UNION SELECT ID FROM qrcode WHERE Maco >= ? AND Maco < ?')
+
+    PRAGMAS = (
+        'PRAGMA query_only = ON',
+        'PRAGMA mmap_size = 67108864',
+        'PRAGMA cache_size = -8192',
+        'PRAGMA temp_store = MEMORY',
+    )
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {
+            'consultas': 0,
+            'nao_encontrados': 0,
+            'reconexoes': 0,
+            'tempo_total_ms': 0.0,
+            'tempo_max_ms': 0.0,
+            'tempo_ultimo_ms': 0.0,
+        }
+
+    def identidade_arquivo(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Banco de dados não encontrado em: {self.path}")
+        return (st.st_dev, st.st_ino)
+
+    def _abrir(self, identidade):
+        uri = f"file:{quote(self.path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=64)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        self._local.conn = conn
+        self._local.identidade = identidade
+        return conn
+
+    def conexao(self):
+        # Reabre se o arquivo foi substituído (novo inode) desde a última consulta
+        identidade = self.identidade_arquivo()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.identidade == identidade:
+            return conn
+        if conn is not None:
+            conn.close()
+            with self._lock:
+                self.stats['reconexoes'] += 1
+        return self._abrir(identidade)
+
+    def fechar(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def buscar(self, qr_id):
+        inicio = time.perf_counter()
+        try:
+            row = self.conexao().execute(self.SQL_BUSCA, (int(qr_id),)).fetchone()
+        except sqlite3.DatabaseError:
+            # Arquivo reescrito no lugar ou conexão inválida: tenta uma vez com conexão nova
+            self.fechar()
+            with self._lock:
+                self.stats['reconexoes'] += 1
+            row = self.conexao().execute(self.SQL_BUSCA, (int(qr_id),)).fetchone()
+        self._registrar((time.perf_counter() - inicio) * 1000.0, row is not None)
+        return row
+
+    def buscar_rotas(self, qr_id, config_hash):
+        # Roteamento pré-calculado por rotas_cache.py; None se a linha (ou a tabela) não existe
+        try:
+            row = self.conexao().execute(self.SQL_ROTAS, (int(qr_id), config_hash)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row['rotas'] if row else None
+
+    def tem_indice_busca(self):
+        return self.conexao().execute("SELECT 1 FROM sqlite_master WHERE name = 'qrcode_fts'").fetchone() is not None
+
+    def pesquisar(self, texto, antes_de=None, limite=50):
+        # Busca por prefixo em Job_Key / Carro / Maço, mais recentes primeiro.
+        # Paginação por chave: a próxima página começa antes do menor ID já recebido.
+        antes_de = int(antes_de) if antes_de is not None else 2 ** 63 - 1
+        if not texto.split():
+            return []
+        conn = self.conexao()
+        if self.tem_indice_busca():
+            return conn.execute(self.SQL_PESQUISA_FTS, (termo_fts(texto), antes_de, limite)).fetchall()
+        # Sem qrcode_fts (indice_busca.py não rodou): prefixo do campo inteiro. Um OR entre as
+        # colunas vira varredura da tabela; a união de uma faixa por coluna lê só idx_carro,
+        # idx_jobkey e idx_maco (sem idx_maco, só essa parte varre) e as linhas saem pelo ID.
+        # O custo cresce com quantas linhas casam com o prefixo, não com o tamanho da tabela.
+        filtros = []
+        params = []
+        for palavra in texto.upper().split():
+            filtros.append(f'ID IN ({self.SQL_PREFIXO})')
+            params.extend((palavra, palavra + '\uffff') * 3)
+        sql = (f"SELECT ID, Job_Key, Carro, Maco FROM qrcode WHERE {' AND '.join(filtros)} AND ID < ? "
+               'ORDER BY ID DESC LIMIT ?')
+        return conn.execute(sql, params + [antes_de, limite]).fetchall()
+
+    def buscar_varios(self, ids):
+        # Uma consulta para vários IDs (leitura antecipada); retorna {ID: row}
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        sql = f"SELECT ID, Texto, Carro, Job_Key, Maco FROM qrcode WHERE ID IN ({','.join('?' * len(ids))})"
+        return {row['ID']: row for row in self.conexao().execute(sql, ids)}
+
+    def versao_arquivo(self):
+        # Muda quando o banco (ou o WAL) é trocado ou escrito; invalida caches de linhas
+        versao = []
+        for caminho in (self.path, self.path + '-wal'):
+            try:
+                st = os.stat(caminho)
+            except FileNotFoundError:
+                versao.append(None)
+                continue
+            versao.append((st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(versao)
+
+    def iterar(self, job_key=None, carro=None, id_inicio=None, id_fim=None, tamanho_lote=500):
+        # Gerador: lê em lotes com fetchmany para manter a memória constante.
+        # Filtros por Job_Key/Carro usam idx_jobkey/idx_carro; faixa de ID usa a chave primária.
+        filtros = []
+        params = []
+        if job_key is not None:
+            filtros.append('Job_Key = ?')
+            params.append(job_key)
+        if carro is not None:
+            filtros.append('Carro = ?')
+            params.append(carro)
+        if id_inicio is not None:
+            filtros.append('ID >= ?')
+            params.append(int(id_inicio))
+        if id_fim is not None:
+            filtros.append('ID <= ?')
+            params.append(int(id_fim))
+        sql = 'SELECT ID, Texto, Carro, Job_Key, Maco FROM qrcode'
+        if filtros:
+            sql += ' WHERE ' + ' AND '.join(filtros)
+        sql += ' ORDER BY ID'
+
+        cursor = self.conexao().execute(sql, params)
+        try:
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                yield from linhas
+        finally:
+            cursor.close()
+
+    def _registrar(self, tempo_ms, encontrado):
+        with self._lock:
+            s = self.stats
+            s['consultas'] += 1
+            if not encontrado:
+                s['nao_encontrados'] += 1
+            s['tempo_total_ms'] += tempo_ms
+            s['tempo_ultimo_ms'] = tempo_ms
+            if tempo_ms > s['tempo_max_ms']:
+                s['tempo_max_ms'] = tempo_ms
+
+    def estatisticas(self):
+        with self._lock:
+            s = dict(self.stats)
+        s['tempo_medio_ms'] = s['tempo_total_ms'] / s['consultas'] if s['consultas'] else 0.0
+        return s
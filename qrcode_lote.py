@@ -0,0 +1,120 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from multiprocessing import Pool
+
+from cabos import carregar_tabela_cabos
+from qrcode_db import QRCodeDB
+from qrcode_parser import parse_qrcode
+from roteamento import carregar_rotas, rotear
+
+# Modo sem interface: roteia todas as linhas de um Job_Key, Carro ou faixa de IDs
+# e soma as aplicações por prensa / terminal / cabo.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def aplicacoes_do_texto(texto):
+    return parse_qrcode(texto or '').aplicacoes
+
+
+def somar_lote(textos, rotas, processos=1):
+    totais = {}
+    sem_prensa = Counter()
+    linhas = 0
+
+    if processos > 1:
+        pool = Pool(processos)
+        aplicacoes_iter = pool.imap(aplicacoes_do_texto, textos, chunksize=64)
+    else:
+        pool = None
+        aplicacoes_iter = map(aplicacoes_do_texto, textos)
+
+    try:
+        for aplicacoes in aplicacoes_iter:
+            linhas += 1
+            por_prensa, faltando = rotear(aplicacoes, rotas)
+            sem_prensa.update(faltando)
+            for prensa_id, lista in por_prensa.items():
+                totais.setdefault(prensa_id, Counter()).update(lista)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return totais, sem_prensa, linhas
+
+
+def escrever_csv(totais, sem_prensa, prensas_info, cabos_dict, saida):
+    writer = csv.writer(saida)
+    writer.writerow(['prensa', 'nome', 'terminal', 'cabo', 'descricao', 'qtd'])
+    for prensa_id in sorted(totais):
+        for (terminal, cabo), qtd in sorted(totais[prensa_id].items(), key=lambda x: (x[0][0], x[0][1] or '')):
+            writer.writerow([prensa_id, prensas_info.get(prensa_id, ''), terminal, cabo or '',
+                             cabos_dict.get(cabo, '') if cabo else '', qtd])
+    for terminal, qtd in sorted(sem_prensa.items()):
+        writer.writerow(['', 'SEM PRENSA', terminal, '', '', qtd])
+
+
+def escrever_json(totais, sem_prensa, prensas_info, cabos_dict, linhas, saida):
+    prensas = {}
+    for prensa_id in sorted(totais):
+        terminais = {}
+        for (terminal, cabo), qtd in totais[prensa_id].items():
+            t = terminais.setdefault(terminal, {'total': 0, 'cabos': {}})
+            t['total'] += qtd
+            chave = cabo or ''
+            t['cabos'][chave] = {'qtd': qtd, 'descricao': cabos_dict.get(cabo, '') if cabo else ''}
+        prensas[prensa_id] = {
+            'nome': prensas_info.get(prensa_id, ''),
+            'total': sum(totais[prensa_id].values()),
+            'terminais': terminais,
+        }
+    json.dump({'linhas': linhas, 'prensas': prensas, 'sem_prensa': dict(sem_prensa)},
+              saida, indent=2, ensure_ascii=False)
+    saida.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roteamento em lote de QR Codes por prensa")
+    filtro = parser.add_argument_group('filtros')
+    filtro.add_argument('--job-key')
+    filtro.add_argument('--carro')
+    filtro.add_argument('--id-inicio', type=int)
+    filtro.add_argument('--id-fim', type=int)
+    parser.add_argument('--formato', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--processos', type=int, default=1, help="processos para o parse (padrão: 1)")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    parser.add_argument('--prensas', default=os.path.join(SCRIPT_DIR, 'prensas_config.json'))
+    parser.add_argument('--cabos', default=os.path.join(SCRIPT_DIR, 'cabos_config.json'))
+    args = parser.parse_args(argv)
+
+    if args.job_key is None and args.carro is None and args.id_inicio is None and args.id_fim is None:
+        parser.error("informe --job-key, --carro ou --id-inicio/--id-fim")
+
+    _, rotas, prensas_info = carregar_rotas(args.prensas)
+    cabos_dict = {codigo: info.descricao for codigo, info in carregar_tabela_cabos(args.cabos).items()}
+
+    db = QRCodeDB(args.banco)
+    linhas = db.iterar(job_key=args.job_key, carro=args.carro,
+                       id_inicio=args.id_inicio, id_fim=args.id_fim)
+    textos = (linha['Texto'] for linha in linhas)
+    totais, sem_prensa, total_linhas = somar_lote(textos, rotas, args.processos)
+    db.fechar()
+
+    if total_linhas == 0:
+        print("Nenhuma linha encontrada", file=sys.stderr)
+        return 1
+
+    if args.formato == 'json':
+        escrever_json(totais, sem_prensa, prensas_info, cabos_dict, total_linhas, sys.stdout)
+    else:
+        escrever_csv(totais, sem_prensa, prensas_info, cabos_dict, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Gramática: C:<cabo>-T1:<terminal>-S1:<terminal>#C:<cabo>-...
+# Cada conjunto (separado por '#') tem um cabo e os terminais aplicados nele.
+_TOKEN = re.compile(r'([CTS])([^:]*):([^:]*)')
+
+Conjunto = namedtuple('Conjunto', ['cabo', 'terminais'])
+ErroToken = namedtuple('ErroToken', ['conjunto', 'token', 'motivo'])
+
+
+class QRPayload(namedtuple('QRPayload', ['conjuntos', 'aplicacoes', 'erros'])):
+    __slots__ = ()
+
+    @property
+    def cabos(self):
+        return tuple(dict.fromkeys(c.cabo for c in self.conjuntos if c.cabo))
+
+    @property
+    def terminais(self):
+        return tuple(terminal for terminal, _ in self.aplicacoes)
+
+
+@lru_cache(maxsize=4096)
+def parse_qrcode(texto):
+    conjuntos = []
+    aplicacoes = []
+    erros = []
+
+    for indice, conjunto in enumerate(texto.split('#')):
+        if not conjunto:
+            continue
+        cabo = None
+        terminais = []
+        for token in conjunto.split('-'):
+            m = _TOKEN.match(token)
+            if not m:
+                erros.append(ErroToken(indice, token, 'token inválido'))
+                continue
+            tipo, _, valor = m.groups()
+            if not valor:
+                erros.append(ErroToken(indice, token, 'valor vazio'))
+            elif tipo == 'C':
+                cabo = valor
+            else:
+                terminais.append(valor)
+        # O cabo vale para todos os terminais do conjunto, mesmo se vier depois deles
+        conjuntos.append(Conjunto(cabo, tuple(terminais)))
+        aplicacoes.extend((terminal, cabo) for terminal in terminais)
+
+    return QRPayload(tuple(conjuntos), tuple(aplicacoes), tuple(erros))
@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from qrcode_parser import parse_qrcode
+
+# Leitura antecipada dos IDs vizinhos enquanto o operador incrementa/decrementa o input.
+# Uma thread busca os IDs na direção do passo e deixa as linhas (já com o Texto
+# parseado) num LRU; o Enter depois não precisa ir ao banco.
+
+LinhaQR = namedtuple('LinhaQR', ['texto', 'carro', 'job_key', 'maco'])
+
+NAO_ENCONTRADO = object()
+
+
+class QRCodeCache:
+    # LRU limitado e thread-safe; entradas valem só para a versão do arquivo em que foram lidas
+    def __init__(self, tamanho_max=512):
+        self.tamanho_max = tamanho_max
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'acertos': 0, 'faltas': 0}
+
+    def obter(self, qr_id, versao):
+        with self._lock:
+            item = self._itens.get(qr_id)
+            if item is None or item[0] != versao:
+                self.stats['faltas'] += 1
+                return None
+            self._itens.move_to_end(qr_id)
+            self.stats['acertos'] += 1
+            return item[1]
+
+    def contem(self, qr_id, versao):
+        with self._lock:
+            item = self._itens.get(qr_id)
+            return item is not None and item[0] == versao
+
+    def guardar(self, qr_id, versao, linha):
+        with self._lock:
+            self._itens[qr_id] = (versao, linha)
+            self._itens.move_to_end(qr_id)
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def receber(self, versao, linhas, aquecer=True):
+        # Linhas novas do feed: substituem entradas existentes (ex.: NAO_ENCONTRADO de um ID
+        # que acabou de chegar); as que não estão no cache só entram se aquecer=True
+        with self._lock:
+            for qr_id, linha in linhas:
+                if aquecer or qr_id in self._itens:
+                    self._itens[qr_id] = (versao, linha)
+                    self._itens.move_to_end(qr_id)
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+
+
+class Prefetcher:
+    def __init__(self, db, cache, janela=8, ao_carregar=None, versao=None):
+        self.db = db
+        self.cache = cache
+        self.janela = janela
+        # Chave de validade do cache: padrão é a versão do arquivo; com o feed, a geração dele
+        self.versao = versao or db.versao_arquivo
+        # Chamado na thread de leitura com os IDs carregados (use um sinal Qt para voltar à GUI)
+        self.ao_carregar = ao_carregar
+        self._pedido = None
+        self._cond = threading.Condition()
+        self._ativo = True
+        self._thread = threading.Thread(target=self._executar, name='qrcode-prefetch', daemon=True)
+        self._thread.start()
+
+    def sugerir(self, centro, passo):
+        # Só o pedido mais recente importa: um novo substitui o que ainda não foi atendido
+        with self._cond:
+            self._pedido = (int(centro), int(passo) or 1)
+            self._cond.notify()
+
+    def parar(self):
+        with self._cond:
+            self._ativo = False
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
+
+    def ids_vizinhos(self, centro, passo):
+        # À frente na direção do passo, mais um vizinho de cada lado
+        ids = [centro + passo * k for k in range(self.janela + 1)]
+        ids += [centro - passo, centro + 1, centro - 1]
+        return [i for i in dict.fromkeys(ids) if i > 0]
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                while self._pedido is None and self._ativo:
+                    self._cond.wait()
+                if not self._ativo:
+                    return
+                centro, passo = self._pedido
+                self._pedido = None
+            try:
+                self.carregar(self.ids_vizinhos(centro, passo))
+            except Exception as e:
+                print(f"Prefetch falhou: {e}")
+
+    def carregar(self, ids):
+        versao = self.versao()
+        faltando = [i for i in ids if not self.cache.contem(i, versao)]
+        if not faltando:
+            return
+        rows = self.db.buscar_varios(faltando)
+        for qr_id in faltando:
+            row = rows.get(qr_id)
+            if row is None:
+                self.cache.guardar(qr_id, versao, NAO_ENCONTRADO)
+                continue
+            linha = LinhaQR(row['Texto'], row['Carro'], row['Job_Key'], row['Maco'])
+            # Aquece o cache do parser para o Enter não precisar parsear
+            parse_qrcode(linha.texto or '')
+            self.cache.guardar(qr_id, versao, linha)
+        if self.ao_carregar is not None:
+            self.ao_carregar(faltando)
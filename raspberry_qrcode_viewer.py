@@ -1,14 +1,194 @@
+import time
+INICIO_PROCESSO = time.perf_counter()
+import argparse
 import sys
 import os
+import gc
 import json
-import sqlite3
 from collections import Counter
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import Qt
+from cabos import carregar_tabela_cabos, info_do_cabo
+from cliente_qrcode import ClienteQR, ServidorIndisponivel
+from consulta import BuscaQR, ConsultaQR, ConsultaSinais, criar_pool_consulta
+from feed_qrcode import FeedQRCode
+from fila_prensa import ORDENS, FilaPrensa
+from gamepad_evdev import GamepadEvdev
+from mapa_prensas import MapaPrensas
+from metricas import MetricasProducao, diretorio_metricas
+from plano_lote import CardLote, PlanoLote, trocas
+from progresso import DESMARCAR, FINALIZAR, MARCAR, ProgressoJournal
+from qrcode_db import QRCodeDB
+from qrcode_parser import parse_qrcode
+from qrcode_prefetch import NAO_ENCONTRADO, LinhaQR, Prefetcher, QRCodeCache
+from roteamento import carregar_layout, carregar_rotas, rotear, terminais_da_prensa
+from snapshot_qrcode import SnapshotQR
+from vigia_memoria import MB, VigiaMemoria, contar_objetos_qt, devolver_memoria
+from rotas_cache import hash_rotas
 
-class QRCodeViewer(QtWidgets.QWidget):
+# Estilo do conteúdo das prensas, aplicado uma única vez no container via objectName.
+# Seleção e conclusão dos cards usam as propriedades dinâmicas 'selected' e 'done'.
+APLICACOES_STYLE = """
+QLabel#vazio { font-size: 16px; padding: 20px; }
+QLabel#semPrensa { color: rgb(255, 120, 120); font-size: 14px; padding: 3px; }
+QLabel#prensaTitulo { color: rgb(69, 207, 81); font-weight: bold; font-size: 20px; background: transparent; border: none; }
+QLabel#terminalLabel { color: white; font-weight: bold; font-size: 18px; padding: 3px; }
+QLabel#caboLabel { color: rgb(200, 200, 200); font-size: 16px; padding: 2px; }
+QFrame#prensaFrame { background-color: rgb(50, 50, 60); border: none; border-radius: 3px; padding: 3px; }
+QFrame#prensaFrame[done="true"] { background-color: rgb(40, 100, 40); }
+QFrame#prensaFrame[selected="true"] { border: 3px solid rgb(255, 200, 0); }
+QFrame#prensaFrame[selected="true"][done="true"] { border: 3px solid rgb(69, 207, 81); }
+QFrame#prensaFrame QWidget { background: transparent; border: none; }
+QFrame#prensaFrame QFrame#separador { background-color: rgb(80, 80, 90); max-height: 1px; }
+"""
+
+
+class PerfilInicializacao:
+    # Tempo de cada fase da inicialização (--profile-startup); inativo não faz nada
+    def __init__(self, inicio, ativo=True):
+        self.ativo = ativo
+        self.inicio = inicio
+        self.ultimo = inicio
+        self.fases = []
+    
+    def marcar(self, fase):
+        if not self.ativo:
+            return
+        agora = time.perf_counter()
+        self.fases.append((fase, (agora - self.ultimo) * 1000.0))
+        self.ultimo = agora
+    
+    def imprimir(self):
+        if not self.ativo:
+            return
+        print("Inicialização:")
+        for fase, tempo_ms in self.fases:
+            print(f"  {fase:<20} {tempo_ms:8.1f} ms")
+        print(f"  {'total':<20} {(self.ultimo - self.inicio) * 1000.0:8.1f} ms")
+
+
+# Widgets escondidos que um card (ou grupo) guarda além do que a leitura atual usa. Sem
+# teto, cada posição do pool fica com o maior maço que já mostrou e o total só cresce.
+FOLGA_POOL = 4
+
+
+def aparar(widgets, usados):
+    # Solta os escondidos além da folga; retorna a lista que fica
+    for widget in widgets[usados + FOLGA_POOL:]:
+        widget.deleteLater()
+    return widgets[:usados + FOLGA_POOL]
+
+
+class TerminalGrupo(QtWidgets.QWidget):
+    # Terminal à esquerda, cabos à direita, separador opcional abaixo
+    def __init__(self):
+        super().__init__()
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setSpacing(3)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        linha = QtWidgets.QHBoxLayout()
+        linha.setSpacing(10)
+        linha.setContentsMargins(0, 0, 0, 0)
+        
+        self.terminal_label = QtWidgets.QLabel()
+        self.terminal_label.setObjectName("terminalLabel")
+        self.terminal_label.setAlignment(Qt.AlignCenter)
+        self.terminal_label.setFixedWidth(120)
+        linha.addWidget(self.terminal_label)
+        
+        self.cabos_layout = QtWidgets.QVBoxLayout()
+        self.cabos_layout.setSpacing(2)
+        self.cabos_layout.setContentsMargins(0, 0, 0, 0)
+        linha.addLayout(self.cabos_layout)
+        linha.addStretch()
+        self.cabo_labels = []
+        layout.addLayout(linha)
+        
+        self.separador = QtWidgets.QFrame()
+        self.separador.setObjectName("separador")
+        self.separador.setFrameShape(QtWidgets.QFrame.HLine)
+        layout.addWidget(self.separador)
+    
+    def preencher(self, texto_terminal, textos_cabos, com_separador):
+        self.terminal_label.setText(texto_terminal)
+        while len(self.cabo_labels) < len(textos_cabos):
+            label = QtWidgets.QLabel()
+            label.setObjectName("caboLabel")
+            self.cabos_layout.addWidget(label)
+            self.cabo_labels.append(label)
+        for i, label in enumerate(self.cabo_labels):
+            if i < len(textos_cabos):
+                label.setText(textos_cabos[i])
+                label.show()
+            else:
+                label.hide()
+        self.cabo_labels = aparar(self.cabo_labels, len(textos_cabos))
+        self.separador.setVisible(com_separador)
+
+
+class PrensaCard(QtWidgets.QFrame):
+    # Card reutilizável de uma prensa; só texto e visibilidade mudam entre leituras
     def __init__(self):
         super().__init__()
+        self.setObjectName("prensaFrame")
+        self.prensa_id = None
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setSpacing(2)
+        layout.setContentsMargins(3, 3, 3, 3)
+        
+        self.titulo_label = QtWidgets.QLabel()
+        self.titulo_label.setObjectName("prensaTitulo")
+        layout.addWidget(self.titulo_label)
+        
+        self.detalhes_widget = QtWidgets.QWidget()
+        self.detalhes_layout = QtWidgets.QVBoxLayout(self.detalhes_widget)
+        self.detalhes_layout.setSpacing(3)
+        self.detalhes_layout.setContentsMargins(0, 0, 0, 0)
+        self.grupos = []
+        layout.addWidget(self.detalhes_widget)
+    
+    def definir_estado(self, selecionado, completo):
+        # Só repolir quando o estado muda; retorna True se houve repolimento
+        self.detalhes_widget.setVisible(not completo)
+        if self.property('selected') == selecionado and self.property('done') == completo:
+            return False
+        self.setProperty('selected', selecionado)
+        self.setProperty('done', completo)
+        self.style().unpolish(self)
+        self.style().polish(self)
+        return True
+    
+    def preencher(self, prensa_id, titulo, terminais):
+        self.prensa_id = prensa_id
+        self.titulo_label.setText(titulo)
+        while len(self.grupos) < len(terminais):
+            grupo = TerminalGrupo()
+            self.detalhes_layout.addWidget(grupo)
+            self.grupos.append(grupo)
+        for i, grupo in enumerate(self.grupos):
+            if i < len(terminais):
+                texto_terminal, textos_cabos = terminais[i]
+                grupo.preencher(texto_terminal, textos_cabos, i < len(terminais) - 1)
+                grupo.show()
+            else:
+                grupo.hide()
+        self.grupos = aparar(self.grupos, len(terminais))
+
+
+class QRCodeViewer(QtWidgets.QWidget):
+    # Emitido pela thread de prefetch; a conexão enfileirada traz o aviso para a GUI
+    prefetch_carregado = QtCore.pyqtSignal(list)
+    fila_atualizada = QtCore.pyqtSignal()
+    banco_substituido = QtCore.pyqtSignal()
+    # Ações do backend evdev (thread própria): (acao, passo, repeticao)
+    acao_gamepad = QtCore.pyqtSignal(str, int, bool)
+    
+    def __init__(self, perfil=None, prensa_fixa=None, ordem_fila='id', snapshot=False, servidor=None,
+                 gamepad_evdev=None, lote=False, mapa=False, vigia_mb=None, metricas_dir=None,
+                 metricas_intervalo=15.0):
+        super().__init__()
+        self.perfil = perfil or PerfilInicializacao(INICIO_PROCESSO, ativo=False)
         self.setWindowTitle("QR Code Viewer - Prensas")
         self.setMinimumSize(600, 400)
         self.setStyleSheet("background-color: rgb(25, 25, 40); color: white;")
@@ -16,23 +196,168 @@ class QRCodeViewer(QtWidgets.QWidget):
         # Caminho do banco no mesmo diretório do script
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.banco_qrcode_path = os.path.join(script_dir, 'banco_qrcode.db')
+        self.db = QRCodeDB(self.banco_qrcode_path)
+        # Com --servidor as consultas vão ao servidor_qrcode.py; o banco local fica de reserva
+        # (e para fila, busca e snapshot, que continuam locais)
+        self.cliente = ClienteQR(servidor) if servidor else None
+        # Modo snapshot (--snapshot): tabela inteira em memória, salva em banco_qrcode.snap
+        self.usar_snapshot = snapshot
+        self.snapshot = None
+        self.snapshot_path = os.path.splitext(self.banco_qrcode_path)[0] + '.snap'
+        self.snapshot_salvo = None
+        self.progresso_path = os.path.join(script_dir, 'progresso_prensas.db')
+        # Sem diretório, um tmpfs (diretorio_metricas) escolhido ao iniciar a exportação
+        self.metricas_dir = metricas_dir
+        self.metricas_intervalo = metricas_intervalo
+        self.metricas = MetricasProducao()
+        self.consulta_inicio = None
+        self.progresso = None
+        self.qr_atual = None
+        self.qr_cache = QRCodeCache(512)
+        self.prefetcher = None
+        self.feed = None
+        self.pedido_atual = 0
+        self.consulta_pool = criar_pool_consulta(self)
+        self.consulta_sinais = ConsultaSinais(self)
+        self.consulta_sinais.concluida.connect(self.consulta_concluida)
+        self.consulta_sinais.falhou.connect(self.consulta_falhou)
+        self.consulta_sinais.pagina_busca.connect(self.busca_pagina)
+        self.consulta_sinais.busca_falhou.connect(self.busca_falhou)
+        # Busca por Job_Key / Carro / Maço (texto não numérico ou prefixado com '/')
+        self.modo_busca = False
+        self.busca_texto = ''
+        self.busca_pedido = 0
+        self.busca_carregando = False
+        self.busca_fim = True
+        # Estação fixada numa prensa (--prensa): fila dos maços pendentes para ela
+        self.prensa_fixa = prensa_fixa
+        self.ordem_fila = ordem_fila
+        self.fila = None
+        self.modo_fila = False
+        self.fila_atualizada.connect(self.atualizar_fila)
+        self.banco_substituido.connect(self.reiniciar_fila)
+        # Configs relativas ao diretório de execução (run.sh)
+        self.config_paths = {
+            'prensas': os.path.abspath('prensas_config.json'),
+            'cabos': os.path.abspath('cabos_config.json'),
+            'gamepad': os.path.abspath('gamepad_keys.json'),
+        }
+        self.config_assinaturas = {}
+        self.config_erros = {}
+        self.gamepad_keys = {'up': [], 'down': [], 'left': [], 'right': [], 'enter': [], 'focus_input': []}
+        # Gamepad lido direto do /dev/input (--gamepad-evdev): mapa na seção 'evdev' do gamepad_keys.json
+        self.gamepad_evdev_origem = gamepad_evdev
+        self.gamepad_evdev_config = {}
+        self.gamepad_evdev = None
+        self.dialogo_finalizar = None
+        # Modo lote (--lote, botão "Lote" ou ID prefixado com '+'): vários maços num plano só
+        self.modo_lote = lote
+        self.lote = None
+        self.pedido_em_lote = False
+        self.resultado_atual = None
+        # Modo mapa (--mapa ou botão "Mapa"): planta da fábrica no lugar da lista de cards;
+        # a planta só é (re)montada quando aparece depois de uma troca de config
+        self.modo_mapa = mapa
+        self.mapa_desatualizado = True
+        self.conteudo_cards = []
+        # Vigia de memória (--vigia-memoria MB): crescimento acima do limite limpa a tela quando ociosa
+        self.vigia = VigiaMemoria(vigia_mb, ao_exceder=self.memoria_excedida) if vigia_mb else None
+        self.limpeza_pendente = False
+        self.acao_gamepad.connect(self.executar_acao_gamepad)
         self.prensas = []
         self.cabos_dict = {}
+        self.cabos_info = {}
         self.aplicacoes_por_prensa = {}
         self.prensas_info = {}
+        self.rotas = {}
+        self.config_hash = None
+        self.terminais_sem_prensa = Counter()
         self.prensa_frames = []
         self.prensa_widgets = []
+        self.card_pool = []
+        self.display_stats = {'atualizacoes': 0, 'tempo_ultimo_ms': 0.0, 'tempo_max_ms': 0.0, 'tempo_total_ms': 0.0}
         self.current_index = 0
+        self.selecao_anterior = 0
+        self.selecao_stats = {'atualizacoes': 0, 'repolidos_ultimo': 0, 'repolidos_total': 0}
         self.completed_frames = set()
         self.key_press_time = None
         self.key_press_key = None
         self.increment_timer = QtCore.QTimer()
         self.increment_timer.timeout.connect(self.auto_increment)
         
+        # Janela e input primeiro; configs e banco só depois do primeiro frame (showEvent)
+        self.subsistemas_carregados = False
+        self.subsistemas_agendados = False
+        self.init_ui()
+        self.perfil.marcar('janela')
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.subsistemas_carregados and not self.subsistemas_agendados:
+            self.subsistemas_agendados = True
+            QtCore.QTimer.singleShot(0, self.carregar_subsistemas)
+    
+    def closeEvent(self, event):
+        self.encerrar()
+        super().closeEvent(event)
+    
+    def encerrar(self):
+        # A thread do diário é daemon: sem fechar, o último lote de marcações se perde na saída
+        if self.progresso is not None:
+            self.progresso.fechar()
+            self.progresso = None
+    
+    def carregar_subsistemas(self):
+        # Idempotente: também é chamado sob demanda se o operador agir antes do carregamento
+        if self.subsistemas_carregados:
+            return
+        self.subsistemas_carregados = True
+        self.perfil.marcar('primeiro frame')
         self.load_prensas()
+        self.perfil.marcar('prensas')
         self.load_cabos()
+        self.perfil.marcar('cabos')
         self.load_gamepad_keys()
-        self.init_ui()
+        self.iniciar_gamepad_evdev()
+        self.perfil.marcar('gamepad')
+        try:
+            self.db.conexao()
+        except Exception as e:
+            print(f"Banco indisponível: {e}")
+        # Linhas novas do banco chegam pelo feed (ID > último visto), sem reabrir nem reler a tabela
+        desde = self.iniciar_snapshot() if self.usar_snapshot else None
+        self.feed = FeedQRCode(self.db, desde=desde)
+        self.feed.assinar(self.receber_linhas_novas)
+        self.feed.ao_reiniciar.append(self.feed_reiniciado)
+        if self.cliente is not None:
+            self.cliente.ao_trocar_geracao.append(self.qr_cache.limpar)
+        # O prefetch lê pelo buscar_varios daqui: servidor fora do ar cai no banco local
+        self.prefetcher = Prefetcher(self, self.qr_cache, ao_carregar=self.prefetch_carregado.emit,
+                                     versao=self.versao_cache)
+        self.prefetch_carregado.connect(self.atualizar_previa)
+        self.perfil.marcar('banco')
+        try:
+            self.progresso = ProgressoJournal(self.progresso_path)
+        except Exception as e:
+            print(f"Diário de progresso indisponível: {e}")
+        self.perfil.marcar('progresso')
+        self.iniciar_fila()
+        self.iniciar_config_watcher()
+        self.perfil.marcar('watcher')
+        # metricas_prensas.prom/.json para o coletor local (ex.: textfile do node_exporter)
+        if self.metricas_dir is None:
+            self.metricas_dir = diretorio_metricas()
+        if self.metricas_dir is None:
+            print("Métricas: nenhum diretório em tmpfs com escrita; use --metricas-dir")
+        elif self.metricas_intervalo > 0:
+            self.metricas_timer = QtCore.QTimer(self)
+            self.metricas_timer.timeout.connect(self.exportar_metricas)
+            self.metricas_timer.start(int(self.metricas_intervalo * 1000))
+        if self.vigia is not None:
+            self.vigia_timer = QtCore.QTimer(self)
+            self.vigia_timer.timeout.connect(self.amostrar_memoria)
+            self.vigia_timer.start(60000)
+        self.perfil.imprimir()
     
     def init_ui(self):
         layout = QtWidgets.QVBoxLayout(self)
@@ -51,7 +376,7 @@ class QRCodeViewer(QtWidgets.QWidget):
         top_layout.addWidget(header)
         
         self.input_qr = QtWidgets.QLineEdit()
-        self.input_qr.setPlaceholderText("ID...")
+        self.input_qr.setPlaceholderText("ID ou /Carro, Job Key, Maço...")
         self.input_qr.setStyleSheet("font-size: 16px; padding: 3px; background-color: rgb(50, 50, 60); border: none; border-radius: 3px;")
         self.input_qr.returnPressed.connect(self.processar_qr_e_focar)
         top_layout.addWidget(self.input_qr)
@@ -61,333 +386,1011 @@ class QRCodeViewer(QtWidgets.QWidget):
         btn_ler.clicked.connect(self.processar_qr)
         top_layout.addWidget(btn_ler)
         
+        btn_buscar = QtWidgets.QPushButton("Buscar")
+        btn_buscar.setStyleSheet("font-size: 16px; padding: 3px 12px; background-color: rgb(60, 110, 200); border-radius: 3px; font-weight: bold;")
+        btn_buscar.clicked.connect(lambda: self.iniciar_busca(self.input_qr.text()))
+        top_layout.addWidget(btn_buscar)
+        
+        self.btn_lote = QtWidgets.QPushButton("Lote")
+        self.btn_lote.setCheckable(True)
+        self.btn_lote.setChecked(self.modo_lote)
+        self.btn_lote.setFocusPolicy(Qt.NoFocus)
+        self.btn_lote.setStyleSheet("QPushButton { font-size: 16px; padding: 3px 12px; background-color: rgb(80, 80, 95); border-radius: 3px; font-weight: bold; } "
+                                    "QPushButton:checked { background-color: rgb(255, 160, 0); color: black; }")
+        self.btn_lote.toggled.connect(self.alternar_lote)
+        top_layout.addWidget(self.btn_lote)
+        
+        self.btn_mapa = QtWidgets.QPushButton("Mapa")
+        self.btn_mapa.setCheckable(True)
+        self.btn_mapa.setChecked(self.modo_mapa)
+        self.btn_mapa.setFocusPolicy(Qt.NoFocus)
+        self.btn_mapa.setStyleSheet("QPushButton { font-size: 16px; padding: 3px 12px; background-color: rgb(80, 80, 95); border-radius: 3px; font-weight: bold; } "
+                                    "QPushButton:checked { background-color: rgb(60, 110, 200); }")
+        self.btn_mapa.toggled.connect(self.alternar_mapa)
+        top_layout.addWidget(self.btn_mapa)
+        
         layout.addWidget(top_frame)
         
+        # Erros de configuração (JSON inválido etc.)
+        self.config_erro_label = QtWidgets.QLabel("")
+        self.config_erro_label.setStyleSheet("font-size: 13px; padding: 3px; color: rgb(255, 200, 0); background-color: rgb(80, 40, 40); border-radius: 3px;")
+        self.config_erro_label.setWordWrap(True)
+        self.config_erro_label.hide()
+        layout.addWidget(self.config_erro_label)
+        self.atualizar_erros_config()
+        
         # Info QR
         self.info_label = QtWidgets.QLabel("")
-        self.info_label.setStyleSheet("font-size: 14px; padding: 5px; background-color: rgb(50, 50, 60); border-radius: 3px;")
+        self.info_label.setStyleSheet("QLabel { font-size: 14px; padding: 5px; background-color: rgb(50, 50, 60); border-radius: 3px; } "
+                                      "QLabel[estado=\"carregando\"] { color: rgb(255, 200, 0); } "
+                                      "QLabel[estado=\"erro\"] { color: rgb(255, 120, 120); background-color: rgb(80, 40, 40); }")
+        self.info_label.setWordWrap(True)
         self.info_label.setAlignment(Qt.AlignCenter)
         self.info_label.hide()
         layout.addWidget(self.info_label)
         
+        # Resultados da busca; navegados pelo gamepad via keyPressEvent (sem foco próprio)
+        self.busca_lista = QtWidgets.QListWidget()
+        self.busca_lista.setFocusPolicy(Qt.NoFocus)
+        self.busca_lista.setUniformItemSizes(True)
+        self.busca_lista.setStyleSheet("QListWidget { font-size: 16px; background-color: rgb(35, 35, 50); border: none; } "
+                                       "QListWidget::item { padding: 6px; } "
+                                       "QListWidget::item:selected { background-color: rgb(50, 50, 60); border: 3px solid rgb(255, 200, 0); color: white; }")
+        self.busca_lista.itemActivated.connect(lambda _: self.abrir_resultado_busca())
+        self.busca_lista.verticalScrollBar().valueChanged.connect(self.busca_rolou)
+        self.busca_lista.hide()
+        layout.addWidget(self.busca_lista)
+        
         # Scroll de aplicações
         scroll = QtWidgets.QScrollArea()
         scroll.setWidgetResizable(True)
         scroll.setStyleSheet("border: none;")
         
         self.aplicacoes_widget = QtWidgets.QWidget()
+        self.aplicacoes_widget.setStyleSheet(APLICACOES_STYLE)
         self.aplicacoes_layout = QtWidgets.QVBoxLayout(self.aplicacoes_widget)
         self.aplicacoes_layout.setSpacing(8)
         self.aplicacoes_layout.setContentsMargins(5, 5, 5, 5)
         
+        # Cards ficam entre o rótulo "vazio" e o aviso de terminais sem prensa
+        self.vazio_label = QtWidgets.QLabel("Nenhuma aplicação encontrada")
+        self.vazio_label.setObjectName("vazio")
+        self.vazio_label.setAlignment(Qt.AlignCenter)
+        self.vazio_label.hide()
+        self.aplicacoes_layout.addWidget(self.vazio_label)
+        
+        self.aviso_label = QtWidgets.QLabel()
+        self.aviso_label.setObjectName("semPrensa")
+        self.aviso_label.setWordWrap(True)
+        self.aviso_label.hide()
+        self.aplicacoes_layout.addWidget(self.aviso_label)
+        self.aplicacoes_layout.addStretch()
+        
         scroll.setWidget(self.aplicacoes_widget)
         layout.addWidget(scroll)
         self.scroll_area = scroll
+        
+        # Planta + card da prensa selecionada (mesmo estilo dos cards da lista)
+        self.mapa_widget = QtWidgets.QWidget()
+        self.mapa_widget.setStyleSheet(APLICACOES_STYLE)
+        mapa_layout = QtWidgets.QVBoxLayout(self.mapa_widget)
+        mapa_layout.setSpacing(5)
+        mapa_layout.setContentsMargins(5, 5, 5, 5)
+        self.mapa = MapaPrensas()
+        self.mapa.prensa_clicada.connect(self.selecionar_prensa)
+        mapa_layout.addWidget(self.mapa, 1)
+        self.mapa_card = PrensaCard()
+        self.mapa_card.hide()
+        mapa_layout.addWidget(self.mapa_card)
+        layout.addWidget(self.mapa_widget)
+        self.mostrar_aplicacoes()
     
     def load_prensas(self):
-        if not os.path.exists('prensas_config.json'):
-            return
+        caminho = self.config_paths['prensas']
         try:
-            with open('prensas_config.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.prensas = data.get('prensas', []) if isinstance(data, dict) else data
-        except:
-            pass
+            prensas, rotas, prensas_info = carregar_rotas(caminho)
+        except Exception as e:
+            self.reportar_erro_config('prensas', caminho, e)
+            return False
+        # Troca tudo de uma vez: a próxima leitura já usa a config nova completa
+        self.prensas, self.rotas, self.prensas_info = prensas, rotas, prensas_info
+        self.config_hash = hash_rotas(rotas)
+        self.mapa_desatualizado = True
+        self.reportar_erro_config('prensas', caminho, None)
+        if self.fila is not None:
+            # Terminais da prensa fixada mudaram: a fila é refeita com o conjunto novo
+            prensa = next((p for p in prensas if p.get('id') == self.prensa_fixa), None)
+            if prensa is None or frozenset(terminais_da_prensa(prensa)) != self.fila.terminais:
+                self.reiniciar_fila()
+        return True
     
     def load_cabos(self):
-        if not os.path.exists('cabos_config.json'):
-            return
+        caminho = self.config_paths['cabos']
         try:
-            with open('cabos_config.json', 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                self.cabos_dict = config.get('cabos', {})
-        except:
-            pass
+            cabos_info = carregar_tabela_cabos(caminho)
+            cabos_dict = {codigo: info.descricao for codigo, info in cabos_info.items()}
+        except Exception as e:
+            self.reportar_erro_config('cabos', caminho, e)
+            return False
+        self.cabos_info, self.cabos_dict = cabos_info, cabos_dict
+        self.reportar_erro_config('cabos', caminho, None)
+        return True
     
     def load_gamepad_keys(self):
-        self.gamepad_keys = {'up': [], 'down': [], 'left': [], 'right': [], 'enter': [], 'focus_input': []}
-        if not os.path.exists('gamepad_keys.json'):
+        caminho = self.config_paths['gamepad']
+        gamepad_keys = {'up': [], 'down': [], 'left': [], 'right': [], 'enter': [], 'focus_input': []}
+        if not os.path.exists(caminho):
+            return True
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            evdev = data.pop('evdev', {})
+            for acao, teclas in data.items():
+                gamepad_keys[acao] = [int(tecla) for tecla in teclas]
+        except Exception as e:
+            self.reportar_erro_config('gamepad', caminho, e)
+            return False
+        self.gamepad_keys = gamepad_keys
+        self.gamepad_evdev_config = evdev
+        if self.gamepad_evdev is not None:
+            self.gamepad_evdev.atualizar_mapa(evdev, evdev)
+        self.reportar_erro_config('gamepad', caminho, None)
+        return True
+    
+    def iniciar_gamepad_evdev(self):
+        # '--gamepad-evdev' sem caminho usa o dispositivo aprendido pelo configure_gamepad.py
+        if self.gamepad_evdev_origem is None:
+            return
+        origem = self.gamepad_evdev_origem or self.gamepad_evdev_config.get('dispositivo')
+        if not origem:
+            print("Gamepad evdev: nenhum dispositivo (configure com configure_gamepad.py --evdev)")
+            return
+        self.gamepad_evdev = GamepadEvdev(origem, self.gamepad_evdev_config, self.gamepad_evdev_config,
+                                          ao_acao=self.acao_gamepad.emit)
+    
+    def reportar_erro_config(self, nome, caminho, erro):
+        if erro is None:
+            if self.config_erros.pop(nome, None) is not None:
+                print(f"Config {nome} recarregada: {caminho}")
+        else:
+            mensagem = f"{os.path.basename(caminho)}: {erro}"
+            self.config_erros[nome] = mensagem
+            print(f"Erro na config {nome} (mantendo a anterior): {mensagem}")
+        self.atualizar_erros_config()
+    
+    def atualizar_erros_config(self):
+        if not hasattr(self, 'config_erro_label'):
             return
+        if self.config_erros:
+            self.config_erro_label.setText("Config inválida, usando a última válida — " + " | ".join(self.config_erros.values()))
+            self.config_erro_label.show()
+        else:
+            self.config_erro_label.hide()
+    
+    def assinatura_arquivo(self, caminho):
         try:
-            with open('gamepad_keys.json', 'r', encoding='utf-8') as f:
-                self.gamepad_keys = json.load(f)
-        except:
-            pass
+            st = os.stat(caminho)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def iniciar_config_watcher(self):
+        self.config_loaders = {
+            'prensas': self.load_prensas,
+            'cabos': self.load_cabos,
+            'gamepad': self.load_gamepad_keys,
+        }
+        for nome, caminho in self.config_paths.items():
+            self.config_assinaturas[nome] = self.assinatura_arquivo(caminho)
+        
+        # Editores e rsync gravam em etapas / trocam o arquivo: agrupa os eventos antes de recarregar
+        self.reload_timer = QtCore.QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(300)
+        self.reload_timer.timeout.connect(self.recarregar_configs)
+        
+        self.config_watcher = QtCore.QFileSystemWatcher(self)
+        self.config_watcher.fileChanged.connect(self.reload_timer.start)
+        self.config_watcher.directoryChanged.connect(self.reload_timer.start)
+        self.vigiar_configs()
+    
+    def vigiar_configs(self):
+        # Arquivos substituídos por rename saem da lista do watcher; o diretório pega a recriação
+        vigiados = set(self.config_watcher.files()) | set(self.config_watcher.directories())
+        caminhos = [c for c in self.config_paths.values() if os.path.exists(c)]
+        caminhos += {os.path.dirname(c) for c in self.config_paths.values()}
+        novos = [c for c in caminhos if c not in vigiados]
+        if novos:
+            self.config_watcher.addPaths(novos)
+    
+    def recarregar_configs(self):
+        for nome, caminho in self.config_paths.items():
+            assinatura = self.assinatura_arquivo(caminho)
+            if assinatura == self.config_assinaturas.get(nome):
+                continue
+            self.config_assinaturas[nome] = assinatura
+            if assinatura is None:
+                # Arquivo removido (ou no meio de uma troca): mantém a config atual
+                continue
+            self.config_loaders[nome]()
+        self.vigiar_configs()
     
     def processar_qr(self):
+        self.carregar_subsistemas()
         qr_id = self.input_qr.text().strip()
+        # '+ID' acrescenta o maço ao lote mesmo fora do modo lote
+        em_lote = self.modo_lote or qr_id.startswith('+')
+        qr_id = qr_id.lstrip('+').strip()
         if not qr_id:
             return
+        if qr_id.startswith('/') or not qr_id.isdigit():
+            self.iniciar_busca(qr_id.lstrip('/'))
+            return
+        self.sair_busca()
+        self.esconder_fila()
         
+        # Pedido novo torna os anteriores obsoletos; a tela atual fica até o resultado chegar
+        self.pedido_atual += 1
+        self.pedido_em_lote = em_lote
+        self.mostrar_info(f"Carregando ID {qr_id}...", 'carregando')
+        self.consulta_inicio = time.monotonic()
+        config_hash = self.config_hash
+        self.consulta_pool.start(ConsultaQR(self.pedido_atual, qr_id, self.buscar_qrcode, self.rotas,
+                                            self.consulta_sinais, lambda: self.pedido_atual,
+                                            lambda i: self.fonte_rotas().buscar_rotas(i, config_hash),
+                                            self.buscar_snapshot if self.snapshot is not None else None))
+    
+    def iniciar_fila(self):
+        if self.prensa_fixa is None:
+            return
+        prensa = next((p for p in self.prensas if p.get('id') == self.prensa_fixa), None)
+        if prensa is None:
+            self.mostrar_info(f"Erro: prensa {self.prensa_fixa} não está em {os.path.basename(self.config_paths['prensas'])}", 'erro')
+            return
+        concluidos = ()
+        if self.progresso is not None:
+            try:
+                concluidos = self.progresso.concluidos(self.prensa_fixa)
+            except Exception as e:
+                print(f"Falha ao ler progresso da prensa {self.prensa_fixa}: {e}")
+        # Com o feed a fila não faz polling: recebe as linhas novas dele
+        self.fila = FilaPrensa(self.db, self.prensa_fixa, terminais_da_prensa(prensa), concluidos,
+                               self.ordem_fila, intervalo=None if self.feed is not None else 5.0,
+                               ao_atualizar=self.fila_atualizada.emit)
+        if self.feed is not None:
+            self.feed.assinar(self.fila.receber)
+        self.mostrar_fila()
+        self.setFocus()
+    
+    def reiniciar_fila(self):
+        # Banco substituído ou terminais da prensa alterados: a fila é recarregada
+        if self.fila is None:
+            return
+        self.fila.parar()
+        if self.feed is not None and self.fila.receber in self.feed.assinantes:
+            self.feed.assinantes.remove(self.fila.receber)
+        self.fila = None
+        self.iniciar_fila()
+    
+    def iniciar_snapshot(self):
+        # O snapshot salvo carrega sem depender do banco; o feed completa a partir do último ID dele
+        snapshot = SnapshotQR.carregar(self.snapshot_path)
+        if snapshot is not None and not snapshot.confere(self.db):
+            print("Snapshot não confere com o banco, reconstruindo")
+            snapshot = None
+        self.snapshot = snapshot or SnapshotQR()
+        print(f"Snapshot: {len(self.snapshot)} linhas, {self.snapshot.bytes_usados() // 1024} KB")
+        return self.snapshot.ultimo_id
+    
+    def salvar_snapshot(self):
+        # Thread do feed; no máximo uma gravação por minuto
+        agora = time.monotonic()
+        if not self.snapshot.alterado or (self.snapshot_salvo is not None and agora - self.snapshot_salvo < 60.0):
+            return
         try:
-            qr_texto, carro, job_key, maco = self.buscar_qrcode(qr_id)
-            self.info_label.setText(f"Carro: {carro} | Job Key: {job_key} | Maço: {maco}")
-            self.info_label.show()
-            self.processar_qrcode_texto(qr_texto)
+            self.snapshot.salvar(self.snapshot_path)
+            self.snapshot_salvo = agora
+        except OSError as e:
+            print(f"Falha ao salvar snapshot: {e}")
+    
+    def buscar_snapshot(self, qr_id):
+        linha = self.snapshot.buscar(int(qr_id))
+        if linha is None:
+            return None
+        carro, job_key, maco, aplicacoes, erros = linha
+        return carro or 'N/A', job_key or 'N/A', maco or 'N/A', aplicacoes, erros
+    
+    def versao_cache(self):
+        # Com servidor a chave é fixa: a troca do banco dele limpa o cache (ao_trocar_geracao)
+        if self.cliente is not None:
+            return 'servidor'
+        return self.feed.versao if self.feed is not None else self.db.versao_arquivo()
+    
+    def receber_linhas_novas(self, linhas, cauda):
+        # Thread do feed. Só o último lote aquece o cache (e o parser); lotes de uma carga
+        # grande apenas corrigem entradas existentes, como um NAO_ENCONTRADO do ID que chegou
+        if self.snapshot is not None:
+            self.snapshot.adicionar(linhas)
+            if cauda:
+                self.salvar_snapshot()
+        novas = [(row['ID'], LinhaQR(row['Texto'], row['Carro'], row['Job_Key'], row['Maco'])) for row in linhas]
+        self.qr_cache.receber(self.versao_cache(), novas, aquecer=cauda)
+        if cauda:
+            for _, linha in novas:
+                parse_qrcode(linha.texto or '')
+        self.prefetch_carregado.emit([qr_id for qr_id, _ in novas])
+    
+    def feed_reiniciado(self):
+        # Thread do feed; a primeira geração é só o início do feed
+        self.qr_cache.limpar()
+        if self.feed.geracao > 1:
+            if self.snapshot is not None:
+                self.snapshot.limpar()
+                self.feed.reler_desde(0)
+            self.banco_substituido.emit()
+    
+    def mostrar_fila(self):
+        # A fila usa a mesma lista da busca, quando não há busca nem maço aberto
+        if self.fila is None or self.modo_busca or self.qr_atual is not None or self.lote is not None:
+            return
+        self.modo_fila = True
+        self.esconder_aplicacoes()
+        self.busca_lista.show()
+        self.atualizar_fila()
+    
+    def esconder_fila(self):
+        if not self.modo_fila:
+            return
+        self.modo_fila = False
+        self.busca_lista.hide()
+        self.busca_lista.clear()
+        self.mostrar_aplicacoes()
+    
+    def atualizar_fila(self):
+        if not self.modo_fila:
+            return
+        atual = self.busca_lista.currentItem()
+        selecionado = atual.data(Qt.UserRole) if atual is not None else None
+        linha = 0
+        self.busca_lista.clear()
+        for i, item in enumerate(self.fila.itens()):
+            terminais = ', '.join(f"{qtd}x {terminal}" for terminal, qtd in sorted(item.terminais.items()))
+            lista_item = QtWidgets.QListWidgetItem(f"ID {item.qr_id}  |  Carro: {item.carro or 'N/A'}  |  Maço: {item.maco or 'N/A'}  |  {terminais}")
+            lista_item.setData(Qt.UserRole, item.qr_id)
+            self.busca_lista.addItem(lista_item)
+            if item.qr_id == selecionado:
+                linha = i
+        if self.busca_lista.count():
+            self.busca_lista.setCurrentRow(linha)
+        if not self.fila.carregada and self.fila.erro is not None:
+            self.mostrar_info(f"Fila {self.prensa_fixa}: banco indisponível ({self.fila.erro}), tentando de novo", 'erro')
+        elif not self.fila.carregada:
+            self.mostrar_info(f"Fila {self.prensa_fixa}: carregando...", 'carregando')
+        else:
+            self.mostrar_info(f"Fila {self.prensa_fixa}: {self.fila.pendentes} maços pendentes")
+    
+    def iniciar_busca(self, texto):
+        self.carregar_subsistemas()
+        texto = texto.strip().lstrip('/')
+        if not texto:
+            return
+        self.pedido_atual += 1
+        self.busca_pedido += 1
+        self.busca_texto = texto
+        self.busca_fim = False
+        self.busca_carregando = False
+        self.esconder_fila()
+        self.busca_lista.clear()
+        self.modo_busca = True
+        self.esconder_aplicacoes()
+        self.busca_lista.show()
+        self.mostrar_info(f"Buscando '{texto}'...", 'carregando')
+        self.carregar_pagina_busca()
+        self.setFocus()
+    
+    def carregar_pagina_busca(self):
+        if not self.modo_busca or self.busca_fim or self.busca_carregando:
+            return
+        self.busca_carregando = True
+        ultimo = self.busca_lista.item(self.busca_lista.count() - 1)
+        antes_de = ultimo.data(Qt.UserRole) if ultimo is not None else None
+        self.consulta_pool.start(BuscaQR(self.busca_pedido, self.busca_texto, antes_de, 50, self.db.pesquisar,
+                                         self.consulta_sinais, lambda: self.busca_pedido))
+    
+    def busca_pagina(self, pedido, linhas, fim):
+        if pedido != self.busca_pedido:
+            return
+        self.busca_carregando = False
+        self.busca_fim = fim
+        for qr_id, job_key, carro, maco in linhas:
+            item = QtWidgets.QListWidgetItem(f"ID {qr_id}  |  Carro: {carro or 'N/A'}  |  Job Key: {job_key or 'N/A'}  |  Maço: {maco or 'N/A'}")
+            item.setData(Qt.UserRole, qr_id)
+            self.busca_lista.addItem(item)
+        total = self.busca_lista.count()
+        if not total:
+            self.mostrar_info(f"Nenhum resultado para '{self.busca_texto}'", 'erro')
+            return
+        if self.busca_lista.currentRow() < 0:
+            self.busca_lista.setCurrentRow(0)
+        self.mostrar_info(f"{total}{'' if fim else '+'} resultados para '{self.busca_texto}'")
+    
+    def busca_falhou(self, pedido, mensagem):
+        if pedido != self.busca_pedido:
+            return
+        self.busca_carregando = False
+        self.busca_fim = True
+        self.mostrar_info(f"Erro na busca: {mensagem}", 'erro')
+    
+    def busca_rolou(self, valor):
+        barra = self.busca_lista.verticalScrollBar()
+        if valor >= barra.maximum() - 5:
+            self.carregar_pagina_busca()
+    
+    def mover_busca(self, passo):
+        total = self.busca_lista.count()
+        if not total:
+            return
+        linha = min(max(self.busca_lista.currentRow() + passo, 0), total - 1)
+        self.busca_lista.setCurrentRow(linha)
+        # Próxima página antes de o operador chegar ao fim
+        if linha >= total - 10:
+            self.carregar_pagina_busca()
+    
+    def abrir_resultado_busca(self):
+        item = self.busca_lista.currentItem()
+        if item is None:
+            return
+        self.input_qr.setText(str(item.data(Qt.UserRole)))
+        self.processar_qr()
+    
+    def sair_busca(self):
+        if not self.modo_busca:
+            return
+        self.busca_pedido += 1
+        self.modo_busca = False
+        self.busca_lista.hide()
+        self.busca_lista.clear()
+        self.mostrar_aplicacoes()
+        self.mostrar_fila()
+    
+    def consulta_concluida(self, pedido, resultado):
+        if pedido != self.pedido_atual:
+            return
+        qr_id = int(resultado.qr_id)
+        if self.pedido_em_lote:
+            self.adicionar_ao_lote(resultado)
+        else:
+            self.lote = None
+            self.mostrar_info(f"Carro: {resultado.carro} | Job Key: {resultado.job_key} | Maço: {resultado.maco}")
+            self.qr_atual = qr_id
+            self.aplicar_roteamento(resultado.erros, resultado.aplicacoes_por_prensa, resultado.terminais_sem_prensa)
+            self.restaurar_progresso()
+        self.resultado_atual = resultado
+        if self.cliente is not None:
+            self.verificar_config_servidor()
+        if self.consulta_inicio is not None:
+            self.metricas.consulta(qr_id, (time.monotonic() - self.consulta_inicio) * 1000.0)
+            self.consulta_inicio = None
+    
+    def alternar_lote(self, ativo):
+        # Desligar não descarta o lote na tela: o próximo ID lido volta ao modo de um maço
+        self.modo_lote = ativo
+        if self.prensa_frames:
+            self.setFocus()
+        else:
+            self.input_qr.setFocus()
+    
+    def adicionar_ao_lote(self, resultado):
+        if self.lote is None:
+            self.lote = PlanoLote()
+            # O maço que já estava na tela abre o lote
+            anterior = self.resultado_atual
+            if self.qr_atual is not None and anterior is not None and int(anterior.qr_id) == self.qr_atual:
+                self.incluir_no_lote(anterior)
+            self.qr_atual = None
+        novo = self.incluir_no_lote(resultado)
+        self.mostrar_lote()
+        if not novo:
+            self.mostrar_info(f"ID {resultado.qr_id} já está no lote", 'erro')
+    
+    def incluir_no_lote(self, resultado):
+        qr_id = int(resultado.qr_id)
+        if qr_id in self.lote:
+            return False
+        for erro in resultado.erros:
+            print(f"QR {qr_id} inválido: conjunto {erro.conjunto + 1}, '{erro.token}' ({erro.motivo})")
+        aplicacoes_por_prensa = resultado.aplicacoes_por_prensa
+        if self.prensa_fixa is not None:
+            aplicacoes_por_prensa = {p: a for p, a in aplicacoes_por_prensa.items() if p == self.prensa_fixa}
+        completos = ()
+        if self.progresso is not None:
+            try:
+                completos = self.progresso.estado(qr_id)
+            except Exception as e:
+                print(f"Falha ao ler progresso: {e}")
+        self.lote.adicionar(qr_id, resultado.carro, resultado.job_key, resultado.maco,
+                            aplicacoes_por_prensa, resultado.terminais_sem_prensa, completos)
+        return True
+    
+    def mostrar_lote(self):
+        cards = self.lote.cards(self.prensas, self.chave_cabo)
+        self.aplicacoes_por_prensa = self.lote.aplicacoes_por_prensa()
+        self.terminais_sem_prensa = self.lote.sem_prensa
+        if self.terminais_sem_prensa:
+            print(f"Terminais sem prensa: {dict(self.terminais_sem_prensa)}")
+        self.atualizar_display(cards)
+        if not self.prensa_frames:
+            self.atualizar_info_lote()
+            return
+        self.completed_frames = {i for i, card in enumerate(self.prensa_frames) if self.lote.completo(card.prensa_id)}
+        pendentes = [i for i in range(len(self.prensa_frames)) if i not in self.completed_frames]
+        self.current_index = pendentes[0] if pendentes else 0
+        self.atualizar_selecao(range(len(self.prensa_frames)))
+        if self.perfil.ativo:
+            # Comparação com o plano sem agrupar: refaz os cards de todos os maços, só no modo de perfil
+            t_lote, c_lote = trocas(cards)
+            t_sep, c_sep = trocas(self.lote.cards_sem_agrupar())
+            print(f"Lote: {len(self.lote)} maços, trocas de terminal {t_lote} (sem agrupar {t_sep}), de cabo {c_lote} ({c_sep})")
+        self.atualizar_info_lote()
+    
+    def atualizar_info_lote(self):
+        macos = " · ".join(f"{qr_id} ({m.maco}) {'/'.join(map(str, self.lote.progresso(qr_id)))}"
+                           for qr_id, m in self.lote.macos.items())
+        self.mostrar_info(f"Lote ({len(self.lote)} maços): {macos}")
+    
+    def exportar_metricas(self):
+        try:
+            self.metricas.exportar(self.metricas_dir)
+        except OSError as e:
+            print(f"Falha ao exportar métricas: {e}")
+    
+    def macos_do_card(self, indice, evento):
+        # (prensa_id, [(qr_id, Counter(terminal -> qtd))]) dos maços de origem do card que o evento altera
+        prensa_id = self.prensa_frames[indice].prensa_id
+        if self.lote is not None:
+            return prensa_id, self.lote.terminais_por_maco(prensa_id, completo=(evento == DESMARCAR))
+        if self.qr_atual is None:
+            return prensa_id, []
+        return prensa_id, [(self.qr_atual, Counter(terminal for terminal, _ in self.aplicacoes_por_prensa.get(prensa_id, [])))]
+    
+    def metricas_do_card(self, indice, evento, registrar):
+        prensa_id, macos = self.macos_do_card(indice, evento)
+        for qr_id, terminais in macos:
+            registrar(qr_id, prensa_id, terminais)
+    
+    def restaurar_progresso(self):
+        # Reabre o maço como estava: prensas já marcadas voltam completas
+        if self.progresso is None or self.qr_atual is None or not self.prensa_frames:
+            return
+        try:
+            completos = self.progresso.estado(self.qr_atual)
         except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Erro", str(e))
+            print(f"Falha ao ler progresso: {e}")
+            return
+        indices = {i for i, card in enumerate(self.prensa_frames) if card.prensa_id in completos}
+        if not indices:
+            return
+        self.completed_frames = indices
+        pendentes = [i for i in range(len(self.prensa_frames)) if i not in indices]
+        self.current_index = pendentes[0] if pendentes else 0
+        self.atualizar_selecao(range(len(self.prensa_frames)))
+    
+    def registrar_progresso(self, indice, evento):
+        # No lote, cada maço de origem recebe o evento no journal e na fila
+        if indice is None:
+            prensa_id = ''
+            macos = list(self.lote.macos) if self.lote is not None else [self.qr_atual]
+        else:
+            prensa_id, contagens = self.macos_do_card(indice, evento)
+            macos = [qr_id for qr_id, _ in contagens]
+            if self.lote is not None:
+                if evento == DESMARCAR:
+                    self.lote.desmarcar(prensa_id)
+                else:
+                    self.lote.marcar(prensa_id)
+                self.atualizar_info_lote()
+        for qr_id in macos:
+            if qr_id is None:
+                continue
+            if self.fila is not None and (evento == FINALIZAR or prensa_id == self.prensa_fixa):
+                if evento == DESMARCAR:
+                    self.fila.reabrir(qr_id)
+                else:
+                    self.fila.concluir(qr_id)
+            if self.progresso is not None:
+                self.progresso.registrar(qr_id, prensa_id, evento)
+    
+    def consulta_falhou(self, pedido, mensagem):
+        if pedido != self.pedido_atual:
+            return
+        self.mostrar_info(f"Erro: {mensagem}", 'erro')
+    
+    def mostrar_info(self, texto, estado=''):
+        self.info_label.setText(texto)
+        if self.info_label.property('estado') != estado:
+            self.info_label.setProperty('estado', estado)
+            self.info_label.style().unpolish(self.info_label)
+            self.info_label.style().polish(self.info_label)
+        self.info_label.show()
     
     def processar_qr_e_focar(self):
         self.processar_qr()
         self.setFocus()
     
     def limpar_e_focar(self):
+        self.pedido_atual += 1
+        self.qr_atual = None
+        self.lote = None
+        self.resultado_atual = None
+        self.sair_busca()
         self.input_qr.clear()
         self.input_qr.setFocus()
         self.info_label.hide()
-        while self.aplicacoes_layout.count():
-            item = self.aplicacoes_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        self.vazio_label.hide()
+        self.aviso_label.hide()
+        for card in self.card_pool:
+            card.hide()
         self.prensa_frames = []
         self.prensa_widgets = []
+        self.conteudo_cards = []
         self.current_index = 0
+        self.selecao_anterior = 0
         self.completed_frames = set()
+        self.atualizar_mapa()
+        if self.limpeza_pendente:
+            self.limpar_visao()
+        if self.fila is not None:
+            # Estação fixada volta para a fila, navegável direto pelo gamepad
+            self.mostrar_fila()
+            self.setFocus()
+    
+    def amostrar_memoria(self):
+        amostra = self.vigia.amostrar(contar_objetos_qt(self))
+        # Um relatório a cada 10 amostras (10 min), fora os de limite excedido
+        if len(self.vigia.amostras) % 10 == 0:
+            print(f"Memória: {self.vigia.resumo()}")
+        return amostra
+    
+    def ociosa(self):
+        return not self.prensa_frames and self.dialogo_finalizar is None and not self.modo_busca
+    
+    def memoria_excedida(self, amostra, crescimento):
+        if self.limpeza_pendente:
+            return
+        print(f"Memória: +{crescimento / MB:.1f} MB desde a base ({self.vigia.resumo()})")
+        if self.vigia.vazando():
+            print("Memória: as limpezas não devolvem o crescimento (vazamento fora dos caches)")
+        if self.ociosa():
+            self.limpar_visao()
+        else:
+            # Maço na tela: limpa quando o operador terminar (limpar_e_focar)
+            self.limpeza_pendente = True
+    
+    def limpar_visao(self):
+        # Solta o que só cresce com o uso: cards do pool (voltam sob demanda), caches de linhas e de parse
+        self.limpeza_pendente = False
+        if self.prensa_frames:
+            return
+        for card in self.card_pool:
+            card.deleteLater()
+        self.card_pool = []
+        self.mapa_card.prensa_id = None
+        self.qr_cache.limpar()
+        parse_qrcode.cache_clear()
+        QtGui.QPixmapCache.clear()
+        # Os deleteLater só rodam no loop; a coleta e o malloc_trim ficam para depois deles
+        QtCore.QTimer.singleShot(100, self.devolver_memoria)
+        if self.vigia is not None:
+            self.vigia.limpou()
+    
+    def devolver_memoria(self):
+        gc.collect()
+        devolvida = devolver_memoria()
+        if self.vigia is not None:
+            print(f"Tela limpa pelo vigia de memória (malloc_trim: {'sim' if devolvida else 'não'})")
     
     def buscar_qrcode(self, qr_id):
-        if not os.path.exists(self.banco_qrcode_path):
-            caminho_completo = os.path.abspath(self.banco_qrcode_path)
-            raise FileNotFoundError(f"Banco de dados não encontrado em: {caminho_completo}")
-        
-        conn = sqlite3.connect(self.banco_qrcode_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM qrcode WHERE ID = ?', (int(qr_id),))
-        resultado = cursor.fetchone()
-        conn.close()
+        qr_id = int(qr_id)
+        # Linha já lida pelo prefetch ou entregue pelo feed (mesma geração do banco) não volta ao banco
+        versao = self.versao_cache()
+        linha = self.qr_cache.obter(qr_id, versao)
+        if linha is None:
+            resultado = self.buscar_linha(qr_id)
+            if resultado:
+                linha = LinhaQR(resultado['Texto'], resultado['Carro'], resultado['Job_Key'], resultado['Maco'])
+            else:
+                linha = NAO_ENCONTRADO
+            self.qr_cache.guardar(qr_id, versao, linha)
         
-        if not resultado:
+        if linha is NAO_ENCONTRADO:
             raise ValueError(f"ID {qr_id} não encontrado")
         
-        if len(resultado) >= 7:
-            texto = resultado[6]
-            carro = resultado[3] if resultado[3] else 'N/A'
-            job_key = resultado[1] if resultado[1] else 'N/A'
-            maco = resultado[4] if resultado[4] else 'N/A'
-            return texto, carro, job_key, maco
-        raise ValueError("Formato de banco inválido")
+        return linha.texto, linha.carro or 'N/A', linha.job_key or 'N/A', linha.maco or 'N/A'
+    
+    def buscar_linha(self, qr_id):
+        if self.cliente is not None:
+            try:
+                return self.cliente.buscar(qr_id)
+            except ServidorIndisponivel as e:
+                print(f"Servidor indisponível ({e}), consultando o banco local")
+        return self.db.buscar(qr_id)
+    
+    def buscar_varios(self, ids):
+        # Prefetch: o mesmo fallback de buscar_linha, sem avisar a cada vizinho
+        if self.cliente is not None:
+            try:
+                return self.cliente.buscar_varios(ids)
+            except ServidorIndisponivel:
+                pass
+        return self.db.buscar_varios(ids)
+    
+    def fonte_rotas(self):
+        return self.cliente if self.cliente is not None else self.db
+    
+    def verificar_config_servidor(self):
+        # Prensas diferentes das do servidor: o roteamento é feito localmente, mas a estação avisa
+        hash_servidor = self.cliente.config_hash_servidor
+        erro = None
+        if hash_servidor is not None and hash_servidor != self.config_hash:
+            erro = f"difere da config do servidor ({hash_servidor})"
+        if (erro is not None) != ('servidor' in self.config_erros):
+            self.reportar_erro_config('servidor', self.config_paths['prensas'], erro)
     
     def processar_qrcode_texto(self, qr_data):
-        terminais_list = []
-        aplicacoes_detalhadas = []
-        
-        conjuntos = qr_data.split('#')
-        
-        for conjunto in conjuntos:
-            componentes = conjunto.split('-')
-            cabo_atual = None
-            terminais_conjunto = []
-            
-            for comp in componentes:
-                if comp.startswith('C') and ':' in comp:
-                    cabo_atual = comp.split(':')[1]
-                elif ':' in comp:
-                    partes = comp.split(':')
-                    if partes[0].startswith('T') or partes[0].startswith('S'):
-                        terminal = partes[1]
-                        if terminal:
-                            terminais_list.append(terminal)
-                            terminais_conjunto.append(terminal)
-            
-            for terminal in terminais_conjunto:
-                aplicacoes_detalhadas.append((terminal, cabo_atual))
-        
+        self.carregar_subsistemas()
+        payload = parse_qrcode(qr_data)
+        self.qr_atual = None
+        self.lote = None
         # Organizar por prensa
-        self.aplicacoes_por_prensa = {}
-        self.prensas_info = {}
-        
-        for p in self.prensas:
-            terminais = p.get('terminais', [])
-            if not terminais:
-                terminal_antigo = p.get('terminal', '')
-                if terminal_antigo:
-                    terminais = [terminal_antigo]
-            
-            prensa_id = p.get('id', '')
-            prensa_nome = p.get('nome', '')
-            self.prensas_info[prensa_id] = prensa_nome
-            self.aplicacoes_por_prensa[prensa_id] = []
-            
-            for terminal, cabo in aplicacoes_detalhadas:
-                if terminal in terminais:
-                    self.aplicacoes_por_prensa[prensa_id].append((terminal, cabo))
-        
-        self.atualizar_display()
+        aplicacoes_por_prensa, terminais_sem_prensa = rotear(payload.aplicacoes, self.rotas)
+        self.aplicar_roteamento(payload.erros, aplicacoes_por_prensa, terminais_sem_prensa)
     
-    def atualizar_display(self):
-        while self.aplicacoes_layout.count():
-            item = self.aplicacoes_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+    def aplicar_roteamento(self, erros, aplicacoes_por_prensa, terminais_sem_prensa):
+        for erro in erros:
+            print(f"QR inválido: conjunto {erro.conjunto + 1}, '{erro.token}' ({erro.motivo})")
         
-        self.prensa_frames = []
-        self.prensa_widgets = []
-        self.current_index = 0
-        self.completed_frames = set()
+        if self.prensa_fixa is not None:
+            # Estação fixada: só o card da própria prensa
+            aplicacoes_por_prensa = {p: a for p, a in aplicacoes_por_prensa.items() if p == self.prensa_fixa}
         
-        if not self.aplicacoes_por_prensa:
-            label = QtWidgets.QLabel("Nenhuma aplicação encontrada")
-            label.setStyleSheet("font-size: 16px; padding: 20px;")
-            label.setAlignment(Qt.AlignCenter)
-            self.aplicacoes_layout.addWidget(label)
-            return
+        self.aplicacoes_por_prensa = aplicacoes_por_prensa
+        self.terminais_sem_prensa = terminais_sem_prensa
+        if self.terminais_sem_prensa:
+            print(f"Terminais sem prensa: {dict(self.terminais_sem_prensa)}")
         
+        self.atualizar_display()
+    
+    def card_do_pool(self, indice):
+        if indice < len(self.card_pool):
+            return self.card_pool[indice]
+        card = PrensaCard()
+        # Antes do aviso de terminais sem prensa e do stretch final
+        self.aplicacoes_layout.insertWidget(self.aplicacoes_layout.indexOf(self.aviso_label), card)
+        self.card_pool.append(card)
+        return card
+    
+    def chave_cabo(self, cabo):
+        # Sem bitola por último
+        info = info_do_cabo(self.cabos_info, cabo)
+        return (info.bitola_mm is None, info.bitola_mm or 0.0)
+    
+    def cards_do_maco(self):
+        # Um maço: prensas por ID, terminais na ordem do QR, cabos do terminal por bitola
+        cards = []
         for prensa_id, aplicacoes in sorted(self.aplicacoes_por_prensa.items()):
             if not aplicacoes:
                 continue
-            
-            # Frame da prensa
-            prensa_frame = QtWidgets.QFrame()
-            prensa_frame.setObjectName("prensaFrame")
-            prensa_frame.setStyleSheet("background-color: rgb(50, 50, 60); border-radius: 3px; padding: 3px;")
-            prensa_layout = QtWidgets.QVBoxLayout(prensa_frame)
-            prensa_layout.setSpacing(2)
-            prensa_layout.setContentsMargins(3, 3, 3, 3)
-            self.prensa_frames.append(prensa_frame)
-            
-            # Título
-            prensa_nome = self.prensas_info.get(prensa_id, '')
-            titulo = f"▶ {prensa_id} - {prensa_nome}" if prensa_nome else f"▶ {prensa_id}"
-            titulo_label = QtWidgets.QLabel(titulo)
-            titulo_label.setStyleSheet("color: rgb(69, 207, 81); font-weight: bold; font-size: 20px; background: transparent; border: none;")
-            prensa_layout.addWidget(titulo_label)
-            
-            # Container de detalhes
-            detalhes_widget = QtWidgets.QWidget()
-            detalhes_layout = QtWidgets.QVBoxLayout(detalhes_widget)
-            detalhes_layout.setSpacing(3)
-            detalhes_layout.setContentsMargins(0, 0, 0, 0)
-            self.prensa_widgets.append(detalhes_widget)
-            
-            # Agrupar por terminal
             terminais_dict = {}
             for (terminal, cabo), qtd in Counter(aplicacoes).items():
                 if terminal not in terminais_dict:
                     terminais_dict[terminal] = []
                 terminais_dict[terminal].append((cabo, qtd))
-            
-            terminal_index = 0
-            total_terminais = len(terminais_dict)
-            
-            for terminal, cabos_list in terminais_dict.items():
+            grupos = [(terminal, sorted(cabos_list, key=lambda x: self.chave_cabo(x[0])))
+                      for terminal, cabos_list in terminais_dict.items()]
+            cards.append(CardLote(prensa_id, grupos, ()))
+        return cards
+    
+    def atualizar_display(self, cards=None):
+        # cards: plano do lote já ordenado; sem ele, o maço de aplicacoes_por_prensa
+        inicio = time.perf_counter()
+        self.prensa_frames = []
+        self.prensa_widgets = []
+        self.current_index = 0
+        self.selecao_anterior = 0
+        self.completed_frames = set()
+        self.conteudo_cards = []
+        
+        if cards is None:
+            cards = self.cards_do_maco()
+        self.vazio_label.setVisible(not cards)
+        
+        for prensa_id, grupos, macos in cards:
+            terminais = []
+            for terminal, cabos_list in grupos:
                 total_terminal = sum(qtd for _, qtd in cabos_list)
-                
-                # Layout horizontal: terminal à esquerda, cabos à direita
-                grupo_widget = QtWidgets.QWidget()
-                grupo_layout = QtWidgets.QHBoxLayout(grupo_widget)
-                grupo_layout.setSpacing(10)
-                grupo_layout.setContentsMargins(0, 0, 0, 0)
-                
-                # Terminal centralizado verticalmente
-                terminal_label = QtWidgets.QLabel(f"{total_terminal}x {terminal}")
-                terminal_label.setStyleSheet("color: white; font-weight: bold; font-size: 18px; padding: 3px;")
-                terminal_label.setAlignment(Qt.AlignCenter)
-                terminal_label.setFixedWidth(120)
-                grupo_layout.addWidget(terminal_label)
-                
-                # Container de cabos
-                cabos_widget = QtWidgets.QWidget()
-                cabos_layout = QtWidgets.QVBoxLayout(cabos_widget)
-                cabos_layout.setSpacing(2)
-                cabos_layout.setContentsMargins(0, 0, 0, 0)
-                
+                textos_cabos = []
                 for cabo, qtd in cabos_list:
-                    cabo_desc = self.cabos_dict.get(cabo, cabo) if cabo else "Cabo desconhecido"
-                    
-                    cor_html = "#5599FF"
-                    if cabo_desc:
-                        cabo_lower = cabo_desc.lower()
-                        if "vermelho" in cabo_lower:
-                            cor_html = "#FF3333"
-                        elif "amarelo" in cabo_lower:
-                            cor_html = "#FFDD33"
-                        elif "verde" in cabo_lower:
-                            cor_html = "#33FF66"
-                        elif "azul" in cabo_lower:
-                            cor_html = "#3399FF"
-                        elif "laranja" in cabo_lower:
-                            cor_html = "#FF9933"
-                        elif "roxo" in cabo_lower or "lilas" in cabo_lower or "violeta" in cabo_lower:
-                            cor_html = "#CC66FF"
-                        elif "marrom" in cabo_lower:
-                            cor_html = "#996633"
-                        elif "preto" in cabo_lower:
-                            cor_html = "#333333"
-                        elif "branco" in cabo_lower:
-                            cor_html = "#EEEEEE"
-                        elif "cinza" in cabo_lower:
-                            cor_html = "#999999" 
-                        elif "rosa" in cabo_lower:
-                            cor_html = "#FF99CC"
-                    
-                    cabo_label = QtWidgets.QLabel(f'<span style="color: {cor_html}; font-weight: bold; font-size: 18px;">●</span> {qtd}x {cabo_desc}')
-                    cabo_label.setStyleSheet("color: rgb(200, 200, 200); font-size: 16px; padding: 2px;")
-                    cabos_layout.addWidget(cabo_label)
-                
-                grupo_layout.addWidget(cabos_widget)
-                grupo_layout.addStretch()
-                detalhes_layout.addWidget(grupo_widget)
-                
-                # Separador entre terminais (exceto no último)
-                terminal_index += 1
-                if total_terminais > 1 and terminal_index < total_terminais:
-                    separador = QtWidgets.QFrame()
-                    separador.setFrameShape(QtWidgets.QFrame.HLine)
-                    separador.setStyleSheet("background-color: rgb(80, 80, 90); max-height: 1px;")
-                    detalhes_layout.addWidget(separador)
+                    info = info_do_cabo(self.cabos_info, cabo)
+                    textos_cabos.append(f'<span style="color: {info.cor}; font-weight: bold; font-size: 18px;">●</span> {qtd}x {info.descricao}')
+                terminais.append((f"{total_terminal}x {terminal}", textos_cabos))
             
-            prensa_layout.addWidget(detalhes_widget)
-            self.aplicacoes_layout.addWidget(prensa_frame)
+            prensa_nome = self.prensas_info.get(prensa_id, '')
+            titulo = f"▶ {prensa_id} - {prensa_nome}" if prensa_nome else f"▶ {prensa_id}"
+            if len(macos) > 1:
+                titulo += f" ({len(macos)} maços)"
+            
+            card = self.card_do_pool(len(self.prensa_frames))
+            card.preencher(prensa_id, titulo, terminais)
+            self.conteudo_cards.append((titulo, terminais, sum(qtd for _, cabos in grupos for _, qtd in cabos)))
+            card.detalhes_widget.show()
+            card.show()
+            self.prensa_frames.append(card)
+            self.prensa_widgets.append(card.detalhes_widget)
         
-        self.aplicacoes_layout.addStretch()
+        for card in self.card_pool[len(self.prensa_frames):]:
+            card.hide()
         
+        if self.terminais_sem_prensa:
+            sem_prensa = ", ".join(f"{qtd}x {terminal}" for terminal, qtd in sorted(self.terminais_sem_prensa.items()))
+            self.aviso_label.setText(f"Sem prensa: {sem_prensa}")
+            self.aviso_label.show()
+        else:
+            self.aviso_label.hide()
+        
+        self.atualizar_mapa()
         if self.prensa_frames:
-            self.atualizar_selecao()
+            # Cards reaproveitados podem ter estado da leitura anterior
+            self.atualizar_selecao(range(len(self.prensa_frames)))
+        
+        self.registrar_tempo_display((time.perf_counter() - inicio) * 1000.0)
+    
+    def mostrar_aplicacoes(self):
+        # Lista de cards ou planta, conforme o modo
+        self.scroll_area.setVisible(not self.modo_mapa)
+        self.mapa_widget.setVisible(self.modo_mapa)
+    
+    def esconder_aplicacoes(self):
+        self.scroll_area.hide()
+        self.mapa_widget.hide()
+    
+    def alternar_mapa(self, ativo):
+        self.modo_mapa = ativo
+        if not (self.modo_busca or self.modo_fila):
+            self.mostrar_aplicacoes()
+        self.atualizar_mapa()
+        if ativo and self.prensa_frames:
+            self.atualizar_selecao(range(len(self.prensa_frames)))
+    
+    def atualizar_mapa(self):
+        # Plano atual na planta; estados de seleção/conclusão vêm depois, por atualizar_selecao
+        if not self.modo_mapa:
+            return
+        if self.mapa_desatualizado:
+            try:
+                layout = carregar_layout(self.config_paths['prensas'])
+            except (OSError, ValueError) as e:
+                print(f"Falha ao ler layout das prensas: {e}")
+                layout = None
+            self.mapa.carregar(self.prensas, layout)
+            self.mapa_desatualizado = False
+        self.mapa.mostrar([(card.prensa_id, total) for card, (_, _, total) in zip(self.prensa_frames, self.conteudo_cards)])
+        self.mapa_card.setVisible(bool(self.prensa_frames))
+        self.mapa_card.prensa_id = None
+    
+    def atualizar_selecao_mapa(self, indices):
+        self.mapa.definir_estados([(self.prensa_frames[i].prensa_id, i == self.current_index, i in self.completed_frames)
+                                   for i in indices if 0 <= i < len(self.prensa_frames)])
+        # Card de detalhe: só repreenche quando a prensa selecionada muda
+        frame = self.prensa_frames[self.current_index]
+        if self.mapa_card.prensa_id != frame.prensa_id:
+            titulo, terminais, _ = self.conteudo_cards[self.current_index]
+            self.mapa_card.preencher(frame.prensa_id, titulo, terminais)
+        self.mapa_card.definir_estado(True, self.current_index in self.completed_frames)
+    
+    def selecionar_prensa(self, prensa_id):
+        # Toque numa prensa da planta
+        for i, card in enumerate(self.prensa_frames):
+            if card.prensa_id == prensa_id:
+                self.current_index = i
+                self.atualizar_selecao()
+                self.setFocus()
+                return
+    
+    def registrar_tempo_display(self, tempo_ms):
+        s = self.display_stats
+        s['atualizacoes'] += 1
+        s['tempo_ultimo_ms'] = tempo_ms
+        s['tempo_total_ms'] += tempo_ms
+        if tempo_ms > s['tempo_max_ms']:
+            s['tempo_max_ms'] = tempo_ms
+        if self.perfil.ativo:
+            print(f"Display: {len(self.prensa_frames)} prensas em {tempo_ms:.1f} ms")
+    
+    def acao_da_tecla(self, key):
+        for acao in ('focus_input', 'enter', 'down', 'up', 'right', 'left'):
+            if key in self.gamepad_keys.get(acao, []):
+                return acao
+        return None
     
     def keyPressEvent(self, event):
         if event.isAutoRepeat():
             return
+        self.carregar_subsistemas()
         
         print(f"Tecla: {event.key()}")
-        key = event.key()
-        
+        acao = self.acao_da_tecla(event.key())
+        if acao is None:
+            return
+        # Segurar up/down no input: o timer repete com passo crescente até soltar a tecla
+        if acao in ('up', 'down') and self.input_qr.hasFocus():
+            self.key_press_time = QtCore.QTime.currentTime()
+            self.key_press_key = acao
+            self.increment_timer.start(100)
+        self.executar_acao(acao)
+    
+    def executar_acao_gamepad(self, acao, passo, repeticao):
+        # Backend evdev: o diálogo de finalizar é modal e não passa pelo keyPressEvent
+        if self.dialogo_finalizar is not None:
+            if acao == 'enter' and not repeticao:
+                self.dialogo_finalizar.result_value = True
+                self.dialogo_finalizar.accept()
+            elif acao == 'focus_input' and not repeticao:
+                self.dialogo_finalizar.result_value = False
+                self.dialogo_finalizar.reject()
+            return
+        self.carregar_subsistemas()
+        self.executar_acao(acao, passo, repeticao)
+    
+    def executar_acao(self, acao, passo=1, repeticao=False):
         # Focus Input
-        if key in self.gamepad_keys.get('focus_input', []):
+        if acao == 'focus_input':
             self.input_qr.setFocus()
             return
         
+        # Se input está focado, incrementa/decrementa dígitos (repetições com passo acelerado)
+        if self.input_qr.hasFocus() and acao in ('up', 'down'):
+            self.increment_value(acao, passo)
+            return
+        
+        # Repetições só valem para o input; no resto, um toque é um passo
+        if repeticao:
+            return
+        
         # Enter
-        if key in self.gamepad_keys.get('enter', []):
+        if acao == 'enter':
             if self.input_qr.hasFocus():
                 self.processar_qr_e_focar()
+            elif self.modo_busca or self.modo_fila:
+                self.abrir_resultado_busca()
             return
         
-        # Se input está focado, incrementa/decrementa dígitos
-        if self.input_qr.hasFocus():
-            if key in self.gamepad_keys.get('up', []) or key in self.gamepad_keys.get('down', []):
-                self.key_press_time = QtCore.QTime.currentTime()
-                self.key_press_key = key
-                self.increment_value(key, 1)
-                self.increment_timer.start(100)
-                return
+        if self.modo_busca or self.modo_fila:
+            if acao == 'down':
+                self.mover_busca(1)
+            elif acao == 'up':
+                self.mover_busca(-1)
+            elif acao == 'left':
+                self.sair_busca()
+            return
         
         if not self.prensa_frames:
             return
         
         # Down
-        if key in self.gamepad_keys.get('down', []):
+        if acao == 'down':
             if self.current_index < len(self.prensa_frames) - 1:
                 self.current_index += 1
                 self.atualizar_selecao()
         # Up
-        elif key in self.gamepad_keys.get('up', []):
+        elif acao == 'up':
             if self.current_index > 0:
                 self.current_index -= 1
                 self.atualizar_selecao()
         # Right
-        elif key in self.gamepad_keys.get('right', []):
+        elif acao == 'right':
             self.marcar_completo()
         # Left
-        elif key in self.gamepad_keys.get('left', []):
+        elif acao == 'left':
             self.desmarcar_completo()
     
     def keyReleaseEvent(self, event):
@@ -413,55 +1416,103 @@ class QRCodeViewer(QtWidgets.QWidget):
         
         self.increment_value(self.key_press_key, step)
     
-    def increment_value(self, key, step):
+    def increment_value(self, acao, step):
         texto = self.input_qr.text()
-        if key in self.gamepad_keys.get('up', []):
+        if acao == 'up':
             if texto and texto.isdigit():
                 novo_valor = str(int(texto) + step)
                 self.input_qr.setText(novo_valor)
             elif not texto:
                 self.input_qr.setText(str(step))
-        elif key in self.gamepad_keys.get('down', []):
+        elif acao == 'down':
             if texto and texto.isdigit():
                 novo_valor = max(0, int(texto) - step)
                 self.input_qr.setText(str(novo_valor))
+            step = -step
+        else:
+            return
+        
+        texto = self.input_qr.text()
+        if texto.isdigit() and self.prefetcher is not None:
+            self.prefetcher.sugerir(int(texto), step)
+            self.mostrar_previa()
     
-    def atualizar_selecao(self):
-        for i, frame in enumerate(self.prensa_frames):
-            if i == self.current_index:
-                if i in self.completed_frames:
-                    frame.setStyleSheet("QFrame#prensaFrame { background-color: rgb(40, 100, 40); border: 3px solid rgb(69, 207, 81); border-radius: 3px; padding: 3px; } QLabel { background: transparent; border: none; } QWidget { background: transparent; border: none; }")
-                else:
-                    frame.setStyleSheet("QFrame#prensaFrame { background-color: rgb(50, 50, 60); border: 3px solid rgb(255, 200, 0); border-radius: 3px; padding: 3px; } QLabel { background: transparent; border: none; } QWidget { background: transparent; border: none; }")
-            else:
-                if i in self.completed_frames:
-                    frame.setStyleSheet("QFrame#prensaFrame { background-color: rgb(40, 100, 40); border: none; border-radius: 3px; padding: 3px; } QLabel { background: transparent; border: none; } QWidget { background: transparent; border: none; }")
-                else:
-                    frame.setStyleSheet("QFrame#prensaFrame { background-color: rgb(50, 50, 60); border: none; border-radius: 3px; padding: 3px; } QLabel { background: transparent; border: none; } QWidget { background: transparent; border: none; }")
-            
-            if i in self.completed_frames:
-                self.prensa_widgets[i].hide()
-            else:
-                self.prensa_widgets[i].show()
+    def mostrar_previa(self):
+        # Carro / Job Key / Maço do ID no input, se o prefetch já trouxe a linha
+        texto = self.input_qr.text()
+        if not texto.isdigit():
+            return
+        linha = self.qr_cache.obter(int(texto), self.versao_cache())
+        if linha is None:
+            return
+        if linha is NAO_ENCONTRADO:
+            self.mostrar_info(f"Prévia: ID {texto} não encontrado")
+        else:
+            self.mostrar_info(f"Prévia: Carro: {linha.carro or 'N/A'} | Job Key: {linha.job_key or 'N/A'} | Maço: {linha.maco or 'N/A'}")
+    
+    def atualizar_previa(self, ids):
+        texto = self.input_qr.text()
+        if self.input_qr.hasFocus() and texto.isdigit() and int(texto) in ids:
+            self.mostrar_previa()
+    
+    def atualizar_selecao(self, alterados=()):
+        inicio = time.perf_counter()
+        # Só os cards cujo estado pode ter mudado: seleção anterior, atual e os alterados
+        indices = {self.selecao_anterior, self.current_index}
+        indices.update(alterados)
+        repolidos = 0
+        for i in indices:
+            if 0 <= i < len(self.prensa_frames):
+                if self.prensa_frames[i].definir_estado(i == self.current_index, i in self.completed_frames):
+                    repolidos += 1
+        self.selecao_anterior = self.current_index
+        
+        s = self.selecao_stats
+        s['atualizacoes'] += 1
+        s['repolidos_ultimo'] = repolidos
+        s['repolidos_total'] += repolidos
         
         frame = self.prensa_frames[self.current_index]
         self.scroll_area.ensureWidgetVisible(frame)
+        if self.modo_mapa:
+            self.atualizar_selecao_mapa(indices)
+        
+        if self.lote is not None:
+            for qr_id in self.lote.macos_da_prensa(frame.prensa_id):
+                self.metricas.selecionar(qr_id, frame.prensa_id)
+        elif self.qr_atual is not None:
+            self.metricas.selecionar(self.qr_atual, frame.prensa_id)
+        self.metricas.navegacao((time.perf_counter() - inicio) * 1000.0)
     
     def marcar_completo(self):
-        self.completed_frames.add(self.current_index)
-        self.prensa_widgets[self.current_index].hide()
+        marcado = self.current_index
+        if marcado not in self.completed_frames:
+            self.completed_frames.add(marcado)
+            self.metricas_do_card(marcado, MARCAR, self.metricas.completar)
+            self.registrar_progresso(marcado, MARCAR)
+        self.prensa_widgets[marcado].hide()
         
         # Verificar se todos foram completados
         if len(self.completed_frames) == len(self.prensa_frames):
-            self.atualizar_selecao()
+            self.atualizar_selecao((marcado,))
+            dialogo_inicio = time.monotonic()
             if self.show_finalizar_dialog():
+                self.registrar_progresso(None, FINALIZAR)
+                tempo_ms = (time.monotonic() - dialogo_inicio) * 1000.0
+                for qr_id in (self.lote.macos if self.lote is not None else [self.qr_atual]):
+                    self.metricas.finalizar(qr_id, tempo_ms)
                 self.limpar_e_focar()
         elif self.current_index < len(self.prensa_frames) - 1:
             self.current_index += 1
-            self.atualizar_selecao()
-            QtCore.QTimer.singleShot(50, lambda: self.scroll_area.ensureWidgetVisible(self.prensa_frames[self.current_index], 0, 0))
+            self.atualizar_selecao((marcado,))
+            QtCore.QTimer.singleShot(50, self.rolar_para_atual)
         else:
-            self.atualizar_selecao()
+            self.atualizar_selecao((marcado,))
+    
+    def rolar_para_atual(self):
+        # Adiado: a tela pode ter sido limpa (finalizar, nova leitura) antes do timer
+        if 0 <= self.current_index < len(self.prensa_frames):
+            self.scroll_area.ensureWidgetVisible(self.prensa_frames[self.current_index], 0, 0)
     
     def show_finalizar_dialog(self):
         dialog = QtWidgets.QDialog(self)
@@ -527,7 +1578,14 @@ class QRCodeViewer(QtWidgets.QWidget):
         event_filter = DialogEventFilter(self)
         dialog.installEventFilter(event_filter)
         
-        result = dialog.exec_()
+        self.dialogo_finalizar = dialog
+        try:
+            result = dialog.exec_()
+        finally:
+            self.dialogo_finalizar = None
+            # Filho da janela: sem isso cada finalização deixaria um diálogo vivo até o fim do turno
+            dialog.removeEventFilter(event_filter)
+            dialog.deleteLater()
         if dialog.result_value is not None:
             return dialog.result_value
         return result == QtWidgets.QDialog.Accepted
@@ -535,13 +1593,43 @@ class QRCodeViewer(QtWidgets.QWidget):
     def desmarcar_completo(self):
         if self.current_index in self.completed_frames:
             self.completed_frames.remove(self.current_index)
+            self.metricas_do_card(self.current_index, DESMARCAR, self.metricas.desmarcar)
+            self.registrar_progresso(self.current_index, DESMARCAR)
             self.prensa_widgets[self.current_index].show()
-        self.atualizar_selecao()
+        self.atualizar_selecao((self.current_index,))
 
 
 if __name__ == '__main__':
-    import os
-    app = QtWidgets.QApplication(sys.argv)
-    window = QRCodeViewer()
+    parser = argparse.ArgumentParser(description="Visualizador de QR Code por prensa")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="imprime o tempo de cada fase da inicialização, de cada atualização da tela e as trocas de cada plano do lote")
+    parser.add_argument('--prensa', help="fixa a estação numa prensa e mostra a fila de maços pendentes para ela")
+    parser.add_argument('--ordem-fila', choices=ORDENS, default='id',
+                        help="id: mais antigos primeiro; setup: agrupa maços com os mesmos terminais")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="mantém a tabela em memória (banco_qrcode.snap): consultas sem acesso ao banco")
+    parser.add_argument('--servidor', metavar='URL',
+                        help="consulta um servidor_qrcode.py (http://host:8765 ou unix:/caminho) com o banco local de reserva")
+    parser.add_argument('--lote', action='store_true',
+                        help="começa no modo lote: cada ID lido soma ao plano consolidado (fora dele, prefixe com '+')")
+    parser.add_argument('--mapa', action='store_true',
+                        help="começa com a planta da fábrica (layout do prensas_config.json) no lugar da lista de cards")
+    parser.add_argument('--vigia-memoria', type=float, metavar='MB',
+                        help="amostra o RSS a cada minuto e limpa a tela (ociosa) se crescer mais que MB desde a base")
+    parser.add_argument('--gamepad-evdev', nargs='?', const='', metavar='DISPOSITIVO',
+                        help="lê o gamepad direto do /dev/input (ou de uma gravação); sem valor, o dispositivo do gamepad_keys.json")
+    parser.add_argument('--metricas-dir', metavar='DIR',
+                        help="onde gravar metricas_prensas.prom/.json (padrão: tmpfs, /run/qrcode_viewer ou /dev/shm)")
+    parser.add_argument('--metricas-intervalo', type=float, default=15.0, metavar='S',
+                        help="segundos entre exportações das métricas (0 desliga)")
+    args, argv_qt = parser.parse_known_args()
+    perfil = PerfilInicializacao(INICIO_PROCESSO, ativo=args.profile_startup)
+    perfil.marcar('imports')
+    app = QtWidgets.QApplication(sys.argv[:1] + argv_qt)
+    perfil.marcar('QApplication')
+    window = QRCodeViewer(perfil, args.prensa, args.ordem_fila, args.snapshot, args.servidor, args.gamepad_evdev,
+                          args.lote, args.mapa, args.vigia_memoria, args.metricas_dir, args.metricas_intervalo)
+    app.aboutToQuit.connect(window.encerrar)
     window.show()
+    perfil.marcar('show')
     sys.exit(app.exec_())
@@ -0,0 +1,174 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+from qrcode_parser import ErroToken, parse_qrcode
+from roteamento import carregar_rotas, rotear
+
+# Roteamento pré-calculado por linha: tabela qrcode_rotas no próprio banco_qrcode.db,
+# chaveada por (ID, hash da config de prensas). Com ela a consulta do viewer é uma
+# leitura indexada, sem parse. O cálculo é offline e incremental:
+#   - só linhas sem entrada para o hash atual são calculadas;
+#   - quando a config muda, linhas que não usam nenhum terminal com rota alterada
+#     são copiadas do hash anterior em vez de recalculadas. Os terminais da linha saem
+#     da própria entrada anterior (prensas + sem_prensa = todos os terminais parseados,
+#     T e S); a coluna Terminais do qrcode só tem os T e não serve para isso.
+#
+# Leitura e gravação na mesma conexão: as linhas são lidas em páginas por ID
+# (fetchall), nunca com um cursor aberto durante os INSERTs.
+#
+#   python3 rotas_cache.py            (rodar após importar linhas ou mudar prensas_config.json)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS qrcode_rotas_config (
+    config_hash TEXT PRIMARY KEY,
+    rotas TEXT NOT NULL,
+    criado TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS qrcode_rotas (
+    ID INTEGER NOT NULL,
+    config_hash TEXT NOT NULL,
+    rotas TEXT NOT NULL,
+    PRIMARY KEY (ID, config_hash)
+) WITHOUT ROWID;
+"""
+
+
+def hash_rotas(rotas):
+    # Só o mapeamento terminal -> prensas entra no hash; nome/posição das prensas não
+    canonico = json.dumps({t: sorted(p) for t, p in rotas.items()}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonico.encode('utf-8')).hexdigest()[:16]
+
+
+def serializar(aplicacoes_por_prensa, sem_prensa, erros):
+    # {prensa: [[terminal, cabo, qtd], ...]} na ordem de primeira aparição
+    prensas = {
+        prensa_id: [[terminal, cabo, qtd] for (terminal, cabo), qtd in Counter(aplicacoes).items()]
+        for prensa_id, aplicacoes in aplicacoes_por_prensa.items()
+    }
+    return json.dumps({'prensas': prensas, 'sem_prensa': dict(sem_prensa), 'erros': [list(e) for e in erros]},
+                      separators=(',', ':'), ensure_ascii=False)
+
+
+def desserializar(texto):
+    # Volta ao formato de rotear(): lista de (terminal, cabo) repetida pela quantidade
+    dados = json.loads(texto)
+    aplicacoes_por_prensa = {
+        prensa_id: [(terminal, cabo) for terminal, cabo, qtd in itens for _ in range(qtd)]
+        for prensa_id, itens in dados['prensas'].items()
+    }
+    erros = tuple(ErroToken(*e) for e in dados.get('erros', []))
+    return aplicacoes_por_prensa, Counter(dados.get('sem_prensa', {})), erros
+
+
+def calcular(texto, rotas):
+    payload = parse_qrcode(texto or '')
+    aplicacoes_por_prensa, sem_prensa = rotear(payload.aplicacoes, rotas)
+    return serializar(aplicacoes_por_prensa, sem_prensa, payload.erros)
+
+
+def terminais_alterados(rotas_antigas, rotas_novas):
+    terminais = set(rotas_antigas) | set(rotas_novas)
+    return {t for t in terminais if sorted(rotas_antigas.get(t, ())) != sorted(rotas_novas.get(t, ()))}
+
+
+def terminais_da_entrada(texto):
+    dados = json.loads(texto)
+    terminais = set(dados.get('sem_prensa', {}))
+    for itens in dados['prensas'].values():
+        terminais.update(terminal for terminal, _, _ in itens)
+    return terminais
+
+
+def _paginas(conn, sql, parametros, tamanho_lote):
+    # sql com 'ID > ?' e 'ORDER BY ... ID LIMIT ?' no fim; o ID é a primeira coluna
+    ultimo = 0
+    while True:
+        linhas = conn.execute(sql, parametros + (ultimo, tamanho_lote)).fetchall()
+        if not linhas:
+            return
+        ultimo = linhas[-1][0]
+        yield linhas
+
+
+def _inserir(conn, lote):
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO qrcode_rotas (ID, config_hash, rotas) VALUES (?, ?, ?)', lote)
+
+
+def reaproveitar(conn, hash_antigo, hash_novo, alterados, tamanho_lote):
+    # Copia as linhas cujos terminais (da entrada antiga) não cruzam nenhum terminal com rota alterada
+    sql = ('SELECT r.ID, r.rotas FROM qrcode_rotas r JOIN qrcode q ON q.ID = r.ID '
+           'WHERE r.config_hash = ? AND r.ID > ? ORDER BY r.ID LIMIT ?')
+    copiadas = 0
+    for linhas in _paginas(conn, sql, (hash_antigo,), tamanho_lote):
+        lote = [(qr_id, hash_novo, rotas) for qr_id, rotas in linhas
+                if alterados.isdisjoint(terminais_da_entrada(rotas))]
+        _inserir(conn, lote)
+        copiadas += len(lote)
+    return copiadas
+
+
+def calcular_faltantes(conn, config_hash, rotas, tamanho_lote):
+    sql = ('SELECT q.ID, q.Texto FROM qrcode q LEFT JOIN qrcode_rotas r ON r.ID = q.ID AND r.config_hash = ? '
+           'WHERE r.ID IS NULL AND q.ID > ? ORDER BY q.ID LIMIT ?')
+    calculadas = 0
+    for linhas in _paginas(conn, sql, (config_hash,), tamanho_lote):
+        _inserir(conn, [(qr_id, config_hash, calcular(texto, rotas)) for qr_id, texto in linhas])
+        calculadas += len(linhas)
+    return calculadas
+
+
+def atualizar(caminho_banco, caminho_prensas, tamanho_lote=2000, manter_antigos=False):
+    _, rotas, _ = carregar_rotas(caminho_prensas)
+    config_hash = hash_rotas(rotas)
+
+    conn = sqlite3.connect(caminho_banco, timeout=30.0)
+    conn.executescript(SCHEMA)
+
+    copiadas = 0
+    novo = conn.execute('SELECT 1 FROM qrcode_rotas_config WHERE config_hash = ?', (config_hash,)).fetchone() is None
+    if novo:
+        anterior = conn.execute('SELECT config_hash, rotas FROM qrcode_rotas_config ORDER BY criado DESC LIMIT 1').fetchone()
+        with conn:
+            conn.execute('INSERT INTO qrcode_rotas_config (config_hash, rotas, criado) VALUES (?, ?, ?)',
+                         (config_hash, json.dumps(rotas, sort_keys=True), time.strftime('%Y-%m-%d %H:%M:%S')))
+        if anterior is not None:
+            alterados = terminais_alterados(json.loads(anterior[1]), rotas)
+            copiadas = reaproveitar(conn, anterior[0], config_hash, alterados, tamanho_lote)
+
+    calculadas = calcular_faltantes(conn, config_hash, rotas, tamanho_lote)
+
+    removidas = 0
+    if not manter_antigos:
+        with conn:
+            removidas = conn.execute('DELETE FROM qrcode_rotas WHERE config_hash != ?', (config_hash,)).rowcount
+            conn.execute('DELETE FROM qrcode_rotas_config WHERE config_hash != ?', (config_hash,))
+    conn.close()
+    return {'config_hash': config_hash, 'copiadas': copiadas, 'calculadas': calculadas, 'removidas': removidas}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula o roteamento por prensa de cada linha do banco")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    parser.add_argument('--prensas', default=os.path.join(SCRIPT_DIR, 'prensas_config.json'))
+    parser.add_argument('--lote', type=int, default=2000, help="linhas por transação")
+    parser.add_argument('--manter-antigos', action='store_true', help="não apaga entradas de configs anteriores")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    r = atualizar(args.banco, args.prensas, args.lote, args.manter_antigos)
+    print(f"config {r['config_hash']}: {r['calculadas']} calculadas, {r['copiadas']} reaproveitadas, "
+          f"{r['removidas']} antigas removidas em {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import json
+import os
+from collections import Counter
+
+from config_cache import carregar_compilado
+
+
+def carregar_prensas(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('prensas', []) if isinstance(data, dict) else data
+
+
+def carregar_layout(caminho):
+    # Dimensões da planta ('layout' do prensas_config.json); None no formato antigo (lista)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('layout') if isinstance(data, dict) else None
+
+
+def terminais_da_prensa(prensa):
+    terminais = prensa.get('terminais', [])
+    if not terminais:
+        # Formato antigo: uma única chave 'terminal'
+        terminal_antigo = prensa.get('terminal', '')
+        if terminal_antigo:
+            terminais = [terminal_antigo]
+    return terminais
+
+
+def compilar_rotas(prensas):
+    # Índice invertido terminal -> ids das prensas, construído uma vez por config
+    rotas = {}
+    prensas_info = {}
+    for p in prensas:
+        prensa_id = p.get('id', '')
+        prensas_info[prensa_id] = p.get('nome', '')
+        for terminal in terminais_da_prensa(p):
+            ids = rotas.setdefault(terminal, [])
+            if prensa_id not in ids:
+                ids.append(prensa_id)
+    return {terminal: tuple(ids) for terminal, ids in rotas.items()}, prensas_info
+
+
+def _compilar(data):
+    prensas = data.get('prensas', []) if isinstance(data, dict) else data
+    rotas, prensas_info = compilar_rotas(prensas)
+    return prensas, rotas, prensas_info
+
+
+def carregar_rotas(caminho):
+    # (prensas, rotas, prensas_info) usando o cache compilado ao lado do JSON
+    if not os.path.exists(caminho):
+        return [], {}, {}
+    return carregar_compilado(caminho, _compilar)
+
+
+def rotear(aplicacoes, rotas):
+    # Uma passada sobre as aplicações (terminal, cabo)
+    aplicacoes_por_prensa = {}
+    sem_prensa = Counter()
+    for terminal, cabo in aplicacoes:
+        prensa_ids = rotas.get(terminal)
+        if not prensa_ids:
+            sem_prensa[terminal] += 1
+            continue
+        for prensa_id in prensa_ids:
+            aplicacoes_por_prensa.setdefault(prensa_id, []).append((terminal, cabo))
+    return aplicacoes_por_prensa, sem_prensa
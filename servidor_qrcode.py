@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from cabos import carregar_tabela_cabos
+from feed_qrcode import FeedQRCode
+from qrcode_db import QRCodeDB
+from qrcode_prefetch import QRCodeCache
+from roteamento import carregar_rotas
+from rotas_cache import calcular, hash_rotas
+
+# Servidor de consultas para várias estações: um processo dono do banco_qrcode.db e das
+# tabelas compiladas (rotas das prensas, cabos) responde por HTTP às Pis do chão de
+# fábrica, que deixam de precisar de uma cópia do banco e da config cada uma.
+#
+#   GET /qrcode/<id>               linha (ID, Texto, Carro, Job_Key, Maco) ou 404
+#   GET /qrcode?ids=1,2,3          várias linhas (leitura antecipada), só as encontradas
+#   GET /rotas/<id>?config=<hash>  roteamento no formato do rotas_cache; 409 se a config difere
+#   GET /config                    prensas e cabos que o servidor está usando
+#   GET /saude                     contadores
+#
+# HTTP/1.1 com keep-alive: cada estação mantém a conexão aberta. As leituras do banco
+# rodam num pool de threads (uma conexão SQLite por thread); pedidos iguais que chegam
+# juntos (várias estações no mesmo maço) viram uma leitura só. Respostas ficam num LRU
+# válido para a geração do banco (FeedQRCode) e o hash da config; 404 não é guardado,
+# porque a linha pode chegar no próximo commit.
+#
+#   python3 servidor_qrcode.py --porta 8765
+#   python3 servidor_qrcode.py --unix /run/qrcode.sock
+#   python3 servidor_qrcode.py --simular 12 --consultas 2000   (estações simuladas nesta máquina)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MAX_IDS = 64
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+          409: 'Conflict', 500: 'Internal Server Error'}
+
+
+def _json(dados):
+    return json.dumps(dados, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _linha(row):
+    return {'ID': row['ID'], 'Texto': row['Texto'], 'Carro': row['Carro'], 'Job_Key': row['Job_Key'], 'Maco': row['Maco']}
+
+
+class ServidorQR:
+    def __init__(self, caminho_banco, caminho_prensas, caminho_cabos, conexoes=4, tamanho_cache=4096,
+                 intervalo_config=2.0):
+        self.db = QRCodeDB(caminho_banco)
+        self.caminhos = {'prensas': caminho_prensas, 'cabos': caminho_cabos}
+        self.intervalo_config = intervalo_config
+        self.executor = ThreadPoolExecutor(conexoes, thread_name_prefix='qrcode-servidor')
+        self.cache = QRCodeCache(tamanho_cache)
+        self.feed = FeedQRCode(self.db)
+        self._em_andamento = {}
+        self._assinaturas = {}
+        self.rotas = {}
+        self.config_hash = None
+        self.config = _json({})
+        self.stats = {'requisicoes': 0, 'cache': 0, 'banco': 0, 'agrupadas': 0, 'erros': 0,
+                      'conexoes': 0, 'conexoes_abertas': 0}
+        self.recarregar_config()
+
+    def _assinatura(self, caminho):
+        try:
+            st = os.stat(caminho)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def recarregar_config(self):
+        # Mesma regra do viewer: JSON inválido mantém a última config válida
+        assinaturas = {nome: self._assinatura(c) for nome, c in self.caminhos.items()}
+        if assinaturas == self._assinaturas:
+            return False
+        try:
+            prensas, rotas, _ = carregar_rotas(self.caminhos['prensas'])
+            cabos = carregar_tabela_cabos(self.caminhos['cabos'])
+        except (OSError, ValueError) as e:
+            print(f"Config inválida, mantendo a anterior: {e}")
+            self._assinaturas = assinaturas
+            return False
+        self._assinaturas = assinaturas
+        self.rotas = rotas
+        self.config_hash = hash_rotas(rotas)
+        self.config = _json({'config_hash': self.config_hash, 'prensas': prensas,
+                             'cabos': {codigo: list(info) for codigo, info in cabos.items()}})
+        print(f"Config carregada: {len(prensas)} prensas, {len(cabos)} cabos (hash {self.config_hash})")
+        return True
+
+    def versao(self):
+        return (self.feed.versao, self.config_hash)
+
+    def _cabecalhos_versao(self):
+        return {'X-Config-Hash': self.config_hash or '', 'X-Versao': f'{self.feed.geracao}.{self.feed.ultimo_id}'}
+
+    # Leituras (threads do executor)
+
+    def _ler_linha(self, qr_id):
+        row = self.db.buscar(qr_id)
+        return _json(_linha(dict(row, ID=qr_id))) if row is not None else None
+
+    def _ler_varias(self, ids):
+        return {qr_id: _json(_linha(row)) for qr_id, row in self.db.buscar_varios(ids).items()}
+
+    def _ler_rotas(self, qr_id, rotas, config_hash):
+        # Pré-calculado no banco (rotas_cache.py) quando existe; senão parse + roteamento aqui
+        pre_calculado = self.db.buscar_rotas(qr_id, config_hash)
+        if pre_calculado is not None:
+            return pre_calculado.encode('utf-8')
+        row = self.db.buscar(qr_id)
+        return calcular(row['Texto'], rotas).encode('utf-8') if row is not None else None
+
+    async def _consultar(self, chave, funcao, *args):
+        # LRU -> leitura em andamento com a mesma chave -> banco
+        versao = self.versao()
+        corpo = self.cache.obter(chave, versao)
+        if corpo is not None:
+            self.stats['cache'] += 1
+            return corpo
+        futuro = self._em_andamento.get(chave)
+        if futuro is not None:
+            self.stats['agrupadas'] += 1
+            return await asyncio.shield(futuro)
+        self.stats['banco'] += 1
+        futuro = asyncio.get_running_loop().run_in_executor(self.executor, funcao, *args)
+        self._em_andamento[chave] = futuro
+        try:
+            corpo = await futuro
+        finally:
+            del self._em_andamento[chave]
+        if corpo is not None:
+            self.cache.guardar(chave, versao, corpo)
+        return corpo
+
+    async def _consultar_varios(self, ids):
+        # Cada linha entra no LRU individual: o Enter depois de um prefetch já sai do cache
+        versao = self.versao()
+        corpos = {}
+        faltando = []
+        for qr_id in ids:
+            corpo = self.cache.obter(('qrcode', qr_id), versao)
+            if corpo is None:
+                faltando.append(qr_id)
+            else:
+                corpos[qr_id] = corpo
+        if faltando:
+            self.stats['banco'] += 1
+            lidos = await asyncio.get_running_loop().run_in_executor(self.executor, self._ler_varias, faltando)
+            for qr_id, corpo in lidos.items():
+                self.cache.guardar(('qrcode', qr_id), versao, corpo)
+                corpos[qr_id] = corpo
+        else:
+            self.stats['cache'] += 1
+        return b'[' + b','.join(corpos[qr_id] for qr_id in ids if qr_id in corpos) + b']'
+
+    async def responder(self, metodo, alvo):
+        if metodo != 'GET':
+            return 405, _json({'erro': 'use GET'})
+        partes = urlsplit(alvo)
+        caminho = partes.path.rstrip('/').split('/')[1:]
+        query = parse_qs(partes.query)
+        try:
+            if caminho == ['qrcode'] and 'ids' in query:
+                ids = sorted({int(i) for i in query['ids'][0].split(',') if i})[:MAX_IDS]
+                return 200, await self._consultar_varios(ids)
+            if len(caminho) == 2 and caminho[0] == 'qrcode':
+                qr_id = int(caminho[1])
+                corpo = await self._consultar(('qrcode', qr_id), self._ler_linha, qr_id)
+                return (200, corpo) if corpo is not None else (404, _json({'erro': f'ID {qr_id} não encontrado'}))
+            if len(caminho) == 2 and caminho[0] == 'rotas':
+                qr_id = int(caminho[1])
+                pedido = query.get('config', [None])[0]
+                if pedido is not None and pedido != self.config_hash:
+                    return 409, _json({'erro': 'config de prensas diferente', 'config_hash': self.config_hash})
+                corpo = await self._consultar(('rotas', qr_id), self._ler_rotas, qr_id, self.rotas, self.config_hash)
+                return (200, corpo) if corpo is not None else (404, _json({'erro': f'ID {qr_id} não encontrado'}))
+            if caminho == ['config']:
+                return 200, self.config
+            if caminho == ['saude']:
+                return 200, _json({'stats': self.stats, 'banco': self.db.estatisticas(), 'cache': self.cache.stats,
+                                   'feed': self.feed.stats, 'config_hash': self.config_hash})
+        except ValueError:
+            return 400, _json({'erro': f'pedido inválido: {alvo}'})
+        return 404, _json({'erro': f'caminho desconhecido: {partes.path}'})
+
+    async def atender(self, reader, writer):
+        self.stats['conexoes'] += 1
+        self.stats['conexoes_abertas'] += 1
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                metodo, alvo, _ = linha.decode('latin-1').split(' ', 2)
+                cabecalhos = {}
+                while True:
+                    cabecalho = await reader.readline()
+                    if cabecalho in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = cabecalho.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                self.stats['requisicoes'] += 1
+                try:
+                    status, corpo = await self.responder(metodo, alvo)
+                except Exception as e:
+                    # Banco ausente, trocado no meio da leitura...: a estação cai no fallback local
+                    self.stats['erros'] += 1
+                    status, corpo = 500, _json({'erro': str(e)})
+                manter = cabecalhos.get('connection', '').lower() != 'close'
+                extras = ''.join(f'{k}: {v}\r\n' for k, v in self._cabecalhos_versao().items())
+                writer.write((f'HTTP/1.1 {status} {STATUS[status]}\r\n'
+                              'Content-Type: application/json; charset=utf-8\r\n'
+                              f'Content-Length: {len(corpo)}\r\n{extras}'
+                              f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n").encode('latin-1') + corpo)
+                await writer.drain()
+                if not manter:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Servidor parando (Ctrl+C): conexões abertas só são fechadas
+            pass
+        finally:
+            self.stats['conexoes_abertas'] -= 1
+            writer.close()
+
+    async def vigiar_config(self):
+        while True:
+            await asyncio.sleep(self.intervalo_config)
+            self.recarregar_config()
+
+    async def iniciar(self, host='0.0.0.0', porta=8765, unix=None):
+        if unix is not None:
+            if os.path.exists(unix):
+                os.unlink(unix)
+            servidor = await asyncio.start_unix_server(self.atender, unix)
+        else:
+            servidor = await asyncio.start_server(self.atender, host, porta)
+        asyncio.get_running_loop().create_task(self.vigiar_config())
+        return servidor
+
+    def parar(self):
+        self.feed.parar()
+        self.executor.shutdown(wait=False)
+
+
+def executar_em_thread(servidor_qr, host='127.0.0.1', porta=0):
+    # Servidor num loop próprio em thread daemon (simulação); retorna a porta escolhida
+    pronto = threading.Event()
+    enderecos = []
+
+    def executar():
+        loop = asyncio.new_event_loop()
+        servidor = loop.run_until_complete(servidor_qr.iniciar(host, porta))
+        enderecos.append(servidor.sockets[0].getsockname()[1])
+        pronto.set()
+        loop.run_forever()
+
+    threading.Thread(target=executar, name='qrcode-servidor-loop', daemon=True).start()
+    pronto.wait()
+    return enderecos[0]
+
+
+def simular(servidor_qr, estacoes, consultas, quentes):
+    # Estações concorrentes, cada uma com sua conexão, consultando linha + rotas de IDs
+    # sorteados entre os 'quentes' mais recentes (maços que circulam pelo chão de fábrica)
+    from cliente_qrcode import ClienteQR
+
+    porta = executar_em_thread(servidor_qr)
+    servidor_qr.feed.esperar_inicio(5.0)
+    ultimo = servidor_qr.feed.ultimo_id
+    if not ultimo:
+        print("Banco vazio ou indisponível: nada a simular")
+        return 1
+    ids = list(range(max(1, ultimo - quentes + 1), ultimo + 1))
+    tempos = []
+    falhas = []
+    lock = threading.Lock()
+
+    def estacao(n):
+        cliente = ClienteQR(f'http://127.0.0.1:{porta}')
+        sorteio = random.Random(n)
+        locais = []
+        erros = 0
+        for _ in range(consultas):
+            qr_id = sorteio.choice(ids)
+            inicio = time.perf_counter()
+            try:
+                cliente.buscar(qr_id)
+                cliente.buscar_rotas(qr_id, servidor_qr.config_hash)
+            except Exception:
+                erros += 1
+            locais.append((time.perf_counter() - inicio) * 1000.0)
+        cliente.fechar()
+        with lock:
+            tempos.extend(locais)
+            falhas.append(erros)
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=estacao, args=(n,)) for n in range(estacoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    tempos.sort()
+    s = servidor_qr.stats
+    print(f"{estacoes} estações x {consultas} consultas (linha + rotas) em {total:.1f} s: "
+          f"{len(tempos) / total:.0f} consultas/s, {sum(falhas)} falhas")
+    print(f"latência p50 {tempos[len(tempos) // 2]:.2f} ms  p99 {tempos[int(len(tempos) * 0.99)]:.2f} ms  "
+          f"máx {tempos[-1]:.2f} ms")
+    print(f"servidor: {s['requisicoes']} requisições em {s['conexoes']} conexões, {s['cache']} do cache, "
+          f"{s['agrupadas']} agrupadas, {s['banco']} ao banco")
+    return 1 if sum(falhas) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de consultas de QR Code para várias estações")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    parser.add_argument('--prensas', default=os.path.join(SCRIPT_DIR, 'prensas_config.json'))
+    parser.add_argument('--cabos', default=os.path.join(SCRIPT_DIR, 'cabos_config.json'))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--unix', help="escuta num socket unix em vez de TCP")
+    parser.add_argument('--conexoes', type=int, default=4, help="conexões SQLite (threads de leitura)")
+    parser.add_argument('--cache', type=int, default=4096, help="respostas mantidas no LRU")
+    parser.add_argument('--simular', type=int, metavar='ESTACOES', help="roda estações simuladas contra o servidor e sai")
+    parser.add_argument('--consultas', type=int, default=1000, help="consultas por estação simulada")
+    parser.add_argument('--quentes', type=int, default=500, help="IDs mais recentes sorteados na simulação")
+    args = parser.parse_args(argv)
+
+    servidor_qr = ServidorQR(args.banco, args.prensas, args.cabos, args.conexoes, args.cache)
+    if args.simular:
+        try:
+            return simular(servidor_qr, args.simular, args.consultas, args.quentes)
+        finally:
+            servidor_qr.parar()
+
+    async def executar():
+        servidor = await servidor_qr.iniciar(args.host, args.porta, args.unix)
+        print(f"Servindo {args.banco} em {args.unix or f'{args.host}:{args.porta}'}")
+        async with servidor:
+            await servidor.serve_forever()
+
+    try:
+        asyncio.run(executar())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor_qr.parar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+import threading
+from array import array
+
+from qrcode_parser import ErroToken, parse_qrcode
+
+# Snapshot compacto da tabela qrcode em memória: consulta por ID sem tocar no cartão SD
+# (e sem depender do banco, que pode estar travado durante uma sincronização).
+#
+# Textos (Carro, Job_Key, Maço, terminais e cabos) são internados como inteiros; o
+# Texto não é guardado, só as aplicações (terminal, cabo) já parseadas. O ID leva
+# direto à linha por uma tabela de posições (IDs do AUTOINCREMENT são densos).
+#
+# Memória por linha (fora a tabela de textos, compartilhada):
+#   posicao (4 B) + carro/job_key/maco (3 x 4 B) + início das aplicações (4 B) = 20 B
+#   + 8 B por aplicação (terminal e cabo)
+# São arrays 'i'/'I' (4 B; 'l' teria 8 B no Linux de 64 bits) e a conta usa o itemsize
+# de cada um. O total é limitado por limite_bytes; linhas além do limite ficam para o banco.
+#
+# Em disco (banco_qrcode.snap): cabeçalho JSON + arrays crus, lidos com frombytes.
+
+MAGICO = b'QRSNAP01'
+# 2: posicao passou de 'l' para 'i'
+FORMATO_VERSAO = 2
+ARRAYS = ('posicao', 'carro', 'job_key', 'maco', 'inicio', 'aplicacoes')
+
+
+class SnapshotQR:
+    def __init__(self, limite_bytes=64 * 1024 * 1024):
+        self.limite_bytes = limite_bytes
+        # Texto 0 é None (cabo ausente, coluna NULL)
+        self.textos = [None]
+        self._indice_texto = {None: 0}
+        self.posicao = array('i')
+        self.carro = array('I')
+        self.job_key = array('I')
+        self.maco = array('I')
+        self.inicio = array('I', [0])
+        self.aplicacoes = array('I')
+        self.erros = {}
+        self.ultimo_id = 0
+        self.cheio = False
+        self.alterado = False
+        self._lock = threading.Lock()
+        self.stats = {'consultas': 0, 'acertos': 0}
+
+    def __len__(self):
+        return len(self.carro)
+
+    def bytes_usados(self):
+        return sum(len(dados) * dados.itemsize for dados in (getattr(self, nome) for nome in ARRAYS))
+
+    def _bytes_por_linha(self):
+        # carro, job_key, maco e início das aplicações (a posição é contada à parte)
+        return self.carro.itemsize + self.job_key.itemsize + self.maco.itemsize + self.inicio.itemsize
+
+    def _texto(self, valor):
+        indice = self._indice_texto.get(valor)
+        if indice is None:
+            indice = len(self.textos)
+            self.textos.append(valor)
+            self._indice_texto[valor] = indice
+        return indice
+
+    def adicionar(self, linhas):
+        # Linhas (ID, Texto, Carro, Job_Key, Maco) em ordem crescente de ID; as já vistas são ignoradas
+        adicionadas = 0
+        with self._lock:
+            for row in linhas:
+                qr_id = row['ID']
+                if qr_id <= self.ultimo_id:
+                    continue
+                # Sem o LRU do parser: uma carga grande não expulsa as entradas do viewer
+                payload = parse_qrcode.__wrapped__(row['Texto'] or '')
+                custo = ((qr_id - len(self.posicao)) * self.posicao.itemsize + self._bytes_por_linha()
+                         + len(payload.aplicacoes) * 2 * self.aplicacoes.itemsize)
+                if self.bytes_usados() + custo > self.limite_bytes:
+                    if not self.cheio:
+                        print(f"Snapshot cheio ({self.limite_bytes // 1024} KB): IDs acima de {self.ultimo_id} vão ao banco")
+                    self.cheio = True
+                    break
+                for terminal, cabo in payload.aplicacoes:
+                    self.aplicacoes.append(self._texto(terminal))
+                    self.aplicacoes.append(self._texto(cabo))
+                if payload.erros:
+                    self.erros[qr_id] = payload.erros
+                self.inicio.append(len(self.aplicacoes))
+                self.carro.append(self._texto(row['Carro']))
+                self.job_key.append(self._texto(row['Job_Key']))
+                self.maco.append(self._texto(row['Maco']))
+                # Posição por último: a linha só fica visível quando está completa
+                if qr_id > len(self.posicao) + 1:
+                    self.posicao.extend([-1] * (qr_id - 1 - len(self.posicao)))
+                self.posicao.append(len(self.carro) - 1)
+                self.ultimo_id = qr_id
+                adicionadas += 1
+            if adicionadas:
+                self.alterado = True
+        return adicionadas
+
+    def buscar(self, qr_id):
+        # (carro, job_key, maco, aplicacoes, erros) ou None se o ID não está no snapshot
+        with self._lock:
+            self.stats['consultas'] += 1
+            if not 0 < qr_id <= len(self.posicao):
+                return None
+            linha = self.posicao[qr_id - 1]
+            if linha < 0:
+                return None
+            self.stats['acertos'] += 1
+            t = self.textos
+            itens = self.aplicacoes[self.inicio[linha]:self.inicio[linha + 1]]
+            aplicacoes = tuple(zip([t[i] for i in itens[0::2]], [t[i] for i in itens[1::2]]))
+            return (t[self.carro[linha]], t[self.job_key[linha]], t[self.maco[linha]],
+                    aplicacoes, self.erros.get(qr_id, ()))
+
+    def confere(self, db):
+        # O último ID do snapshot ainda é a mesma linha no banco? (banco indisponível: confia no snapshot)
+        if not self.ultimo_id:
+            return True
+        atual = self.buscar(self.ultimo_id)
+        try:
+            row = db.buscar(self.ultimo_id)
+        except Exception as e:
+            print(f"Snapshot: banco indisponível para conferir ({e}), usando snapshot")
+            return True
+        return row is not None and (row['Carro'], row['Job_Key'], row['Maco']) == atual[:3]
+
+    def limpar(self):
+        with self._lock:
+            novo = SnapshotQR(self.limite_bytes)
+            for nome in ('textos', '_indice_texto', 'erros', 'ultimo_id', 'cheio') + ARRAYS:
+                setattr(self, nome, getattr(novo, nome))
+            self.alterado = True
+
+    def salvar(self, caminho):
+        with self._lock:
+            cabecalho = {
+                'versao': FORMATO_VERSAO,
+                'byteorder': sys.byteorder,
+                'ultimo_id': self.ultimo_id,
+                'cheio': self.cheio,
+                'textos': self.textos,
+                'erros': {str(qr_id): [list(e) for e in erros] for qr_id, erros in self.erros.items()},
+                'arrays': {nome: [getattr(self, nome).typecode, len(getattr(self, nome))] for nome in ARRAYS},
+            }
+            blocos = [getattr(self, nome).tobytes() for nome in ARRAYS]
+            self.alterado = False
+        cabecalho = json.dumps(cabecalho, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        temporario = caminho + '.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(MAGICO)
+            f.write(len(cabecalho).to_bytes(4, 'little'))
+            f.write(cabecalho)
+            for bloco in blocos:
+                f.write(bloco)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho, limite_bytes=64 * 1024 * 1024):
+        # None se o arquivo não existe ou não é um snapshot desta versão
+        try:
+            with open(caminho, 'rb') as f:
+                if f.read(len(MAGICO)) != MAGICO:
+                    return None
+                cabecalho = json.loads(f.read(int.from_bytes(f.read(4), 'little')).decode('utf-8'))
+                if cabecalho.get('versao') != FORMATO_VERSAO:
+                    return None
+                snap = cls(limite_bytes)
+                for nome in ARRAYS:
+                    typecode, n = cabecalho['arrays'][nome]
+                    dados = array(typecode)
+                    dados.frombytes(f.read(n * dados.itemsize))
+                    if len(dados) != n:
+                        return None
+                    if cabecalho['byteorder'] != sys.byteorder:
+                        dados.byteswap()
+                    setattr(snap, nome, dados)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        snap.textos = cabecalho['textos']
+        snap._indice_texto = {texto: i for i, texto in enumerate(snap.textos)}
+        snap.erros = {int(qr_id): tuple(ErroToken(*e) for e in erros) for qr_id, erros in cabecalho['erros'].items()}
+        snap.ultimo_id = cabecalho['ultimo_id']
+        snap.cheio = cabecalho['cheio']
+        return snap
@@ -0,0 +1,252 @@
+import argparse
+import contextlib
+import csv
+import gc
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Teste de resistência do quiosque: conduz o QRCodeViewer (plataforma Qt 'offscreen')
+# por milhares de ciclos leitura -> navegação -> marcar tudo -> finalizar, com IDs do
+# banco real, pelas mesmas ações do gamepad. A cada --amostra ciclos grava RSS, contagens
+# de objetos Qt / Python e a latência dos ciclos num CSV; no fim, a tendência do RSS e
+# dos widgets depois do aquecimento. Sai com 1 se o crescimento passar dos limites ou se
+# algum movimento da seleção repolir mais de --limite-repolidos cards (o custo de mover
+# não pode depender de quantos cards o maço tem).
+#
+#   python3 soak_viewer.py --ciclos 5000 --saida soak.csv
+#   python3 soak_viewer.py --ciclos 2000 --lote 3 --mapa
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from metricas import percentil
+from qrcode_db import QRCodeDB
+from vigia_memoria import MB, contar_objetos_qt, rss_bytes, tendencia
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+silencio = open(os.devnull, 'w')
+
+CAMPOS = ('ciclo', 'tempo_s', 'rss_mb', 'widgets', 'objetos', 'objetos_python', 'cache_parser',
+          'metricas_abertas', 'consulta_p50_ms', 'consulta_p99_ms', 'ciclo_p50_ms', 'ciclo_p99_ms', 'falhas', 'limpezas')
+
+
+def esperar(app, condicao, timeout):
+    fim = time.monotonic() + timeout
+    while not condicao():
+        if time.monotonic() > fim:
+            return False
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+    return True
+
+
+def criar_viewer(diretorio_temp, args):
+    from PyQt5 import QtWidgets
+    import raspberry_qrcode_viewer
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    viewer = raspberry_qrcode_viewer.QRCodeViewer(lote=False, mapa=args.mapa, vigia_mb=args.vigia_memoria)
+    viewer.banco_qrcode_path = os.path.abspath(args.banco)
+    viewer.db = QRCodeDB(viewer.banco_qrcode_path)
+    viewer.config_paths['prensas'] = os.path.abspath(args.prensas)
+    viewer.config_paths['cabos'] = os.path.abspath(args.cabos)
+    # Nada de arquivos de progresso/métricas no diretório do projeto
+    viewer.progresso_path = os.path.join(diretorio_temp, 'progresso_soak.db')
+    viewer.metricas_dir = diretorio_temp
+    viewer.resize(600, 900)
+    viewer.show()
+    # Janela ativa: o foco do input (e com ele o enter do gamepad) funciona como no quiosque
+    viewer.activateWindow()
+    viewer.carregar_subsistemas()
+    app.processEvents()
+    return viewer, app
+
+
+def ler(viewer, app, texto, timeout):
+    if not viewer.isActiveWindow():
+        # O diálogo de finalizar leva a ativação e a plataforma offscreen não a devolve
+        viewer.activateWindow()
+        app.processEvents()
+    viewer.executar_acao('focus_input')
+    viewer.input_qr.setText(texto)
+    pedido = viewer.pedido_atual
+    viewer.executar_acao('enter')
+    if viewer.pedido_atual == pedido:
+        return False
+    if not esperar(app, lambda: viewer.info_label.property('estado') != 'carregando', timeout):
+        return False
+    return viewer.info_label.property('estado') != 'erro'
+
+
+def mover(viewer, acao, repolidos):
+    # Executa a ação e guarda, por número de cards na tela, o máximo repolido num movimento
+    s = viewer.selecao_stats
+    antes, n = s['atualizacoes'], len(viewer.prensa_frames)
+    viewer.executar_acao(acao)
+    if s['atualizacoes'] != antes and len(viewer.prensa_frames) == n:
+        repolidos[n] = max(repolidos.get(n, 0), s['repolidos_ultimo'])
+
+
+def ciclo(viewer, app, ids, timeout, repolidos):
+    # (ms até a tela, ms do ciclo inteiro, ok)
+    inicio = time.perf_counter()
+    ok = ler(viewer, app, str(ids[0]), timeout)
+    for qr_id in ids[1:]:
+        ok = ler(viewer, app, f'+{qr_id}', timeout) and ok
+    consulta_ms = (time.perf_counter() - inicio) * 1000.0
+    n = len(viewer.prensa_frames)
+    if not ok or not n:
+        viewer.limpar_e_focar()
+        return consulta_ms, (time.perf_counter() - inicio) * 1000.0, ok
+    for acao in ['down'] * (n - 1) + ['up'] * (n - 1):
+        mover(viewer, acao, repolidos)
+    # Marca, volta e desmarca o primeiro card; depois marca tudo até o diálogo de finalizar
+    marcar(viewer, repolidos)
+    mover(viewer, 'up', repolidos)
+    mover(viewer, 'left', repolidos)
+    for _ in range(n):
+        if not viewer.prensa_frames:
+            break
+        marcar(viewer, repolidos)
+    ok = viewer.qr_atual is None and viewer.lote is None and not viewer.prensa_frames
+    if not ok:
+        viewer.limpar_e_focar()
+    return consulta_ms, (time.perf_counter() - inicio) * 1000.0, ok
+
+
+def marcar(viewer, repolidos):
+    from PyQt5 import QtCore
+    n = len(viewer.prensa_frames)
+    if len(viewer.completed_frames) == n - 1 and viewer.current_index not in viewer.completed_frames:
+        # Este marcar abre o diálogo modal: o enter do gamepad chega pelo loop do exec_()
+        QtCore.QTimer.singleShot(0, lambda: viewer.executar_acao_gamepad('enter', 1, False))
+    mover(viewer, 'right', repolidos)
+
+
+def amostra(viewer, ciclo_n, inicio, consultas, ciclos, falhas):
+    from qrcode_parser import parse_qrcode
+    consultas = sorted(consultas)
+    ciclos = sorted(ciclos)
+    objetos = contar_objetos_qt(viewer)
+    return {
+        'ciclo': ciclo_n,
+        'tempo_s': round(time.monotonic() - inicio, 1),
+        'rss_mb': round(rss_bytes() / MB, 2),
+        'widgets': objetos['widgets'],
+        'objetos': objetos['objetos'],
+        'objetos_python': len(gc.get_objects()),
+        'cache_parser': parse_qrcode.cache_info().currsize,
+        'metricas_abertas': len(viewer.metricas._inicio_maco) + len(viewer.metricas._inicio_prensa),
+        'consulta_p50_ms': round(percentil(consultas, 0.5) or 0.0, 2),
+        'consulta_p99_ms': round(percentil(consultas, 0.99) or 0.0, 2),
+        'ciclo_p50_ms': round(percentil(ciclos, 0.5) or 0.0, 2),
+        'ciclo_p99_ms': round(percentil(ciclos, 0.99) or 0.0, 2),
+        'falhas': falhas,
+        'limpezas': viewer.vigia.limpezas if viewer.vigia is not None else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de resistência do viewer (ciclos de leitura até finalizar)")
+    parser.add_argument('--banco', default=os.path.join(SCRIPT_DIR, 'banco_qrcode.db'))
+    parser.add_argument('--prensas', default=os.path.join(SCRIPT_DIR, 'prensas_config.json'))
+    parser.add_argument('--cabos', default=os.path.join(SCRIPT_DIR, 'cabos_config.json'))
+    parser.add_argument('--ciclos', type=int, default=5000)
+    parser.add_argument('--amostra', type=int, default=100, help="ciclos entre amostras")
+    parser.add_argument('--lote', type=int, default=1, help="maços lidos por ciclo (acima de 1, modo lote)")
+    parser.add_argument('--mapa', action='store_true', help="viewer no modo mapa")
+    parser.add_argument('--timeout', type=float, default=10.0, help="espera máxima por uma consulta (s)")
+    parser.add_argument('--vigia-memoria', type=float, metavar='MB',
+                        help="liga o vigia do viewer com este limite; amostrado junto com o harness")
+    parser.add_argument('--semente', type=int, default=7)
+    parser.add_argument('--saida', help="CSV com as amostras")
+    parser.add_argument('--aquecimento', type=float, default=0.2, help="fração inicial fora da tendência")
+    parser.add_argument('--limite-mb', type=float, default=3.0, help="crescimento de RSS aceito por 1000 ciclos")
+    # O pool de cards cresce até o maior maço já visto; crescimento sem teto passa disso
+    parser.add_argument('--limite-widgets', type=int, default=50, help="widgets a mais aceitos no fim")
+    parser.add_argument('--limite-repolidos', type=int, default=2, help="cards repolidos aceitos por movimento")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(f"file:{args.banco}?mode=ro", uri=True)
+    todos = [qr_id for (qr_id,) in conn.execute('SELECT ID FROM qrcode')]
+    conn.close()
+    if not todos:
+        print("banco sem linhas")
+        return 1
+    rnd = random.Random(args.semente)
+
+    amostras = []
+    saida = open(args.saida, 'w', newline='', encoding='utf-8') if args.saida else None
+    escritor = csv.DictWriter(saida, CAMPOS) if saida else None
+    if escritor:
+        escritor.writeheader()
+
+    with tempfile.TemporaryDirectory(prefix='soak_qrcode_') as tmp:
+        with contextlib.redirect_stdout(silencio):
+            viewer, app = criar_viewer(tmp, args)
+        inicio = time.monotonic()
+        consultas, ciclos, falhas = [], [], 0
+        repolidos = {}
+        for n in range(1, args.ciclos + 1):
+            ids = rnd.sample(todos, min(args.lote, len(todos)))
+            with contextlib.redirect_stdout(silencio):
+                consulta_ms, ciclo_ms, ok = ciclo(viewer, app, ids, args.timeout, repolidos)
+            consultas.append(consulta_ms)
+            ciclos.append(ciclo_ms)
+            falhas += not ok
+            if n % args.amostra == 0 or n == args.ciclos:
+                gc.collect()
+                if viewer.vigia is not None:
+                    with contextlib.redirect_stdout(silencio):
+                        viewer.amostrar_memoria()
+                    esperar(app, lambda: True, 0)
+                a = amostra(viewer, n, inicio, consultas, ciclos, falhas)
+                amostras.append(a)
+                consultas, ciclos = [], []
+                if escritor:
+                    escritor.writerow(a)
+                    saida.flush()
+                print(f"ciclo {n:>7}  RSS {a['rss_mb']:7.1f} MB  widgets {a['widgets']:>5}  objetos {a['objetos']:>5}  "
+                      f"python {a['objetos_python']:>7}  ciclo p50 {a['ciclo_p50_ms']:6.1f} ms  "
+                      f"p99 {a['ciclo_p99_ms']:6.1f} ms  falhas {falhas}  limpezas {a['limpezas']}", flush=True)
+        viewer.close()
+        if viewer.progresso is not None:
+            viewer.progresso.fechar()
+    if saida:
+        saida.close()
+
+    # Tendência depois do aquecimento (pool de cards, caches e LRUs enchendo)
+    estaveis = amostras[int(len(amostras) * args.aquecimento):]
+    mb_por_mil = tendencia([(a['ciclo'], a['rss_mb']) for a in estaveis]) * 1000.0
+    widgets = estaveis[-1]['widgets'] - estaveis[0]['widgets'] if estaveis else 0
+    objetos = estaveis[-1]['objetos_python'] - estaveis[0]['objetos_python'] if estaveis else 0
+    print(f"depois do aquecimento: RSS {mb_por_mil:+.2f} MB / 1000 ciclos, widgets {widgets:+d}, "
+          f"objetos Python {objetos:+d}, falhas {falhas}")
+    problemas = []
+    if mb_por_mil > args.limite_mb:
+        problemas.append(f"RSS cresce {mb_por_mil:.2f} MB / 1000 ciclos (limite {args.limite_mb})")
+    if widgets > args.limite_widgets:
+        problemas.append(f"{widgets} widgets a mais (limite {args.limite_widgets})")
+    if repolidos:
+        print("repolidos por movimento (máximo por nº de cards): "
+              + ', '.join(f"{n}: {r}" for n, r in sorted(repolidos.items())))
+    excedidos = {n: r for n, r in repolidos.items() if r > args.limite_repolidos}
+    if excedidos:
+        problemas.append(f"movimento repoliu até {max(excedidos.values())} cards com "
+                         f"{', '.join(map(str, sorted(excedidos)))} na tela (limite {args.limite_repolidos})")
+    if falhas:
+        problemas.append(f"{falhas} ciclos sem finalizar")
+    if viewer.vigia is not None and viewer.vigia.vazando():
+        problemas.append(f"vigia: {viewer.vigia.retido() / MB:.1f} MB retidos depois de {viewer.vigia.limpezas} limpezas")
+    for p in problemas:
+        print(f"  {p}")
+    return 1 if problemas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import ctypes
+import os
+import resource
+import time
+from collections import deque
+
+# Vigia de memória do quiosque (turnos inteiros sem reiniciar): amostra o RSS do processo
+# e, opcionalmente, contagens de objetos Qt. A base é fixada depois de algumas amostras
+# (o primeiro maço carrega configs, pool de cards, caches) e não muda mais: crescimento()
+# e o relatório são sempre contra ela. Crescimento acima do limite desde o último nível
+# chama ao_exceder(amostra, crescimento) a cada amostra, até o dono avisar com limpou()
+# que liberou o que podia; a amostra seguinte vira o novo nível. O que as limpezas não
+# devolvem (nível - base) é o vazamento de verdade: retido() / vazando().
+
+MB = 1024 * 1024
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Sem /proc: só o pico (ru_maxrss em KB no Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def contar_objetos_qt(raiz):
+    from PyQt5 import QtCore, QtWidgets
+    return {
+        'widgets': len(QtWidgets.QApplication.allWidgets()),
+        'objetos': len(raiz.findChildren(QtCore.QObject)),
+    }
+
+
+def devolver_memoria():
+    # glibc guarda páginas livres do heap; malloc_trim as devolve ao sistema
+    try:
+        return bool(ctypes.CDLL('libc.so.6').malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+
+def tendencia(pontos):
+    # Inclinação da reta de mínimos quadrados por [(x, y)]; 0.0 com menos de dois pontos
+    n = len(pontos)
+    if n < 2:
+        return 0.0
+    mx = sum(x for x, _ in pontos) / n
+    my = sum(y for _, y in pontos) / n
+    variancia = sum((x - mx) ** 2 for x, _ in pontos)
+    if not variancia:
+        return 0.0
+    return sum((x - mx) * (y - my) for x, y in pontos) / variancia
+
+
+class VigiaMemoria:
+    def __init__(self, limite_mb=64.0, aquecimento=3, historico=1440, ao_exceder=None):
+        self.limite_bytes = limite_mb * MB
+        self.aquecimento = aquecimento
+        self.ao_exceder = ao_exceder
+        self.amostras = deque(maxlen=historico)
+        self.base = None
+        # Referência das limpezas: a base até a primeira, depois a amostra logo após cada uma
+        self.nivel = None
+        self._ate_base = aquecimento
+        self._novo_nivel = False
+        self.limpezas = 0
+
+    def amostrar(self, extra=None):
+        amostra = dict(extra or {}, t=time.monotonic(), rss=rss_bytes())
+        self.amostras.append(amostra)
+        if self.base is None:
+            self._ate_base -= 1
+            if self._ate_base <= 0:
+                self.base = self.nivel = amostra
+            return amostra
+        if self._novo_nivel:
+            # Primeira amostra depois da limpeza: o que sobrou é o nível (não dispara de novo)
+            self._novo_nivel = False
+            self.nivel = amostra
+            return amostra
+        if amostra['rss'] - self.nivel['rss'] > self.limite_bytes and self.ao_exceder is not None:
+            self.ao_exceder(amostra, self.crescimento())
+        return amostra
+
+    def limpou(self):
+        self.limpezas += 1
+        if self.base is not None:
+            self._novo_nivel = True
+
+    def crescimento(self):
+        if self.base is None or not self.amostras:
+            return 0
+        return self.amostras[-1]['rss'] - self.base['rss']
+
+    def retido(self):
+        # Crescimento que sobreviveu às limpezas
+        if self.base is None:
+            return 0
+        return self.nivel['rss'] - self.base['rss']
+
+    def vazando(self):
+        return self.limpezas > 0 and self.retido() > self.limite_bytes
+
+    def mb_por_hora(self):
+        # Tendência do RSS nas amostras desde a base
+        if self.base is None:
+            return 0.0
+        pontos = [(a['t'], a['rss']) for a in self.amostras if a['t'] >= self.base['t']]
+        return tendencia(pontos) * 3600.0 / MB
+
+    def resumo(self):
+        if not self.amostras:
+            return "sem amostras"
+        a = self.amostras[-1]
+        texto = f"RSS {a['rss'] / MB:.1f} MB"
+        if self.base is not None:
+            texto += f" ({self.crescimento() / MB:+.1f} MB desde a base, {self.mb_por_hora():+.2f} MB/h"
+            if self.limpezas:
+                texto += f", {self.retido() / MB:+.1f} MB retidos após {self.limpezas} limpezas"
+            texto += ")"
+        if 'widgets' in a:
+            texto += f", {a['widgets']} widgets, {a['objetos']} objetos"
+        return texto